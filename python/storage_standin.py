@@ -0,0 +1,48 @@
+import os
+import posixpath
+from fsspec.implementations.local import LocalFileSystem
+
+# environment variable of the stand-in root directory, inherited by worker processes
+STANDIN_ROOT_ENV = "TAXI_RIDES_STORAGE_STANDIN"
+# remote protocols served by the stand-in filesystem
+STANDIN_PROTOCOLS = ("abfs", "abfss", "az", "adl")
+
+
+class StandinFileSystem(LocalFileSystem):
+    """
+    Local stand-in of the Azure storage filesystems, serving abfs://container/path from <root>/container/path.
+    Credentials in storage options are ignored.
+    """
+
+    protocol = STANDIN_PROTOCOLS
+
+    def __init__(self, *args, **storage_options):
+        """
+        Create stand-in filesystem, storage options other than auto_mkdir are ignored.
+        """
+        super().__init__(auto_mkdir=storage_options.get("auto_mkdir", False))
+
+    @classmethod
+    def _strip_protocol(cls, path):
+        """
+        Map a remote path (or an already mapped local path) to its local stand-in path.
+        :param path: remote path
+        :return: local path
+        """
+        path = str(path)
+        for protocol in STANDIN_PROTOCOLS:
+            if path.startswith(protocol + "://"):
+                path = path[len(protocol) + 3:]
+                break
+        root = os.path.abspath(os.environ[STANDIN_ROOT_ENV])
+        if not (path + "/").startswith(root + "/"):
+            path = posixpath.join(root, path.lstrip("/"))
+        return LocalFileSystem._strip_protocol(path)
+
+    def unstrip_protocol(self, name):
+        """
+        Return path with protocol, kept local.
+        :param name: path
+        :return: path
+        """
+        return name
@@ -0,0 +1,328 @@
+import argparse
+import datetime
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import numpy as np
+import pandas as pd
+from util import info, TRIP_SCHEMA, ZONE_SCHEMA
+
+# ingestion modes benchmarked (shell mode is interactive)
+BENCHMARK_MODES = ["pandas", "dask", "pyspark", "duckdb"]
+# boroughs of synthetic taxi zones
+BOROUGHS = ["Bronx", "Brooklyn", "EWR", "Manhattan", "Queens", "Staten Island", "Unknown"]
+# number of synthetic taxi zones, location ids 264 & 265 are unknown zones as in the real trip files
+N_ZONES = 263
+N_LOCATIONS = 265
+
+
+def run(argv, parser):
+    """
+    Benchmark ingestion modes and configurations on synthetic taxi trips.
+    :param argv: arguments
+    :param parser: argument parser instance
+    """
+    args = setup_parser(parser).parse_args(argv)
+    os.makedirs(args.work_dir, exist_ok=True)
+    zones_path = os.path.join(args.work_dir, "taxi_zones.csv")
+    if not os.path.exists(zones_path):
+        generate_zones(zones_path, args.seed)
+        info("Taxi-zones generated (dst={}).".format(zones_path))
+    results = []
+    for rows in args.rows:
+        trips_path = os.path.join(args.work_dir, "taxi_trips_{}_{}.csv".format(rows, args.seed))
+        if not os.path.exists(trips_path):
+            generate_trips(trips_path, rows, args.seed)
+            info("Taxi-trips generated (dst={}, rows={}, bytes={}).".format(trips_path, rows,
+                                                                           os.path.getsize(trips_path)))
+        for mode in args.modes:
+            for name, config in benchmark_configs(mode, args.cores):
+                for repeat in range(args.repeat):
+                    output_path = os.path.join(args.work_dir, "output", "{}_{}_{}_{}".format(mode, name, rows, repeat))
+                    result = run_benchmark(mode, config, trips_path, zones_path, output_path)
+                    result.update({"mode": mode, "config": name, "input_rows": rows, "repeat": repeat})
+                    results.append(result)
+                    info("Benchmark (mode={}, config={}, rows={}) : {} {:.1f}s, {:.0f} rows/s, peak rss {:.0f}MB "
+                         "(process tree {:.0f}MB), {} files"
+                         .format(mode, name, rows, result["status"], result["wall_seconds"], result["rows_per_second"],
+                                 result["peak_rss_bytes"] / 2 ** 20, result["peak_tree_rss_bytes"] / 2 ** 20,
+                                 result["output_files"]))
+                    if not args.keep_output:
+                        # output and run report of the ingestion removed between runs
+                        for path in [output_path, output_path + "_report"]:
+                            shutil.rmtree(path, ignore_errors=True)
+    results_path = args.results_path or os.path.join(
+        args.work_dir, "benchmark_{}.json".format(datetime.datetime.now().strftime("%Y%m%d_%H%M%S")))
+    with open(results_path, "w") as f:
+        json.dump({"cpus": os.cpu_count(), "cores": args.cores, "seed": args.seed, "results": results}, f, indent=2)
+    print(pd.DataFrame(results)[["mode", "config", "input_rows", "status", "wall_seconds", "rows_per_second",
+                                 "peak_rss_bytes", "peak_tree_rss_bytes", "output_files", "output_rows"]]
+          .to_string(index=False))
+    info("Done. Benchmark results written : {}".format(results_path))
+
+
+def benchmark_configs(mode, cores):
+    """
+    Return benchmarked configurations of an ingestion mode.
+    :param mode: ingestion mode
+    :param cores: number of cores available to the engines
+    :return: list of (configuration name, list of ingestion arguments)
+    """
+    if mode == "pandas":
+        return [("whole", []),
+                ("chunks-1M", ["--chunksize", "1000000"]),
+                ("chunks-1M-mmap", ["--chunksize", "1000000", "--mmap"]),
+                ("workers-{}".format(cores), ["--workers", str(cores), "--range-bytes", str(64 * 1024 * 1024)])]
+    elif mode == "dask":
+        return [("workers-2x{}".format(max(1, cores // 2)),
+                 ["--local-n-workers", "2", "--local-threads-per-worker", str(max(1, cores // 2))]),
+                ("workers-{}x1".format(cores),
+                 ["--local-n-workers", str(cores), "--local-threads-per-worker", "1"]),
+                ("workers-2x{}-pyarrow".format(max(1, cores // 2)),
+                 ["--local-n-workers", "2", "--local-threads-per-worker", str(max(1, cores // 2)),
+                  "--csv-engine", "pyarrow"]),
+                ("workers-2x{}-clustered".format(max(1, cores // 2)),
+                 ["--local-n-workers", "2", "--local-threads-per-worker", str(max(1, cores // 2)),
+                  "--write-layout", "clustered", "--max-records-per-file", "1000000"])]
+    elif mode == "pyspark":
+        return [("local-{}".format(cores), ["--master", "local[{}]".format(cores), "--driver-cores", str(cores)]),
+                ("local-{}-sort-merge".format(cores), ["--master", "local[{}]".format(cores),
+                                                       "--driver-cores", str(cores), "--zones-join", "sort-merge"]),
+                ("local-{}-clustered".format(cores), ["--master", "local[{}]".format(cores),
+                                                      "--driver-cores", str(cores), "--write-layout", "clustered",
+                                                      "--target-file-size-mb", "256"])]
+    elif mode == "duckdb":
+        return [("threads-{}".format(cores), ["--threads", str(cores)]),
+                ("threads-{}-1GB".format(cores), ["--threads", str(cores), "--memory-limit", "1GB"])]
+    raise ValueError("Unsupported benchmark mode {}".format(mode))
+
+
+def run_benchmark(mode, config, trips_path, zones_path, output_path):
+    """
+    Run ingestion mode in a subprocess, measuring wall time, peak memory and output files.
+    :param mode: ingestion mode
+    :param config: ingestion arguments
+    :param trips_path: taxi trips input path
+    :param zones_path: taxi zones input path
+    :param output_path: output path
+    :return: result dict
+    """
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                            "taxi_rides_data_ingestion.py"), mode,
+               "--taxi-trips-path", trips_path, "--taxi-zones-path", zones_path, "--output-path", output_path,
+               "--report-dir", os.path.join(output_path + "_report")] + config
+    wall = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    # memory of the whole process tree (dask workers, spark jvm) sampled while running
+    sampler = TreeRssSampler(process.pid)
+    sampler.start()
+    stderr = process.stderr.read()
+    _, status, rusage = os.wait4(process.pid, 0)
+    wall = time.perf_counter() - wall
+    sampler.stop()
+    process.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -1
+    output_files, output_rows = parquet_output(output_path)
+    return {"status": "ok" if process.returncode == 0 else "failed",
+            "wall_seconds": wall,
+            "rows_per_second": output_rows / wall,
+            "output_rows": output_rows,
+            "output_files": output_files,
+            # largest single process of the tree (reaped descendants included)
+            "peak_rss_bytes": rusage.ru_maxrss * 1024,
+            "peak_tree_rss_bytes": sampler.peak,
+            "cpu_seconds": rusage.ru_utime + rusage.ru_stime,
+            "error": stderr.decode(errors="replace")[-2000:] if process.returncode != 0 else None}
+
+
+class TreeRssSampler(threading.Thread):
+    """
+    Thread sampling the total resident set size of a process and its descendants from /proc.
+    """
+
+    def __init__(self, pid, interval=0.2):
+        """
+        Create process tree rss sampler.
+        :param pid: root process id
+        :param interval: sampling interval in seconds
+        """
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        """
+        Sample process tree rss until stopped.
+        """
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, tree_rss(self.pid))
+
+    def stop(self):
+        """
+        Stop sampling and wait for the sampler thread.
+        """
+        self.stopped.set()
+        self.join()
+
+
+def tree_rss(pid):
+    """
+    Return total resident set size of a process and its descendants in bytes (linux only).
+    :param pid: root process id
+    :return: rss in bytes
+    """
+    children, rss = {}, {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open("/proc/{}/stat".format(entry)) as f:
+                # fields following the parenthesized command name : state, ppid, ..., rss (24th field) in pages
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        children.setdefault(int(fields[1]), []).append(int(entry))
+        rss[int(entry)] = int(fields[21]) * os.sysconf("SC_PAGE_SIZE")
+    total, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        total += rss.get(current, 0)
+        pending += children.get(current, [])
+    return total
+
+
+def parquet_output(output_path):
+    """
+    Return number of parquet files and records of an output dataset, read from parquet footers.
+    :param output_path: output path
+    :return: (number of files, number of records)
+    """
+    import pyarrow.parquet as pq
+    files, rows = 0, 0
+    for root, dirs, names in os.walk(output_path):
+        # hidden & metadata directories (_reports, _staging ...) are not part of the dataset
+        dirs[:] = [d for d in dirs if not d.startswith(("_", "."))]
+        for name in names:
+            if name.endswith(".parquet") or (name.startswith("part-") and not name.endswith(".crc")):
+                files += 1
+                rows += pq.ParquetFile(os.path.join(root, name)).metadata.num_rows
+    return files, rows
+
+
+def generate_zones(path, seed):
+    """
+    Generate deterministic synthetic taxi zones csv.
+    :param path: output path
+    :param seed: random seed
+    """
+    random = np.random.RandomState(seed)
+    location_ids = np.arange(1, N_ZONES + 1)
+    zdf = pd.DataFrame({"OBJECTID": location_ids,
+                        "Shape_Leng": np.round(random.uniform(0.01, 0.5, N_ZONES), 6),
+                        "the_geom": ["MULTIPOLYGON ((({:.4f} {:.4f}, {:.4f} {:.4f})))"
+                                     .format(-74.0 + i / 1000, 40.5 + i / 1000, -73.9 + i / 1000, 40.6 + i / 1000)
+                                     for i in location_ids],
+                        "Shape_Area": np.round(random.uniform(0.0001, 0.01, N_ZONES), 8),
+                        "zone": ["Zone {}".format(i) for i in location_ids],
+                        "LocationID": location_ids,
+                        "borough": np.array(BOROUGHS)[random.randint(0, len(BOROUGHS), N_ZONES)]})
+    zdf[[name for name, _ in ZONE_SCHEMA]].to_csv(path, index=False)
+
+
+def generate_trips(path, rows, seed, start="2020-01-01", days=31, block_rows=1000000):
+    """
+    Generate deterministic synthetic taxi trips csv, written by blocks of records.
+    :param path: output path
+    :param rows: number of records
+    :param seed: random seed
+    :param start: first pickup date
+    :param days: number of pickup days
+    :param block_rows: number of records generated at once
+    """
+    start_seconds = np.datetime64(start, "s").astype(np.int64)
+    with open(path, "w", newline="") as f:
+        for block, offset in enumerate(range(0, rows, block_rows)):
+            n = min(block_rows, rows - offset)
+            # each block has its own stream, the output does not depend on the block size of other blocks
+            random = np.random.RandomState([seed, block])
+            pickup = start_seconds + random.randint(0, days * 86400, n)
+            dropoff = pickup + random.randint(60, 3600, n)
+            fare = np.round(random.uniform(2.5, 80.0, n), 2)
+            extra = random.choice([0.0, 0.5, 1.0, 2.5], n)
+            tip = np.round(random.uniform(0.0, 20.0, n) * (random.rand(n) < 0.7), 2)
+            tolls = random.choice([0.0, 0.0, 0.0, 6.12], n)
+            tdf = pd.DataFrame({"VendorID": random.randint(1, 3, n),
+                                "tpep_pickup_datetime": format_timestamps(pickup),
+                                "tpep_dropoff_datetime": format_timestamps(dropoff),
+                                "passenger_count": random.randint(1, 7, n),
+                                "trip_distance": np.round(random.exponential(3.0, n), 2),
+                                "RatecodeID": random.choice([1, 1, 1, 1, 2, 5], n),
+                                "store_and_fwd_flag": np.where(random.rand(n) < 0.01, "Y", "N"),
+                                "PULocationID": random.randint(1, N_LOCATIONS + 1, n),
+                                "DOLocationID": random.randint(1, N_LOCATIONS + 1, n),
+                                "payment_type": random.choice([1, 1, 2, 3, 4], n),
+                                "fare_amount": fare,
+                                "extra": extra,
+                                "mta_tax": 0.5,
+                                "tip_amount": tip,
+                                "tolls_amount": tolls,
+                                "improvement_surcharge": 0.3,
+                                "total_amount": np.round(fare + extra + 0.5 + tip + tolls + 0.3, 2)})
+            tdf[[name for name, _ in TRIP_SCHEMA]].to_csv(f, header=block == 0, index=False)
+
+
+def format_timestamps(seconds):
+    """
+    Format epoch seconds as MM/DD/YYYY hh:mm:ss AM/PM strings, built as fixed-width ascii bytes.
+    :param seconds: int64 array of epoch seconds
+    :return: array of strings
+    """
+    dt = seconds.astype("datetime64[s]")
+    months = dt.astype("datetime64[M]")
+    year = months.astype(np.int64) // 12 + 1970
+    month = months.astype(np.int64) % 12 + 1
+    day = (dt.astype("datetime64[D]") - months.astype("datetime64[D]")).astype(np.int64) + 1
+    second_of_day = seconds % 86400
+    hour = second_of_day // 3600
+    chars = np.full((len(seconds), 22), ord(" "), dtype=np.uint8)
+    for position, value, width in [(0, month, 2), (3, day, 2), (6, year, 4), (11, (hour + 11) % 12 + 1, 2),
+                                   (14, second_of_day // 60 % 60, 2), (17, second_of_day % 60, 2)]:
+        for i in range(width):
+            chars[:, position + width - 1 - i] = ord("0") + value // 10 ** i % 10
+    chars[:, [2, 5]] = ord("/")
+    chars[:, [13, 16]] = ord(":")
+    chars[:, 20] = np.where(hour < 12, ord("A"), ord("P"))
+    chars[:, 21] = ord("M")
+    return chars.view("S22").ravel().astype("U22")
+
+
+def setup_parser(parser):
+    """
+    Setup argument parser.
+    :param parser: argument parser
+    :return: configured parser
+    """
+    parser.add_argument('--work-dir', required=True, help="Directory of generated inputs, outputs and results.")
+    parser.add_argument('--rows', required=False, type=int, nargs="+", default=[1000000, 10000000, 50000000],
+                        help="Numbers of taxi trips records of the generated inputs.")
+    parser.add_argument('--modes', required=False, nargs="+", default=BENCHMARK_MODES, choices=BENCHMARK_MODES,
+                        help="Benchmarked ingestion modes.")
+    parser.add_argument('--cores', required=False, type=int, default=os.cpu_count(),
+                        help="Number of cores available to the engines, defaults to number of cpus.")
+    parser.add_argument('--seed', required=False, type=int, default=42, help="Random seed of generated inputs.")
+    parser.add_argument('--repeat', required=False, type=int, default=1, help="Number of runs of each benchmark.")
+    parser.add_argument('--results-path', required=False,
+                        help="Json results path, defaults to a timestamped file in the work directory.")
+    parser.add_argument('--keep-output', required=False, action="store_true",
+                        help="Keep output datasets of the benchmarked runs.")
+    return parser
+
+
+if __name__ == "__main__":
+    run(sys.argv[1:], argparse.ArgumentParser(prog=os.path.basename(sys.argv[0]),
+                                              description="Taxi rides data ingestion benchmark"))
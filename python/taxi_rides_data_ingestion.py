@@ -5,7 +5,7 @@ import argparse
 # Modes available  ( maybe pandas-dask-yarn)
 from util import error
 
-ALL_MODES = ["shell", "pandas", "dask", "pyspark"]
+ALL_MODES = ["shell", "pandas", "dask", "pyspark", "duckdb", "serve"]
 
 
 def main(argv):
@@ -15,6 +15,10 @@ def main(argv):
     :return: exit code
     """
 
+    # engine modules are only imported for their mode
+    if not argv or argv[0] in ["-h", "--help"]:
+        print("usage: {} {{{}}} ...".format(os.path.basename(sys.argv[0]), ",".join(ALL_MODES)))
+        exit(0 if argv else 2)
     mode = argv[0]
     args = argv[1:]
     if mode == "shell":
@@ -25,6 +29,10 @@ def main(argv):
         from taxi_rides_data_ingestion_dask import run
     elif mode == "pyspark":
         from taxi_rides_data_ingestion_pyspark import run
+    elif mode == "duckdb":
+        from taxi_rides_data_ingestion_duckdb import run
+    elif mode == "serve":
+        from taxi_rides_data_ingestion_serve import run
     else:
         error("Wrong mode \"{}\". Please provide mode from the available ones {}".format(mode, str(ALL_MODES)))
         exit(2)
@@ -1,10 +1,16 @@
 import argparse
-import decimal
-import pandas as pd
-import dask.dataframe as dd
-from dask.distributed import Client, LocalCluster
+import os
 from util import *
 
+# imported on first use
+pd = lazy_import("pandas")
+pa = lazy_import("pyarrow")
+dask = lazy_import("dask")
+dd = lazy_import("dask.dataframe")
+dask_bytes = lazy_import("dask.bytes")
+dask_utils = lazy_import("dask.utils")
+distributed = lazy_import("dask.distributed")
+
 
 def run(argv, parser):
     """
@@ -18,53 +24,160 @@ def run(argv, parser):
     storage_options = generate_storage_options(args)
     # app id
     app_id = generate_app_id()
-    # launch local cluster or register to remote one
-    if args.scheduler is None or args.scheduler == "local":
-        client = Client(LocalCluster(name="taxi_rides_dask_cluster",
-                                     n_workers=args.local_n_workers,
-                                     threads_per_worker=args.local_threads_per_worker))
-    else:
-        client = Client(args.scheduler)
+    # stage timings, memory & rows of the run, stages before the write only build the task graph
+    profiler = RunProfiler(app_id, "dask")
+    # get filtering_rules compiled to datetime bounds
+    filtering_bounds = filtering_rules_to_bounds(get_filtering_rules(args))
+    # only new files & bytes appended since the last run recorded in the manifest
+    if args.incremental:
+        manifest, slices = plan_incremental_ingestion(args.taxi_trips_path, args.output_path, storage_options)
+        if not any(input_slice["end"] > input_slice["start"] for input_slice in slices):
+            commit_manifest(args.output_path, manifest, slices, app_id, storage_options)
+            # reported as a run writing no rows
+            with profiler.stage("write") as stage:
+                stage["rows_out"] = 0
+            info("Done. No new input since last ingestion (src={})".format(args.taxi_trips_path))
+            info("Run report written : {}".format(profiler.write_report(report_dir(args), storage_options)))
+            return
+    # launch local cluster or register to remote one, kept across the jobs of the serve mode
+    client = warm_resource(("dask", args.scheduler, args.local_n_workers, args.local_threads_per_worker,
+                            args.local_memory_limit, args.local_memory_target, args.local_memory_spill,
+                            args.local_directory), lambda: dask_client(args))
+    if args.storage_standin:
+        # workers serve remote paths from the same local stand-in directory
+        client.run(use_storage_standin, args.storage_standin)
     info("Dask cluster : {}.".format(client.cluster))
     # get taxi zones dataframe
-    taxi_zones_df = taxi_zones(client, args.taxi_zones_path, storage_options)
+    with profiler.stage("zones") as stage:
+        taxi_zones_df = warm_zones(args.taxi_zones_path, storage_options,
+                                   lambda: taxi_zones(client, args.taxi_zones_path, storage_options))
+        stage["rows_out"] = len(taxi_zones_df)
     info("Taxi-zones dataframe loaded (csv-src={}).".format(args.taxi_zones_path))
+    if args.zones_layout == "dimension":
+        info("Taxi-zones dimension written : {}".format(write_zones_dimension(taxi_zones_df, args.output_path,
+                                                                              storage_options)))
+    taxi_zones_df = zones_layout(taxi_zones_df, args.zones_layout)
+    # zones shipped once to every worker instead of along with each task
+    zones = client.scatter([taxi_zones_df], broadcast=True)[0]
     # get taxi rides dataframe
-    taxi_rides_df = taxi_rides(args.taxi_trips_path, storage_options)
-    info("Taxi-rides dataframe loaded (src={}).".format(args.taxi_trips_path))
-    # get filtering_rules & pandas expression
-    filtering_expression = filtering_rules_to_expression(get_filtering_rules(args), rule_to_expression)
+    # ingested taxi rides parquet dataset (re-enrichment) read by files pruned on pickup dates
+    parquet_input = not args.incremental and is_parquet_input(args.taxi_trips_path, storage_options)
+    # staging cache of parsed taxi rides, not used for incremental ingestion
+    cache, cache_key, cache_entry = None, None, None
+    if args.cache_dir and not args.incremental and not parquet_input:
+        cache = StagingCache(args.cache_dir, parse_size(args.cache_budget))
+        cache_key = cache.key(args.taxi_trips_path, storage_options)
+        cache_entry = cache.lookup(cache_key)
+        info("Taxi-rides staging cache {} (src={}, entry={}).".format("hit" if cache_entry else "miss",
+                                                                      args.taxi_trips_path,
+                                                                      os.path.join(args.cache_dir, cache_key)))
+    with profiler.stage("read"):
+        if args.incremental:
+            taxi_rides_df = taxi_rides_slices(slices, storage_options)
+        elif parquet_input:
+            taxi_rides_df = taxi_rides_parquet(args.taxi_trips_path, zones, filtering_bounds, storage_options)
+        elif cache_entry is not None:
+            taxi_rides_df = taxi_rides_cache(cache_entry, filtering_bounds)
+        elif args.csv_engine == "pyarrow" or cache is not None:
+            taxi_rides_df = taxi_rides_arrow(args.taxi_trips_path, storage_options)
+        else:
+            taxi_rides_df = taxi_rides(args.taxi_trips_path, storage_options)
+        if cache is not None and cache_entry is None:
+            # whole parsed rides written to the cache once by the workers, then read from the cache
+            cache_fill = cache.fill(cache_key)
+            dask.compute(*[dask.delayed(cache.write)(cache_fill, partition_df, i)
+                           for i, partition_df in enumerate(taxi_rides_df.to_delayed())])
+            cache_entry = cache.commit(cache_key, cache_fill)
+            if cache_entry is not None:
+                taxi_rides_df = taxi_rides_cache(cache_entry, filtering_bounds)
+    info("Taxi-rides dataframe loaded (src={}, csv-engine={}).".format(args.taxi_trips_path, args.csv_engine))
     # filter
-    if filtering_expression is not None:
-        info("Applying filtering expression : {}".format(filtering_expression))
-        taxi_rides_df = taxi_rides_df.query(filtering_expression)
+    if filtering_bounds:
+        info("Applying filtering bounds : {}".format(filtering_bounds_to_string(filtering_bounds)))
+        with profiler.stage("filter"):
+            taxi_rides_df = taxi_rides_df[filtering_mask(taxi_rides_df, filtering_bounds)]
+    # rollups of each partition merged by a single task, computed along with the write
+    rollups = None
+    if args.rollups:
+        with profiler.stage("rollups"):
+            location_ids = taxi_zones_df.index.to_numpy()
+            rollups = dask.delayed(merge_rollups)([dask.delayed(rollup_partial)(partition_df, location_ids)
+                                                   for partition_df in taxi_rides_df.to_delayed()])
     # join
     info("Joining dataframes")
-    taxi_rides_df = join_with_zones(taxi_rides_df, taxi_zones_df)
+    with profiler.stage("join"):
+        taxi_rides_df = join_with_zones(client, taxi_rides_df, taxi_zones_df)
     # generate app_id and date_PU column
     info("Generating additional columns")
-    taxi_rides_df["app_id"] = app_id
-    taxi_rides_df["date_PU"] = taxi_rides_df["datetime_PU"].dt.strftime("%Y%m%d")
-    # write
-    taxi_rides_df.to_parquet(args.output_path, partition_on=["date_PU", "borough_PU"],
-                             storage_options=storage_options,
-                             compression="snappy",
-                             write_index=False)
+    with profiler.stage("columns"):
+        taxi_rides_df["app_id"] = app_id
+        taxi_rides_df["date_PU"] = taxi_rides_df["datetime_PU"].map_partitions(date_partition_keys_series,
+                                                                              meta=("date_PU", "category"))
+    # output layout, rows of a pickup date shuffled to a single partition
+    if args.write_layout == "clustered":
+        info("Shuffling by pickup date (partitions={})".format(taxi_rides_df.npartitions))
+        with profiler.stage("layout"):
+            taxi_rides_df = taxi_rides_df.shuffle("date_PU", npartitions=taxi_rides_df.npartitions)
+    # write, whole task graph computed
+    info("Writing (write-layout={}, max-records-per-file={})".format(args.write_layout,
+                                                                    args.max_records_per_file or "unlimited"))
+    with profiler.stage("write") as stage, distributed.get_task_stream(client) as task_stream:
+        writes = [dask.delayed(write_partition)(partition_df, args.output_path, storage_options,
+                                                args.max_records_per_file)
+                  for partition_df in taxi_rides_df.to_delayed()]
+        results = dask.compute(*writes, rollups)
+        stage["rows_out"] = sum(results[:-1])
+        rollups = results[-1]
+    profiler.metrics["dask_task_stream"] = task_stream_metrics(task_stream.data)
+    if args.incremental:
+        # recorded once the output is written, a failed run is ingested again by the next one
+        commit_manifest(args.output_path, manifest, slices, app_id, storage_options)
+        info("Ingestion manifest updated (files={}).".format(len(slices)))
     info("Done. Data persisted at : {}".format(args.output_path))
+    if rollups is not None:
+        with profiler.stage("rollups_write") as stage:
+            stage["rows_out"] = len(rollups)
+            rollups_path = write_rollups(finish_rollups(rollups), args.output_path, app_id, storage_options)
+        info("Rollups written : {} ({} records)".format(rollups_path, len(rollups)))
+    info("Run report written : {}".format(profiler.write_report(report_dir(args), storage_options)))
+
+
+def dask_client(args):
+    """
+    Return client of a new local cluster or of a remote scheduler. Local workers spill managed memory to their
+    local directory beyond the target fraction of their memory limit (beyond the spill fraction of the process
+    memory), pause at 80% and are restarted at 95%.
+    :param args: arguments
+    :return: client instance
+    """
+    if args.scheduler is None or args.scheduler == "local":
+        # worker memory settings passed by the nanny to the worker processes, set once the distributed config
+        # defaults are loaded
+        local_cluster = distributed.LocalCluster
+        with dask.config.set({"distributed.worker.memory.target": args.local_memory_target,
+                              "distributed.worker.memory.spill": args.local_memory_spill,
+                              "distributed.worker.memory.pause": 0.8,
+                              "distributed.worker.memory.terminate": 0.95}):
+            return distributed.Client(local_cluster(name="taxi_rides_dask_cluster",
+                                                    n_workers=args.local_n_workers,
+                                                    threads_per_worker=args.local_threads_per_worker,
+                                                    memory_limit=args.local_memory_limit,
+                                                    local_directory=args.local_directory))
+    return distributed.Client(args.scheduler)
 
 
 def taxi_zones(client, path, storage_options=None):
     """
-    Return taxi-zones dask dataframe.
+    Return taxi-zones pandas dataframe, small enough to be shipped along with each partition.
     :param client: client instance
     :param path: input path
     :param storage_options: storage options dict
     :return: taxi-zones dataframe
     """
-    zdf = dd.read_csv(path, storage_options=storage_options)
+    zdf = unique_taxi_zones(client.compute(dd.read_csv(path, storage_options=storage_options)).result()
+                            .reset_index(drop=True))
     zdf = zdf.drop("OBJECTID", axis="columns")
-    zdf = zdf.set_index("LocationID")
-    return client.persist(zdf)
+    return zdf.set_index("LocationID")
 
 
 def taxi_rides(path, storage_options=None):
@@ -74,67 +187,203 @@ def taxi_rides(path, storage_options=None):
     :param storage_options: storage options dict
     :return: taxi-rides dataframe
     """
-    # transformation function for proper datetime type
-    date_parser = lambda col: pd.to_datetime(col, format="%m/%d/%Y %I:%M:%S %p")
-    # transformation function for proper monetary columns
-    to_decimal = lambda x: decimal.Decimal("{:.2f}".format(round(float(x), 2)))
-    monetary_columns = ["fare_amount", "extra", "mta_tax", "tip_amount", "tolls_amount", "improvement_surcharge",
-                        "total_amount"]
-    decimal_converters = dict(((column, to_decimal) for column in monetary_columns))
+    # monetary columns are parsed as floats, converted to decimals in bulk when written
+    monetary_dtypes = dict(((column, "float64") for column in MONETARY_COLUMNS))
     # get dataframe
-    return dd.read_csv(path, parse_dates={"datetime_PU": ["tpep_pickup_datetime"],
-                                          "datetime_DO": ["tpep_dropoff_datetime"]},
-                       date_parser=date_parser,
-                       converters=decimal_converters,
-                       true_values='Y', false_values='N',
-                       storage_options=storage_options)
+    taxi_rides_df = dd.read_csv(path, dtype=monetary_dtypes,
+                                true_values=['Y'], false_values=['N'],
+                                storage_options=storage_options)
+    # parse pickup/dropoff timestamps of each partition
+    return taxi_rides_df.map_partitions(prepare_taxi_rides, meta=prepare_taxi_rides(taxi_rides_df._meta))
+
+
+def taxi_rides_arrow(path, storage_options=None):
+    """
+    Return taxi-rides dask dataframe, partitions are newline-aligned byte blocks read with the pyarrow csv
+    reader and the shared explicit schema.
+    :param path: input path
+    :param storage_options: storage options dict
+    :return: taxi-rides dataframe
+    """
+    sample, blocks = dask_bytes.read_bytes(path, delimiter=b"\n", **(storage_options or {}))
+    column_names = sample.split(b"\n", 1)[0].decode().strip().split(",")
+    # first block of each file starts with the header row
+    partitions = [dask.delayed(taxi_rides_block)(block, column_names, i == 0)
+                  for file_blocks in blocks for i, block in enumerate(file_blocks)]
+    meta = prepare_taxi_rides_arrow(arrow_schema(TRIP_SCHEMA, decimals=False).empty_table()).to_pandas()
+    return dd.from_delayed(partitions, meta=meta)
+
+
+def taxi_rides_slices(slices, storage_options=None, block_bytes=64 * 1024 * 1024):
+    """
+    Return taxi-rides dask dataframe of input file slices (incremental ingestion), partitions are newline-aligned
+    byte ranges read with the pyarrow csv reader and the shared explicit schema.
+    :param slices: input slices as dict of path, start and end
+    :param storage_options: storage options dict
+    :param block_bytes: maximum partition size in bytes
+    :return: taxi-rides dataframe
+    """
+    partitions = []
+    for input_slice in slices:
+        if input_slice["end"] > input_slice["start"]:
+            header, ranges = newline_aligned_ranges(input_slice["path"], block_bytes, storage_options,
+                                                    start=input_slice["start"], end=input_slice["end"])
+            column_names = header.decode().strip().split(",")
+            partitions += [dask.delayed(taxi_rides_block)(dask.delayed(read_range)(input_slice["path"], start, end,
+                                                                                   storage_options),
+                                                          column_names, False)
+                           for start, end in ranges]
+    meta = prepare_taxi_rides_arrow(arrow_schema(TRIP_SCHEMA, decimals=False).empty_table()).to_pandas()
+    return dd.from_delayed(partitions, meta=meta)
+
+
+def taxi_rides_cache(entry, filtering_bounds=None):
+    """
+    Return taxi-rides dask dataframe of a staging cache entry, partitions are cached row groups pruned by
+    filtering bounds.
+    :param entry: cache entry directory
+    :param filtering_bounds: filtering bounds
+    :return: taxi-rides dataframe
+    """
+    meta = prepare_taxi_rides_arrow(arrow_schema(TRIP_SCHEMA, decimals=False).empty_table()).to_pandas()
+    partitions = [dask.delayed(taxi_rides_cache_partition)(path, i)
+                  for path, i in StagingCache.row_groups(entry, filtering_bounds or [])]
+    if not partitions:
+        return dd.from_pandas(meta, npartitions=1)
+    return dd.from_delayed(partitions, meta=meta)
+
+
+def taxi_rides_cache_partition(path, index):
+    """
+    Return taxi-rides pandas dataframe of a cached row group.
+    :param path: cached part path
+    :param index: row group index
+    :return: taxi-rides pandas dataframe
+    """
+    return float_monetary_columns(StagingCache.read(path, index)).to_pandas()
+
+
+def taxi_rides_parquet(path, zones, filtering_bounds=None, storage_options=None):
+    """
+    Return taxi-rides dask dataframe of an ingested parquet dataset, partitions are dataset files pruned on pickup
+    dates, their row groups pruned by filtering bounds.
+    :param path: dataset path
+    :param zones: taxi zone pandas dataframe future, scattered to the workers
+    :param filtering_bounds: filtering bounds
+    :param storage_options: storage options dict
+    :return: taxi-rides dataframe
+    """
+    meta = prepare_taxi_rides_arrow(arrow_schema(TRIP_SCHEMA, decimals=False).empty_table()).to_pandas()
+    partitions = [dask.delayed(taxi_rides_parquet_partition)(file_path, file_partitions, zones, filtering_bounds,
+                                                             storage_options)
+                  for file_path, file_partitions in parquet_dataset_files(path, filtering_bounds or [],
+                                                                          storage_options)]
+    if not partitions:
+        return dd.from_pandas(meta, npartitions=1)
+    return dd.from_delayed(partitions, meta=meta)
+
+
+def taxi_rides_parquet_partition(path, partitions, taxi_zones_df, filtering_bounds=None, storage_options=None):
+    """
+    Return taxi-rides pandas dataframe of an ingested parquet file.
+    :param path: parquet file path
+    :param partitions: dict of partition column to value of the file
+    :param taxi_zones_df: taxi zone pandas dataframe
+    :param filtering_bounds: filtering bounds
+    :param storage_options: storage options dict
+    :return: taxi-rides pandas dataframe
+    """
+    return float_monetary_columns(read_parquet_taxi_rides(path, partitions, taxi_zones_df, filtering_bounds,
+                                                          storage_options)).to_pandas()
+
+
+def float_monetary_columns(table):
+    """
+    Convert decimal monetary columns of a taxi-rides pyarrow table to floats, converted back to decimals in bulk
+    when written.
+    :param table: taxi-rides pyarrow table
+    :return: taxi-rides pyarrow table
+    """
+    for column in MONETARY_COLUMNS:
+        table = table.set_column(table.column_names.index(column), column,
+                                 pa.array(from_decimal_array(table.column(column))))
+    return table
+
+
+def taxi_rides_block(block, column_names, header):
+    """
+    Return taxi-rides pandas dataframe of a csv byte block.
+    :param block: csv bytes
+    :param column_names: csv column names
+    :param header: whether block starts with the header row
+    :return: taxi-rides pandas dataframe
+    """
+    # blocks holding no records (only the header row) are not parsed
+    records = block.strip().partition(b"\n")[2] if header else block.strip()
+    # monetary columns are read as floats, converted to decimals in bulk when written
+    if len(records) == 0:
+        table = arrow_schema(TRIP_SCHEMA, decimals=False).empty_table()
+    else:
+        table = read_csv_arrow(pa.py_buffer(block), TRIP_SCHEMA, decimals=False,
+                               column_names=column_names, skip_rows=1 if header else 0)
+    return prepare_taxi_rides_arrow(table).to_pandas()
 
 
-def join_with_zones(taxi_rides_df, taxi_zones_df):
+def join_with_zones(client, taxi_rides_df, taxi_zones_df):
     """
     Perform joining taxi-rides and taxi zones dataframes on Location ID.
+    :param client: client instance
     :param taxi_rides_df: taxi rides dataframe
-    :param taxi_zones_df: taxi zone dataframe
+    :param taxi_zones_df: taxi zone pandas dataframe
     :return: joined  taxi-rides and taxi zones dataframes on Location ID
     """
-    # inner join on pickup location id, drop duplicate columns
-    taxi_rides_df = taxi_rides_df.merge(taxi_zones_df, how="inner",
-                                        left_on="PULocationID",
-                                        right_on="LocationID",
-                                        right_index=True)
-    taxi_rides_df = taxi_rides_df.drop("PULocationID", axis="columns")
-    # inner join on drop off location id, drop duplicate columns
-    taxi_rides_df = taxi_rides_df.merge(taxi_zones_df, how="inner",
-                                        left_on="DOLocationID",
-                                        right_on="LocationID",
-                                        suffixes=["_PU", "_DO"],
-                                        right_index=True)
-    taxi_rides_df = taxi_rides_df.drop("DOLocationID", axis="columns")
-    return taxi_rides_df
-
-
-# define rule to expression
-def rule_to_expression(filtering_rule):
-    """
-        Single filtering rule to expression
-        :param filtering_rule:
-        :return:
-        """
-    column = filtering_rule["column"]
-    filter_type = filtering_rule["type"]
-    filter_params = filtering_rule["value"]
-    if filter_type == "range":
-        sdt = "Timestamp({},{},{})".format(filter_params[0][0], filter_params[0][1], filter_params[0][2])
-        edt = "Timestamp({},{},{})".format(filter_params[1][0], filter_params[1][1], filter_params[1][2])
-        return "{}.dt.date >= {} and {}.dt.date <= {}".format(column, sdt, column, edt)
-    elif filter_type == "date":
-        return "{}.dt.year == {} and {}.dt.month == {} and {}.dt.day == {}".format(column, filter_params[0],
-                                                                                   column, filter_params[1],
-                                                                                   column, filter_params[2])
-    elif filter_type == "year-month":
-        return "{}.dt.year == {} and {}.dt.month == {}".format(column, filter_params[0], column, filter_params[1])
-    elif filter_type == "year":
-        return "{}.dt.year == {}".format(column, filter_params)
+    # location ids are small dense integers, zone attributes are gathered by position in each partition
+    lookup = zones_lookup(taxi_zones_df)
+    # lookup broadcast to every worker once, referenced by the partition tasks
+    lookup_future = client.scatter([lookup], broadcast=True)[0]
+    return taxi_rides_df.map_partitions(lookup_join, lookup_future, meta=lookup_join(taxi_rides_df._meta, lookup))
+
+
+def write_partition(taxi_rides_df, path, storage_options=None, max_records_per_file=None):
+    """
+    Write partition of taxi-rides dataframe as partitioned parquet dataset.
+    :param taxi_rides_df: taxi-rides pandas dataframe
+    :param path: output path
+    :param storage_options: storage options dict
+    :param max_records_per_file: maximum number of records per file, unlimited by default
+    :return: number of records written
+    """
+    write_parquet(taxi_rides_df, path, ["date_PU", "borough_PU"], storage_options, max_records_per_file)
+    return len(taxi_rides_df)
+
+
+def task_stream_metrics(tasks):
+    """
+    Return task count, compute seconds and workers of dask task stream records by task prefix.
+    :param tasks: task stream records
+    :return: dict of task prefix to metrics
+    """
+    metrics = {}
+    for task in tasks:
+        prefix = dask_utils.key_split(task["key"])
+        task_metrics = metrics.setdefault(prefix, {"tasks": 0, "compute_seconds": 0.0, "transfer_seconds": 0.0,
+                                                   "workers": []})
+        task_metrics["tasks"] += 1
+        for startstop in task["startstops"]:
+            if startstop["action"] in ("compute", "transfer"):
+                task_metrics[startstop["action"] + "_seconds"] += startstop["stop"] - startstop["start"]
+        if task["worker"] not in task_metrics["workers"]:
+            task_metrics["workers"].append(task["worker"])
+    return metrics
+
+
+def date_partition_keys_series(datetime_series):
+    """
+    Return date partition keys of a datetime pandas series.
+    :param datetime_series: datetime pandas series
+    :return: categorical pandas series of date keys
+    """
+    return pd.Series(date_partition_keys(datetime_series), index=datetime_series.index, name="date_PU")
 
 
 def setup_parser(parser):
@@ -152,6 +401,28 @@ def setup_parser(parser):
                         help="Number of threads per Dask worker.")
     parser.add_argument('--local-memory-limit', required=False, default="2G",
                         help="Memory limit of Dask worker.")
+    parser.add_argument('--local-memory-target', required=False, type=float, default=0.6,
+                        help="Fraction of the worker memory limit of managed data beyond which it is spilled to disk.")
+    parser.add_argument('--local-memory-spill', required=False, type=float, default=0.7,
+                        help="Fraction of the worker memory limit of process memory beyond which data is spilled to "
+                             "disk.")
+    parser.add_argument('--local-directory', required=False,
+                        help="Local directory of Dask workers spilled data, defaults to a temporary directory.")
+    parser.add_argument('--write-layout', required=False, default="tasks", choices=["tasks", "clustered"],
+                        help="Output layout, 'tasks' writes a file per dask partition and partition, 'clustered' "
+                             "shuffles rows by pickup date before the write.")
+    parser.add_argument('--max-records-per-file', type=int, required=False, default=0,
+                        help="Maximum number of records per output file, unlimited by default.")
+    parser.add_argument('--cache-dir', required=False,
+                        help="Local staging cache directory of parsed taxi rides (shared by local workers), reused "
+                             "by later runs on the same input (path, size & mtime). Cache misses are read with the "
+                             "pyarrow csv reader. Not used by incremental ingestion.")
+    parser.add_argument('--cache-budget', required=False, default="20G",
+                        help="Disk budget of the staging cache (e.g. 512M, 20G), least recently used entries are "
+                             "evicted first.")
+    parser.add_argument('--csv-engine', required=False, default="pandas", choices=["pandas", "pyarrow"],
+                        help="CSV reader engine, 'pyarrow' reads with the explicit schema in a multithreaded "
+                             "block-based reader.")
 
     return parser
 
@@ -0,0 +1,415 @@
+import argparse
+import hashlib
+import json
+import os
+import posixpath
+from util import *
+
+# imported on first use
+duckdb = lazy_import("duckdb")
+
+
+def run(argv, parser):
+    """
+    Implementation of duckdb-flavored taxi rides, a single process using all cores with a memory limit and
+    spilling to local disk.
+    :param argv: arguments
+    :param parser: argument parser isntance
+    """
+    # parse arguments
+    args = setup_parser(init_parser(parser)).parse_args(argv)
+    # app id
+    app_id = generate_app_id()
+    # set storage options if provided
+    storage_options = generate_storage_options(args)
+    # stage timings, memory & rows of the run, stages before the write only build the query
+    profiler = RunProfiler(app_id, "duckdb")
+    # get filtering_rules compiled to datetime bounds
+    filtering_bounds = filtering_rules_to_bounds(get_filtering_rules(args))
+    # start duckdb connection, remote paths read & written through the pooled fsspec filesystems
+    database, database_key = duckdb_database(args, storage_options)
+    # run queried through its own connection to the (warm) database, views & temp tables are local to it
+    con = database.cursor()
+    info("DuckDB connection (threads={}, memory-limit={}, temp-directory={}).".format(
+        args.threads or os.cpu_count(), args.memory_limit, args.temp_directory))
+    # get taxi zones relation, zones table kept in the database across serve mode jobs until the zones file changes
+    with profiler.stage("zones") as stage:
+        zones_table = warm_zones(args.taxi_zones_path, storage_options,
+                                 lambda: load_taxi_zones(database, args.taxi_zones_path),
+                                 variant=database_key)
+        taxi_zones_relation = taxi_zones(con, zones_table)
+        stage["rows_out"] = taxi_zones_relation.aggregate("count(*)").fetchone()[0]
+    info("Taxi-zones relation loaded (csv-src={}).".format(args.taxi_zones_path))
+    if args.zones_layout == "dimension":
+        zones_path = posixpath.join(args.output_path, ZONES_DIMENSION_DIR, "zones.parquet")
+        fs, fs_zones_path = storage_filesystem(zones_path, storage_options)
+        fs.makedirs(posixpath.dirname(fs_zones_path), exist_ok=True)
+        con.execute("COPY (SELECT * EXCLUDE (OBJECTID) FROM taxi_zones) TO {} (FORMAT PARQUET)"
+                    .format(sql_literal(zones_path)))
+        info("Taxi-zones dimension written : {}".format(zones_path))
+    # get taxi rides relation, only new files & bytes appended since the last run recorded in the manifest
+    # if incremental
+    staging_path = posixpath.join(args.output_path, "_staging", app_id)
+    if args.incremental:
+        manifest, slices = plan_incremental_ingestion(args.taxi_trips_path, args.output_path, storage_options)
+        trips_paths = stage_slices(slices, posixpath.join(staging_path, "input"), storage_options)
+        if not trips_paths:
+            commit_manifest(args.output_path, manifest, slices, app_id, storage_options)
+            # reported as a run writing no rows
+            with profiler.stage("write") as stage:
+                stage["rows_out"] = 0
+            info("Done. No new input since last ingestion (src={})".format(args.taxi_trips_path))
+            con.close()
+            info("Run report written : {}".format(profiler.write_report(report_dir(args), storage_options)))
+            return
+        with profiler.stage("read"):
+            taxi_rides(con, trips_paths)
+    elif is_parquet_input(args.taxi_trips_path, storage_options):
+        # ingested taxi rides parquet dataset (re-enrichment) pruned on pickup dates
+        with profiler.stage("read"):
+            taxi_rides_parquet(con, parquet_dataset_files(args.taxi_trips_path, filtering_bounds, storage_options))
+    else:
+        with profiler.stage("read"):
+            taxi_rides(con, input_paths(args.taxi_trips_path, storage_options))
+    info("Taxi-rides relation loaded (src={}).".format(args.taxi_trips_path))
+    # filter
+    condition = "TRUE"
+    if filtering_bounds:
+        info("Applying filtering bounds : {}".format(filtering_bounds_to_string(filtering_bounds)))
+        with profiler.stage("filter"):
+            condition = filtering_condition(filtering_bounds)
+    # rollups and rides read from the filtered rides materialized once (spilled beyond the memory limit)
+    source = "taxi_rides"
+    if args.rollups:
+        with profiler.stage("rollups") as stage:
+            con.execute("CREATE TEMP TABLE taxi_rides_filtered AS SELECT * FROM taxi_rides WHERE {}"
+                        .format(condition))
+            source, condition = "taxi_rides_filtered", "TRUE"
+            rollups = con.execute(rollups_query(source)).df()
+            stage["rows_out"] = len(rollups)
+    # join, zones broadcast to all threads as hash join build side
+    info("Joining relations (zones-layout={})".format(args.zones_layout))
+    with profiler.stage("join"):
+        query = join_with_zones(condition, args.zones_layout, source)
+    # generate app_id and date_PU column
+    info("Generating additional columns")
+    with profiler.stage("columns"):
+        query = "SELECT *, {} AS app_id, CAST(year(datetime_PU) * 10000 + month(datetime_PU) * 100 + " \
+                "day(datetime_PU) AS INTEGER) AS date_PU FROM ({})".format(sql_literal(app_id), query)
+    # write, whole query executed, partition directories created by duckdb under the staging directory and
+    # moved to the output root
+    fs, fs_staging_path = storage_filesystem(staging_path, storage_options)
+    fs.makedirs(posixpath.join(fs_staging_path, "output"), exist_ok=True)
+    with profiler.stage("write") as stage:
+        stage["rows_out"] = write_parquet_partitions(con, query, posixpath.join(staging_path, "output"), app_id,
+                                                     args.row_group_size)
+        publish_partitions(posixpath.join(staging_path, "output"), args.output_path, storage_options)
+    if args.incremental:
+        # recorded once the output is written, a failed run is ingested again by the next one
+        commit_manifest(args.output_path, manifest, slices, app_id, storage_options)
+        info("Ingestion manifest updated (files={}).".format(len(slices)))
+    if fs.exists(fs_staging_path):
+        fs.rm(fs_staging_path, recursive=True)
+    info("Done. Data persisted at : {} ({} records)".format(args.output_path, stage["rows_out"]))
+    if args.rollups:
+        # rollups computed along the filtered rides above, only finished & written here
+        with profiler.stage("rollups_write") as stage:
+            stage["rows_out"] = len(rollups)
+            rollups_path = write_rollups(finish_rollups(rollups), args.output_path, app_id, storage_options)
+        info("Rollups written : {} ({} records)".format(rollups_path, len(rollups)))
+    con.close()
+    info("Run report written : {}".format(profiler.write_report(report_dir(args), storage_options)))
+
+
+def duckdb_schema(schema):
+    """
+    Return duckdb columns struct of a schema definition, as read_csv columns parameter.
+    :param schema: schema definition as list of (name, type)
+    :return: columns struct sql
+    """
+    # booleans (Y/N) are read as strings and cast afterwards
+    types = {"int32": "INTEGER", "float64": "DOUBLE", "string": "VARCHAR", "boolean": "VARCHAR",
+             "timestamp": "TIMESTAMP"}
+    columns = []
+    for name, column_type in schema:
+        if column_type.startswith("decimal"):
+            precision, scale = MONETARY_COLUMNS[name]
+            columns.append("'{}': 'DECIMAL({},{})'".format(name, precision, scale))
+        else:
+            columns.append("'{}': '{}'".format(name, types[column_type]))
+    return "{" + ", ".join(columns) + "}"
+
+
+def sql_literal(value):
+    """
+    Return sql string literal.
+    :param value: value
+    :return: quoted value
+    """
+    return "'{}'".format(str(value).replace("'", "''"))
+
+
+def duckdb_database(args, storage_options=None):
+    """
+    Return connection to an in-memory duckdb database with the settings of the run and the remote filesystems
+    registered, kept in the serve mode for the runs of the same settings.
+    :param args: arguments
+    :param storage_options: storage options dict
+    :return: (connection, database key)
+    """
+    threads = args.threads or os.cpu_count()
+    filesystems = dict((path.split("://")[0], storage_filesystem(path, storage_options)[0])
+                       for path in [args.taxi_trips_path, args.taxi_zones_path, args.output_path]
+                       if not is_local_path(path))
+    key = ("duckdb", threads, args.memory_limit, args.temp_directory, tuple(sorted(filesystems)),
+           json.dumps(storage_options or {}, sort_keys=True))
+
+    def connect():
+        con = duckdb.connect(database=":memory:")
+        con.execute("SET threads TO {}".format(threads))
+        con.execute("SET memory_limit = '{}'".format(args.memory_limit))
+        con.execute("SET temp_directory = '{}'".format(args.temp_directory))
+        # rows are not kept in input order, letting the partitioned write stream
+        con.execute("SET preserve_insertion_order = false")
+        for fs in set(filesystems.values()):
+            con.register_filesystem(fs)
+        return con
+
+    return warm_resource(key, connect), key
+
+
+def load_taxi_zones(database, path):
+    """
+    Load taxi-zones csv file as a table of the database, replacing the table of a previous load of the same path.
+    Single zone per LocationID, the zone of the lowest OBJECTID as in all modes (see unique_taxi_zones).
+    :param database: duckdb database connection
+    :param path: input path
+    :return: table name
+    """
+    table = "taxi_zones_{}".format(hashlib.sha256(path.encode()).hexdigest()[:16])
+    con = database.cursor()
+    con.execute("CREATE OR REPLACE TABLE {} AS SELECT * FROM read_csv({}, header = true, auto_detect = false, "
+                "columns = {}) QUALIFY row_number() OVER (PARTITION BY LocationID "
+                "ORDER BY TRY_CAST(OBJECTID AS BIGINT) NULLS LAST) = 1"
+                .format(table, sql_literal(path), duckdb_schema(ZONE_SCHEMA)))
+    con.close()
+    return table
+
+
+def taxi_zones(con, table):
+    """
+    Return taxi-zones duckdb relation, created as taxi_zones view of the loaded zones table.
+    :param con: duckdb connection
+    :param table: taxi-zones table name
+    :return: relation
+    """
+    con.execute("CREATE TEMP VIEW taxi_zones AS SELECT * FROM {}".format(table))
+    return con.table("taxi_zones")
+
+
+def taxi_rides(con, paths):
+    """
+    Create taxi_rides view of taxi-rides csv files.
+    :param con: duckdb connection
+    :param paths: input paths
+    """
+    # timestamp format of the shared TIMESTAMP_FORMAT layout (MM/DD/YYYY hh:mm:ss AM/PM)
+    con.execute("CREATE TEMP VIEW taxi_rides_csv AS SELECT * FROM read_csv([{}], header = true, auto_detect = false, "
+                "columns = {}, timestampformat = {})"
+                .format(", ".join(sql_literal(path) for path in paths), duckdb_schema(TRIP_SCHEMA),
+                        sql_literal(TIMESTAMP_FORMAT)))
+    con.execute("CREATE TEMP VIEW taxi_rides AS SELECT tpep_pickup_datetime AS datetime_PU, "
+                "tpep_dropoff_datetime AS datetime_DO, "
+                "* EXCLUDE (tpep_pickup_datetime, tpep_dropoff_datetime, store_and_fwd_flag), "
+                "CASE store_and_fwd_flag WHEN 'Y' THEN true WHEN 'N' THEN false END AS store_and_fwd_flag "
+                "FROM taxi_rides_csv")
+
+
+def taxi_rides_parquet(con, files):
+    """
+    Create taxi_rides view of ingested taxi rides parquet files (hive partitioned). Zone enrichment, app_id and
+    date_PU columns are dropped, location ids are kept if present or mapped back from zone attributes : name,
+    borough and shape length & area when available, then name & borough only (ambiguous names mapped to the
+    lowest location id). Rides of unknown zones are dropped.
+    :param con: duckdb connection
+    :param files: list of (file path, dict of partition column to value), pruned by pickup dates
+    """
+    types = {"int32": "INTEGER", "float64": "DOUBLE", "string": "VARCHAR", "boolean": "BOOLEAN",
+             "timestamp": "TIMESTAMP"}
+    if not files:
+        # no partition left by the pruning, empty relation of the taxi rides columns
+        con.execute("CREATE TEMP VIEW taxi_rides_parquet AS SELECT {} WHERE FALSE".format(", ".join(
+            "CAST(NULL AS {}) AS {}".format(duckdb_type(name, column_type, types), name)
+            for name, column_type in TRIP_SCHEMA)))
+    else:
+        con.execute("CREATE TEMP VIEW taxi_rides_parquet AS SELECT * FROM read_parquet([{}], hive_partitioning = 1, "
+                    "union_by_name = true)".format(", ".join(sql_literal(path) for path, _ in files)))
+    names = [row[0] for row in con.execute("DESCRIBE taxi_rides_parquet").fetchall()]
+    renamed = {"tpep_pickup_datetime": "datetime_PU", "tpep_dropoff_datetime": "datetime_DO"}
+    columns, joins = [], []
+    for name, column_type in TRIP_SCHEMA:
+        source = renamed.get(name, name)
+        if name in ["PULocationID", "DOLocationID"] and name not in names:
+            suffix = name[:2]
+            matched = []
+            for attributes in [["zone", "borough", "Shape_Leng", "Shape_Area"], ["zone", "borough"]]:
+                if any("{}_{}".format(attribute, suffix) not in names for attribute in attributes):
+                    continue
+                alias = "zones_{}_{}".format(suffix, len(matched))
+                joins.append("LEFT JOIN (SELECT {0}, min(LocationID) AS LocationID FROM taxi_zones GROUP BY {0}) {1} "
+                             "ON {2}".format(", ".join(attributes), alias, " AND ".join(
+                                 "CAST(t.{0}_{1} AS VARCHAR) = CAST({2}.{0} AS VARCHAR)".format(attribute, suffix,
+                                                                                               alias)
+                                 for attribute in attributes)))
+                matched.append("{}.LocationID".format(alias))
+            value = "coalesce({})".format(", ".join(matched)) if matched else "NULL"
+        else:
+            value = "t.{}".format(source)
+        columns.append("CAST({} AS {}) AS {}".format(value, duckdb_type(name, column_type, types), source))
+    con.execute("CREATE TEMP VIEW taxi_rides AS SELECT * FROM (SELECT {} FROM taxi_rides_parquet t {}) "
+                "WHERE PULocationID IS NOT NULL AND DOLocationID IS NOT NULL"
+                .format(", ".join(columns), " ".join(joins)))
+
+
+def duckdb_type(name, column_type, types):
+    """
+    Return duckdb type of a schema definition column.
+    :param name: column name
+    :param column_type: column type of the schema definition
+    :param types: duckdb types of the non decimal column types
+    :return: duckdb type
+    """
+    if column_type.startswith("decimal"):
+        return "DECIMAL({},{})".format(*MONETARY_COLUMNS[name])
+    return types[column_type]
+
+
+def filtering_condition(filtering_bounds):
+    """
+    Filtering bounds to sql predicate.
+    :param filtering_bounds: filtering bounds
+    :return: sql predicate
+    """
+    return " AND ".join("{0} >= TIMESTAMP '{1}' AND {0} < TIMESTAMP '{2}'".format(column, start, end)
+                        for column, start, end in filtering_bounds)
+
+
+def join_with_zones(condition, zones_layout="full", source="taxi_rides"):
+    """
+    Return query joining filtered taxi-rides and taxi zones on Location ID.
+    :param condition: filtering sql predicate
+    :param zones_layout: zone attributes layout, location ids are kept and geometries dropped for the dimension
+    layout
+    :param source: taxi rides view or table
+    :return: query
+    """
+    attributes = [name for name, _ in ZONE_SCHEMA if name not in ["OBJECTID", "LocationID"]]
+    if zones_layout == "dimension":
+        attributes.remove("the_geom")
+    trip_columns = ["datetime_PU", "datetime_DO"] + \
+                   [name for name, _ in TRIP_SCHEMA
+                    if name not in ["tpep_pickup_datetime", "tpep_dropoff_datetime", "PULocationID", "DOLocationID"]]
+    if zones_layout == "dimension":
+        trip_columns += ["PULocationID", "DOLocationID"]
+    columns = ["t.{}".format(name) for name in trip_columns] + \
+              ["zones_{0}.{1} AS {1}_{0}".format(suffix, attribute)
+               for suffix in ["PU", "DO"] for attribute in attributes]
+    return "SELECT {} FROM {} t " \
+           "JOIN taxi_zones zones_PU ON t.PULocationID = zones_PU.LocationID " \
+           "JOIN taxi_zones zones_DO ON t.DOLocationID = zones_DO.LocationID " \
+           "WHERE {}".format(", ".join(columns), source, condition)
+
+
+def rollups_query(source="taxi_rides"):
+    """
+    Return query of the rollups of taxi rides by pickup hour and pickup/drop off location id, with the columns of
+    the partial rollups (trips, sums and histogram bin counts). Rides of location ids unknown to the zones are left
+    out as by the zones join.
+    :param source: taxi rides view or table
+    :return: query
+    """
+    columns = ["date_trunc('hour', datetime_PU) AS hour_PU", "PULocationID", "DOLocationID", "count(*) AS trips"] + \
+              ["CAST(sum({0}) AS DOUBLE) AS {0}".format(column) for column in ROLLUP_SUM_COLUMNS]
+    for column, edges in ROLLUP_HISTOGRAM_EDGES.items():
+        # bin index of a value is the number of edges lower or equal to it
+        bin_index = " + ".join("CAST({} >= {} AS INTEGER)".format(column, edge) for edge in edges)
+        columns += ["count(*) FILTER (WHERE {} = {}) AS {}_bin_{}".format(bin_index, i, column, i)
+                    for i in range(len(edges) + 1)]
+    return "SELECT {} FROM {} " \
+           "WHERE PULocationID IN (SELECT LocationID FROM taxi_zones) " \
+           "AND DOLocationID IN (SELECT LocationID FROM taxi_zones) AND datetime_PU IS NOT NULL " \
+           "GROUP BY ALL".format(", ".join(columns), source)
+
+
+def write_parquet_partitions(con, query, output_path, app_id, row_group_size=1000000):
+    """
+    Write query result as date_PU/borough_PU partitioned parquet dataset in the output schema of all modes (see
+    output_schema), files named after the app id are added to existing partitions.
+    :param con: duckdb connection
+    :param query: query
+    :param output_path: output path
+    :param app_id: application id
+    :param row_group_size: parquet row group size
+    :return: number of records written
+    """
+    # columns cast to the output schema of all modes, partition columns are only part of the directory names
+    columns = []
+    for row in con.execute("DESCRIBE {}".format(query)).fetchall():
+        name, column_type = row[0], row[1]
+        if name not in ["date_PU", "borough_PU"]:
+            if column_type in ["TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT", "UTINYINT", "USMALLINT",
+                               "UINTEGER", "UBIGINT"]:
+                column_type = "INTEGER"
+            elif column_type.startswith("TIMESTAMP"):
+                column_type = "TIMESTAMP"
+            elif column_type.startswith("ENUM"):
+                column_type = "VARCHAR"
+        columns.append("CAST({0} AS {1}) AS {0}".format(name, column_type))
+    query = "SELECT {} FROM ({})".format(", ".join(columns), query)
+    # FILENAME_PATTERN requires duckdb 0.9
+    return con.execute("COPY ({}) TO {} (FORMAT PARQUET, PARTITION_BY (date_PU, borough_PU), "
+                       "OVERWRITE_OR_IGNORE true, FILENAME_PATTERN {}, ROW_GROUP_SIZE {})"
+                       .format(query, sql_literal(output_path), sql_literal("part-" + app_id + "-{i}"),
+                               row_group_size)).fetchone()[0]
+
+
+def publish_partitions(staging_path, output_path, storage_options=None):
+    """
+    Move the partition files written under a staging directory to the output root. Partition values are
+    url-encoded in directory names by duckdb (borough_PU=Staten%20Island), the directories are named after the
+    plain values as written by the other modes so that runs of any mode add to the same partitions.
+    :param staging_path: staging directory
+    :param output_path: output path
+    :param storage_options: storage options dict
+    """
+    import urllib.parse
+    fs, staging_root = storage_filesystem(staging_path, storage_options)
+    _, root = storage_filesystem(output_path, storage_options)
+    if not fs.exists(staging_root):
+        return
+    for path in fs.find(staging_root):
+        relative = posixpath.relpath(path, staging_root).split("/")
+        target = posixpath.join(root, *[urllib.parse.unquote(name) for name in relative[:-1]] + relative[-1:])
+        fs.makedirs(posixpath.dirname(target), exist_ok=True)
+        fs.mv(path, target)
+
+
+def setup_parser(parser):
+    """
+    Setup argument parser.
+    :param parser: argument parser
+    :return: configured parser
+    """
+    parser.add_argument('--threads', type=int, required=False,
+                        help="Number of threads, defaults to number of cpus.")
+    parser.add_argument('--memory-limit', required=False, default="8GB",
+                        help="Memory limit of DuckDB, operators spill to the temp directory beyond it.")
+    parser.add_argument('--temp-directory', required=False, default="/tmp/taxi_rides_duckdb",
+                        help="Local directory of spilled data.")
+    parser.add_argument('--row-group-size', type=int, required=False, default=1000000,
+                        help="Parquet row group size.")
+    return parser
+
+
+if __name__ == "__main__":
+    run(sys.argv[1:], argparse.ArgumentParser())
@@ -1,8 +1,20 @@
 import argparse
-import decimal
-import pandas as pd
+import contextlib
+import io
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from util import *
 
+# imported on first use
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+pa = lazy_import("pyarrow")
+
+# taxi zones dataframe of worker processes, set once by the worker initializer
+worker_taxi_zones_df = None
+
 
 def run(argv, parser):
     """
@@ -12,62 +24,228 @@ def run(argv, parser):
     """
     # parse arguments
     args = setup_parser(init_parser(parser)).parse_args(argv)
-    # get filtering_rules & pandas expression
-    filtering_expression = filtering_rules_to_expression(get_filtering_rules(args), rule_to_expression)
+    # get filtering_rules compiled to datetime bounds
+    filtering_bounds = filtering_rules_to_bounds(get_filtering_rules(args))
     # set storage options if provided
     storage_options = generate_storage_options(args)
+    # ingested taxi rides parquet dataset (re-enrichment) read by files pruned on pickup dates
+    parquet_input = is_parquet_input(args.taxi_trips_path, storage_options)
+    # byte ranges processed by worker processes if enabled or for the new input of incremental ingestion, each
+    # range read whole (--range-bytes as the unit of work), options of chunking, sampling & caching are rejected
+    # rather than ignored
+    byte_ranges = not parquet_input and (args.incremental or (args.workers is not None and args.workers > 1))
+    if byte_ranges:
+        options = [option for option, value in [("--chunksize", args.chunksize),
+                                                ("--memory-budget", args.memory_budget),
+                                                ("--samplesize", args.samplesize), ("--mmap", args.mmap),
+                                                ("--cache-dir", args.cache_dir)] if value not in [None, False]]
+        if options:
+            parser.error("{} not supported with {} (byte ranges), use --range-bytes to bound the work of a worker"
+                         .format(", ".join(options), "--incremental" if args.incremental else "--workers"))
     # app id
     app_id = generate_app_id()
+    # stage timings, memory & rows of the run
+    profiler = RunProfiler(app_id, "pandas")
     # get taxi zones dataframe
-    taxi_zones_df = taxi_zones(args.taxi_zones_path, storage_options)
+    with profiler.stage("zones") as stage:
+        taxi_zones_df = warm_zones(args.taxi_zones_path, storage_options,
+                                   lambda: taxi_zones(args.taxi_zones_path, storage_options))
+        stage["rows_out"] = len(taxi_zones_df)
     info("Taxi-zones dataframe loaded (csv-src={}).".format(args.taxi_zones_path))
-    # processing taxi rides input, if chunking is enabled iterative approach is run
-    if args.chunksize is not None:
-        chunk_iterator = taxi_rides_iterator(args.taxi_trips_path, args.chunksize, storage_options)
-        for i, taxi_rides_df in enumerate(chunk_iterator, 1):
-            info("Taxi-rides dataframe iterator (src={}, chunk-size={}, chunk={})."
-                 .format(args.taxi_trips_path, args.chunksize, i))
-            # filter
-            if filtering_expression is not None:
-                info("( chunk={}). Applying filtering expression : {}".format(i, filtering_expression))
-                taxi_rides_df = taxi_rides_df.query(filtering_expression)
-            # join
-            info("( chunk={}). Joining dataframes".format(i))
-            taxi_rides_df = join_with_zones(taxi_rides_df, taxi_zones_df)
-            # generate app_id and date_PU column
-            info("( chunk={}). Generating additional columns")
-            taxi_rides_df["app_id"] = app_id
-            taxi_rides_df["date_PU"] = taxi_rides_df["datetime_PU"].dt.strftime("%Y%m%d")
-            # write
-            taxi_rides_df.to_parquet(args.output_path, partition_cols=["date_PU", "borough_PU"],
-                                     storage_options=storage_options,
-                                     index=False)
-            info("Done( chunk={}). Data persisted at : {}".format(i, args.output_path))
+    if args.zones_layout == "dimension":
+        info("Taxi-zones dimension written : {}".format(write_zones_dimension(taxi_zones_df, args.output_path,
+                                                                              storage_options)))
+    taxi_zones_df = zones_layout(taxi_zones_df, args.zones_layout)
+    # staging cache of parsed taxi rides, not used for byte ranges and samples
+    cache, cache_key, cache_entry = None, None, None
+    chunked = args.chunksize is not None or args.memory_budget is not None
+    if args.cache_dir and not parquet_input and not byte_ranges and (chunked or args.samplesize is None):
+        cache = StagingCache(args.cache_dir, parse_size(args.cache_budget))
+        cache_key = cache.key(args.taxi_trips_path, storage_options)
+        cache_entry = cache.lookup(cache_key)
+        info("Taxi-rides staging cache {} (src={}, entry={}).".format("hit" if cache_entry else "miss",
+                                                                      args.taxi_trips_path,
+                                                                      os.path.join(args.cache_dir, cache_key)))
+    # processing taxi rides input, byte ranges processed by worker processes, if chunking is enabled iterative
+    # approach is run
+    if byte_ranges:
+        workers = args.workers or 1
+        if args.incremental:
+            # only new files & bytes appended since the last run recorded in the manifest
+            manifest, slices = plan_incremental_ingestion(args.taxi_trips_path, args.output_path, storage_options)
+            ranges = []
+            for input_slice in slices:
+                if input_slice["end"] > input_slice["start"]:
+                    header, file_ranges = newline_aligned_ranges(input_slice["path"], args.range_bytes,
+                                                                 storage_options, min_ranges=workers,
+                                                                 start=input_slice["start"], end=input_slice["end"])
+                    ranges += [(input_slice["path"], header, start, end) for start, end in file_ranges]
+            info("Taxi-rides incremental input (src={}, files={}, bytes={})."
+                 .format(args.taxi_trips_path, len(set(path for path, _, _, _ in ranges)),
+                         sum(end - start for _, _, start, end in ranges)))
+        else:
+            header, file_ranges = newline_aligned_ranges(args.taxi_trips_path, args.range_bytes, storage_options,
+                                                         min_ranges=workers)
+            ranges = [(args.taxi_trips_path, header, start, end) for start, end in file_ranges]
+        info("Taxi-rides byte ranges (src={}, ranges={}, workers={}).".format(args.taxi_trips_path, len(ranges),
+                                                                             workers))
+        files_written, rollups = process_ranges(ranges, taxi_zones_df, storage_options, args.output_path,
+                                                filtering_bounds, app_id, workers, args.csv_engine,
+                                                args.row_group_size, args.writer_threads, profiler, args.rollups)
+        if args.incremental:
+            # recorded once the output is written, a failed run is ingested again by the next one
+            commit_manifest(args.output_path, manifest, slices, app_id, storage_options)
+            info("Ingestion manifest updated (files={}).".format(len(slices)))
+        info("Done. Data persisted at : {} ({} files)".format(args.output_path, files_written))
+    elif chunked:
+        writer_buffer_bytes = 1 << 30
+        chunk_size = args.chunksize
+        if args.memory_budget is not None:
+            # a quarter of the budget for rows buffered by the writer, the rest for the chunk in flight
+            memory_budget = parse_size(args.memory_budget)
+            writer_buffer_bytes = memory_budget // 4
+            # chunk budget shared by chunks queued between pipeline stages
+            chunk_size = AdaptiveChunkSize((memory_budget - writer_buffer_bytes) // (args.pipeline_depth + 1),
+                                           args.chunksize or 100000)
+        if parquet_input:
+            chunk_iterator = taxi_rides_parquet_iterator(args.taxi_trips_path, chunk_size, taxi_zones_df,
+                                                         filtering_bounds, storage_options)
+        elif cache_entry is not None:
+            # row groups of cached parsed rides pruned by filtering bounds
+            chunk_iterator = taxi_rides_cache_iterator(cache_entry, chunk_size, filtering_bounds)
+        elif args.mmap and is_local_path(args.taxi_trips_path):
+            # local input memory-mapped, record chunks parsed from buffer slices without intermediate copies
+            chunk_iterator = taxi_rides_mmap_iterator(args.taxi_trips_path, chunk_size)
+        elif args.csv_engine == "pyarrow" or cache is not None:
+            chunk_iterator = taxi_rides_arrow_iterator(args.taxi_trips_path, chunk_size, storage_options)
+        else:
+            # rows not matching the date filters are dropped before parsing timestamps
+            chunk_iterator = taxi_rides_iterator(args.taxi_trips_path, chunk_size, storage_options,
+                                                 filtering_bounds)
+        if cache is not None and cache_entry is None:
+            # whole parsed chunks are cached, filtering bounds are applied afterwards
+            chunk_iterator = cached_chunks(cache, cache_key, chunk_iterator)
+        # rows are buffered per partition across chunks and written as row groups of one file per partition
+        writer = PartitionedParquetWriter(args.output_path, ["date_PU", "borough_PU"], storage_options,
+                                          row_group_size=args.row_group_size,
+                                          max_buffer_bytes=writer_buffer_bytes,
+                                          max_open_files=args.max_open_files,
+                                          threads=args.writer_threads)
+        chunk_iterator = profiler.iterate("read", chunk_iterator)
+        if args.pipeline_depth > 0:
+            # read, transform & write stages overlap, a single peak rss sampled for the run
+            profiler.sample_rss()
+            # chunks read ahead by a reader thread, parquet i/o overlapping parsing and transformations
+            chunk_iterator = prefetch(chunk_iterator, args.pipeline_depth, "taxi-rides-reader")
+        # chunks written by a writer thread, at most pipeline-depth chunks queued between stages
+        rollups = None
+        with ThreadedConsumer(partial(write_chunk, writer, profiler, args.output_path), args.pipeline_depth,
+                              "taxi-rides-writer") as sink:
+            for i, taxi_rides_df in enumerate(chunk_iterator, 1):
+                info("Taxi-rides dataframe iterator (src={}, chunk-size={}, chunk={})."
+                     .format(args.taxi_trips_path, len(taxi_rides_df), i))
+                input_rows, input_bytes = raw_chunk_size(taxi_rides_df)
+                if len(taxi_rides_df) == 0:
+                    if isinstance(chunk_size, AdaptiveChunkSize):
+                        chunk_size.update(i, input_rows, input_bytes)
+                    info("Skipped( chunk={}). No records matching filtering rules".format(i))
+                    continue
+                # filter
+                if filtering_bounds:
+                    info("( chunk={}). Applying filtering bounds : {}"
+                         .format(i, filtering_bounds_to_string(filtering_bounds)))
+                    with profiler.stage("filter", len(taxi_rides_df), i) as stage:
+                        taxi_rides_df = filter_taxi_rides(taxi_rides_df, filtering_bounds)
+                        stage["rows_out"] = len(taxi_rides_df)
+                # rollups of the chunk merged into the rollups of the previous chunks
+                if args.rollups:
+                    with profiler.stage("rollups", len(taxi_rides_df), i) as stage:
+                        rollups = merge_rollups([rollups, rollup_partial(taxi_rides_df, taxi_zones_df.index)])
+                        stage["rows_out"] = len(rollups)
+                # join
+                info("( chunk={}). Joining dataframes".format(i))
+                with profiler.stage("join", len(taxi_rides_df), i) as stage:
+                    taxi_rides_df = join_with_zones(taxi_rides_df, taxi_zones_df)
+                    stage["rows_out"] = len(taxi_rides_df)
+                if isinstance(chunk_size, AdaptiveChunkSize):
+                    # raw chunk and joined frame (with its copy while generating columns) held at the peak
+                    chunk_size.update(i, input_rows, input_bytes + 2 * frame_nbytes(taxi_rides_df))
+                # generate app_id and date_PU column
+                info("( chunk={}). Generating additional columns".format(i))
+                with profiler.stage("columns", len(taxi_rides_df), i) as stage:
+                    taxi_rides_df = generate_columns(taxi_rides_df, app_id)
+                    stage["rows_out"] = len(taxi_rides_df)
+                # write
+                sink.submit((i, taxi_rides_df))
+        with profiler.stage("close") as stage:
+            files_written = writer.close()
+        info("Done. Data persisted at : {} ({} files)".format(args.output_path, files_written))
     else:
         if args.samplesize is not None:
             # open sample and filter by dates
-            taxi_rides_df = taxi_rides_sample(args.taxi_trips_path, args.samplesize, storage_options)
+            with profiler.stage("read") as stage:
+                if parquet_input:
+                    taxi_rides_df = next(taxi_rides_parquet_iterator(args.taxi_trips_path, args.samplesize,
+                                                                     taxi_zones_df, filtering_bounds,
+                                                                     storage_options))
+                elif args.csv_engine == "pyarrow":
+                    taxi_rides_df = next(taxi_rides_arrow_iterator(args.taxi_trips_path, args.samplesize,
+                                                                   storage_options))
+                else:
+                    taxi_rides_df = taxi_rides_sample(args.taxi_trips_path, args.samplesize, storage_options)
+                stage["rows_out"] = len(taxi_rides_df)
             info("Taxi-rides dataframe sample (src={}, sample-size={}).".format(args.taxi_trips_path, args.samplesize))
         else:
             # open whole dataset and filter by dates
-            taxi_rides_df = taxi_rides(args.taxi_trips_path, storage_options)
-            info("Taxi-rides dataframe loaded (src={}).".format(args.taxi_trips_path))
+            with profiler.stage("read") as stage:
+                if parquet_input:
+                    taxi_rides_df = taxi_rides_parquet(args.taxi_trips_path, taxi_zones_df, filtering_bounds,
+                                                       storage_options)
+                elif cache_entry is not None:
+                    taxi_rides_df = taxi_rides_cache(cache_entry, filtering_bounds)
+                elif args.csv_engine == "pyarrow" or cache is not None:
+                    taxi_rides_df = taxi_rides_arrow(args.taxi_trips_path, storage_options)
+                    if cache is not None:
+                        cache_fill = cache.fill(cache_key)
+                        cache.write(cache_fill, taxi_rides_df, 0)
+                        cache.commit(cache_key, cache_fill)
+                else:
+                    taxi_rides_df = taxi_rides(args.taxi_trips_path, storage_options)
+                stage["rows_out"] = len(taxi_rides_df)
+            info("Taxi-rides dataframe loaded (src={}, csv-engine={}).".format(args.taxi_trips_path,
+                                                                               args.csv_engine))
         # filter
-        if filtering_expression is not None:
-            info("Applying filtering expression : {}".format(filtering_expression))
-            taxi_rides_df = taxi_rides_df.query(filtering_expression)
+        if filtering_bounds:
+            info("Applying filtering bounds : {}".format(filtering_bounds_to_string(filtering_bounds)))
+            with profiler.stage("filter", len(taxi_rides_df)) as stage:
+                taxi_rides_df = filter_taxi_rides(taxi_rides_df, filtering_bounds)
+                stage["rows_out"] = len(taxi_rides_df)
+        rollups = None
+        if args.rollups:
+            with profiler.stage("rollups", len(taxi_rides_df)) as stage:
+                rollups = rollup_partial(taxi_rides_df, taxi_zones_df.index)
+                stage["rows_out"] = len(rollups)
         # join
         info("Joining dataframes")
-        taxi_rides_df = join_with_zones(taxi_rides_df, taxi_zones_df)
+        with profiler.stage("join", len(taxi_rides_df)) as stage:
+            taxi_rides_df = join_with_zones(taxi_rides_df, taxi_zones_df)
+            stage["rows_out"] = len(taxi_rides_df)
         # generate app_id and date_PU column
         info("Generating additional columns")
-        taxi_rides_df["app_id"] = app_id
-        taxi_rides_df["date_PU"] = taxi_rides_df["datetime_PU"].dt.strftime("%Y%m%d")
+        with profiler.stage("columns", len(taxi_rides_df)) as stage:
+            taxi_rides_df = generate_columns(taxi_rides_df, app_id)
+            stage["rows_out"] = len(taxi_rides_df)
         # write
-        taxi_rides_df.to_parquet(args.output_path, partition_cols=["date_PU", "borough_PU"],
-                                 storage_options=storage_options,
-                                 index=False)
+        with profiler.stage("write", len(taxi_rides_df)) as stage:
+            write_parquet(taxi_rides_df, args.output_path, ["date_PU", "borough_PU"], storage_options)
+            stage["rows_out"] = len(taxi_rides_df)
         info("Done. Data persisted at : {}".format(args.output_path))
+    if rollups is not None:
+        with profiler.stage("rollups_write") as stage:
+            stage["rows_out"] = len(rollups)
+            rollups_path = write_rollups(finish_rollups(rollups), args.output_path, app_id, storage_options)
+        info("Rollups written : {} ({} records)".format(rollups_path, len(rollups)))
+    info("Run report written : {}".format(profiler.write_report(report_dir(args), storage_options)))
 
 
 def taxi_zones(path, storage_options=None):
@@ -77,59 +255,191 @@ def taxi_zones(path, storage_options=None):
     :param storage_options: storage options dict
     :return: taxi-zones dataframe
     """
-    zdf = pd.read_csv(path, storage_options=storage_options)
+    with open_input(path, storage_options) as f:
+        zdf = unique_taxi_zones(pd.read_csv(f))
     zdf = zdf.drop("OBJECTID", axis="columns")
     zdf = zdf.set_index("LocationID")
     return zdf
 
 
-def taxi_rides(path, storage_options=None):
+def taxi_rides(path, storage_options=None, filtering_bounds=None):
     """
     Return taxi-rides pandas dataframe.
-    :param path: input path
+    :param path: input path or file object
     :param storage_options: storage options dict
+    :param filtering_bounds: filtering bounds applied on raw records before parsing timestamps
     :return: taxi-rides dataframe
     """
-    # transformation function for proper datetime type
-    date_parser = lambda col: pd.to_datetime(col, format="%m/%d/%Y %I:%M:%S %p")
-    # transformation function for proper monetary columns
-    to_decimal = lambda x: decimal.Decimal("{:.2f}".format(round(float(x), 2)))
-    monetary_columns = ["fare_amount", "extra", "mta_tax", "tip_amount", "tolls_amount", "improvement_surcharge",
-                        "total_amount"]
-    decimal_converters = dict(((column, to_decimal) for column in monetary_columns))
-    # get dataframe
-    return pd.read_csv(path, parse_dates={"datetime_PU": ["tpep_pickup_datetime"],
-                                          "datetime_DO": ["tpep_dropoff_datetime"]},
-                       date_parser=date_parser,
-                       converters=decimal_converters,
-                       true_values='Y', false_values='N',
-                       storage_options=storage_options)
+    # monetary columns are parsed as floats, converted to decimals in bulk when written
+    monetary_dtypes = dict(((column, "float64") for column in MONETARY_COLUMNS))
+    # get dataframe, remote files read ahead by concurrent block fetches
+    with open_input(path, storage_options) if isinstance(path, str) else contextlib.nullcontext(path) as f:
+        taxi_rides_df = pd.read_csv(f, dtype=monetary_dtypes,
+                                    true_values=['Y'], false_values=['N'])
+    # pre-filter on raw pickup/dropoff text & parse pickup/dropoff timestamps
+    return prepare_taxi_rides(prefilter_taxi_rides(taxi_rides_df, filtering_bounds or []))
 
 
-def taxi_rides_iterator(path, n, storage_options=None):
+def init_worker(taxi_zones_df):
+    """
+    Worker process initializer, keeping the taxi zones dataframe shared by all tasks of the worker.
+    :param taxi_zones_df: taxi zone dataframe
+    """
+    global worker_taxi_zones_df
+    worker_taxi_zones_df = taxi_zones_df
+
+
+def write_chunk(writer, profiler, output_path, chunk):
+    """
+    Write a chunk of taxi rides with a partitioned parquet writer.
+    :param writer: partitioned parquet writer
+    :param profiler: run profiler
+    :param output_path: output path
+    :param chunk: tuple of chunk index and taxi rides dataframe
+    """
+    i, taxi_rides_df = chunk
+    with profiler.stage("write", len(taxi_rides_df), i) as stage:
+        writer.write(taxi_rides_df)
+        stage["rows_out"] = len(taxi_rides_df)
+    info("Done( chunk={}). Data buffered for : {}".format(i, output_path))
+
+
+def process_ranges(ranges, taxi_zones_df, storage_options, output_path, filtering_bounds, app_id, workers=1,
+                   csv_engine="pandas", row_group_size=1000000, writer_threads=None, profiler=None, rollups=False):
+    """
+    Process newline-aligned byte ranges of taxi rides, by worker processes if more than one worker. Enriched tables
+    of the ranges are written in range order by a single partitioned writer, one file per partition as in the
+    other paths.
+    :param ranges: list of (path, header, start, end)
+    :param taxi_zones_df: taxi zone dataframe
+    :param storage_options: storage options dict
+    :param output_path: output path
+    :param filtering_bounds: filtering bounds
+    :param app_id: application id
+    :param workers: number of worker processes
+    :param csv_engine: csv reader engine
+    :param row_group_size: parquet row group size
+    :param writer_threads: number of parquet encoding threads
+    :param profiler: run profiler collecting stages of each range
+    :param rollups: compute rollups of the ranges
+    :return: number of files written and merged rollups of the ranges (None if not computed)
+    """
+    profiler = profiler or RunProfiler(app_id, "pandas")
+    writer = PartitionedParquetWriter(output_path, ["date_PU", "borough_PU"], storage_options,
+                                      row_group_size=row_group_size, threads=writer_threads, file_prefix=app_id)
+    range_rollups = []
+
+    def write_range(i, result):
+        table, stages, rollup = result
+        range_rollups.append(rollup)
+        profiler.stages += stages
+        with profiler.stage("write", table.num_rows, i + 1) as stage:
+            writer.write(table)
+            stage["rows_out"] = table.num_rows
+        info("Done( range={}/{}). {} records buffered for : {}".format(i + 1, len(ranges), table.num_rows,
+                                                                      output_path))
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(taxi_zones_df,)) as executor:
+            # results written in range order, at most two ranges per worker processed ahead of the writer
+            pending = []
+            for i, (path, header, start, end) in enumerate(ranges):
+                pending.append(executor.submit(process_range, path, header, start, end, storage_options,
+                                               filtering_bounds, app_id, i, csv_engine, rollups=rollups))
+                if len(pending) >= 2 * workers:
+                    write_range(i + 1 - len(pending), pending.pop(0).result())
+            for j, future in enumerate(pending):
+                write_range(len(ranges) - len(pending) + j, future.result())
+    else:
+        # ranges fetched concurrently ahead of the range being processed
+        range_data = fetch_ranges(((path, start, end) for path, header, start, end in ranges), storage_options,
+                                  threads=IO_THREADS, read_ahead=2)
+        for i, ((path, header, start, end), data) in enumerate(zip(ranges, range_data)):
+            write_range(i, process_range(path, header, start, end, storage_options, filtering_bounds, app_id, i,
+                                         csv_engine, data, taxi_zones_df, rollups))
+    # remaining buffers flushed & files closed
+    with profiler.stage("write"):
+        files_written = writer.close()
+    return files_written, merge_rollups(range_rollups) if rollups else None
+
+
+def process_range(path, header, start, end, storage_options, filtering_bounds, app_id, index, csv_engine="pandas",
+                  data=None, taxi_zones_df=None, rollups=False):
+    """
+    Parse, filter, join and generate columns of a newline-aligned byte range of taxi rides (worker process task).
+    :param path: input path
+    :param header: csv header bytes
+    :param start: range start offset
+    :param end: range end offset
+    :param storage_options: storage options dict
+    :param filtering_bounds: filtering bounds
+    :param app_id: application id
+    :param index: range index
+    :param csv_engine: csv reader engine
+    :param data: range bytes if already fetched
+    :param taxi_zones_df: taxi zone dataframe, defaults to the one of the worker process
+    :param rollups: compute rollups of the range
+    :return: (pyarrow table of the enriched rides, profiled stages, rollups or None if not computed) of the range
+    """
+    taxi_zones_df = worker_taxi_zones_df if taxi_zones_df is None else taxi_zones_df
+    # stages of the range are recorded as chunks
+    profiler = RunProfiler(app_id, "pandas")
+    chunk = index + 1
+    with profiler.stage("read", chunk=chunk) as stage:
+        data = header + (read_range(path, start, end, storage_options) if data is None else data)
+        if csv_engine == "pyarrow":
+            taxi_rides_df = prepare_taxi_rides_arrow(read_csv_arrow(pa.py_buffer(data), TRIP_SCHEMA))
+        else:
+            taxi_rides_df = taxi_rides(io.BytesIO(data), filtering_bounds=filtering_bounds)
+        stage["rows_out"] = len(taxi_rides_df)
+    if filtering_bounds:
+        with profiler.stage("filter", len(taxi_rides_df), chunk) as stage:
+            taxi_rides_df = filter_taxi_rides(taxi_rides_df, filtering_bounds)
+            stage["rows_out"] = len(taxi_rides_df)
+    rollup = None
+    if rollups:
+        with profiler.stage("rollups", len(taxi_rides_df), chunk) as stage:
+            rollup = rollup_partial(taxi_rides_df, taxi_zones_df.index)
+            stage["rows_out"] = len(rollup)
+    with profiler.stage("join", len(taxi_rides_df), chunk) as stage:
+        taxi_rides_df = join_with_zones(taxi_rides_df, taxi_zones_df)
+        stage["rows_out"] = len(taxi_rides_df)
+    with profiler.stage("columns", len(taxi_rides_df), chunk) as stage:
+        taxi_rides_df = generate_columns(taxi_rides_df, app_id)
+        # converted by the worker, the writer of the parent only encodes
+        table = taxi_rides_df if isinstance(taxi_rides_df, pa.Table) else to_arrow_table(taxi_rides_df)
+        stage["rows_out"] = table.num_rows
+    return table, profiler.stages, rollup
+
+
+def taxi_rides_iterator(path, n, storage_options=None, filtering_bounds=None):
     """
     Return taxi-rides pandas dataframe iterator.
     :param path: input path
-    :param n: chunk size
+    :param n: chunk size, or callable returning the size of the next chunk
     :param storage_options: storage options dict
+    :param filtering_bounds: filtering bounds applied on raw chunks before parsing timestamps
     :return: taxi-rides dataframe iterator
     """
-    # transformation function for proper datetime type
-    date_parser = lambda col: pd.to_datetime(col, format="%m/%d/%Y %I:%M:%S %p")
-    # transformation function for proper monetary columns
-    to_decimal = lambda x: decimal.Decimal("{:.2f}".format(round(float(x), 2)))
-    monetary_columns = ["fare_amount", "extra", "mta_tax", "tip_amount", "tolls_amount", "improvement_surcharge",
-                        "total_amount"]
-    decimal_converters = dict(((column, to_decimal) for column in monetary_columns))
-    # get reader iterator for chunksize n
-    csv_iter = pd.read_csv(path, chunksize=n,
-                           parse_dates={"datetime_PU": ["tpep_pickup_datetime"],
-                                        "datetime_DO": ["tpep_dropoff_datetime"]},
-                           date_parser=date_parser,
-                           converters=decimal_converters,
-                           true_values='Y', false_values='N',
-                           storage_options=storage_options)
-    return csv_iter
+    # monetary columns are parsed as floats, converted to decimals in bulk when written
+    monetary_dtypes = dict(((column, "float64") for column in MONETARY_COLUMNS))
+    # get reader iterator, chunk sizes may change between chunks
+    with open_input(path, storage_options) as f:
+        csv_iter = pd.read_csv(f, chunksize=chunk_rows(n),
+                               dtype=monetary_dtypes,
+                               true_values=['Y'], false_values=['N'])
+        while True:
+            try:
+                chunk_df = csv_iter.get_chunk(chunk_rows(n))
+            except StopIteration:
+                return
+            # pre-filter on raw pickup/dropoff text & parse pickup/dropoff timestamps of each chunk
+            taxi_rides_df = prepare_taxi_rides(prefilter_taxi_rides(chunk_df, filtering_bounds or []))
+            # rows & bytes read before the pre-filter (unparsed timestamp strings included), chunk sizes are counted
+            # in rows read
+            taxi_rides_df.attrs["raw_chunk"] = (len(chunk_df), frame_nbytes(chunk_df, deep=True))
+            yield taxi_rides_df
 
 
 def taxi_rides_sample(path, n, storage_options=None):
@@ -143,50 +453,224 @@ def taxi_rides_sample(path, n, storage_options=None):
     return next(taxi_rides_iterator(path, n, storage_options))
 
 
-def join_with_zones(taxi_rides_df, taxi_zones_df):
+def taxi_rides_arrow(path, storage_options=None):
     """
-    Perform joining taxi-rides and taxi zones dataframes on Location ID.
-    :param taxi_rides_df: taxi rides dataframe
+    Return taxi-rides pyarrow table, read with the shared explicit schema.
+    :param path: input path
+    :param storage_options: storage options dict
+    :return: taxi-rides pyarrow table
+    """
+    with open_input(path, storage_options) as f:
+        return prepare_taxi_rides_arrow(read_csv_arrow(f, TRIP_SCHEMA))
+
+
+def taxi_rides_arrow_iterator(path, n, storage_options=None):
+    """
+    Return taxi-rides pyarrow table iterator, read with the shared explicit schema.
+    :param path: input path
+    :param n: chunk size, or callable returning the size of the next chunk
+    :param storage_options: storage options dict
+    :return: taxi-rides pyarrow table iterator
+    """
+    with open_input(path, storage_options) as f:
+        reader = read_csv_arrow(f, TRIP_SCHEMA, streaming=True)
+        # collect record batches until n records are available
+        batches, rows = [], 0
+        for batch in reader:
+            batches.append(batch)
+            rows += batch.num_rows
+            size = chunk_rows(n)
+            while rows >= size:
+                table = pa.Table.from_batches(batches)
+                yield prepare_taxi_rides_arrow(table.slice(0, size))
+                table = table.slice(size)
+                batches, rows = table.to_batches(), table.num_rows
+                size = chunk_rows(n)
+        if rows > 0:
+            yield prepare_taxi_rides_arrow(pa.Table.from_batches(batches))
+
+
+def taxi_rides_mmap_iterator(path, n, window_bytes=16 * 1024 * 1024):
+    """
+    Return taxi-rides pyarrow table iterator of a memory-mapped local file, read with the shared explicit schema.
+    Chunk boundaries are located by scanning windows of the mapping for newlines, each chunk is parsed from a
+    zero-copy slice of the mapping and its pages released once parsed.
+    :param path: local input path
+    :param n: chunk size, or callable returning the size of the next chunk
+    :param window_bytes: newline scanning window size in bytes
+    :return: taxi-rides pyarrow table iterator
+    """
+    path = path.replace("file://", "", 1)
+    if os.path.getsize(path) == 0:
+        return
+    # mapping is unmapped once no chunk table refers to it anymore
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(mm, "madvise"):
+        mm.madvise(mmap.MADV_SEQUENTIAL)
+    view = np.frombuffer(mm, dtype=np.uint8)
+    size = len(view)
+    header_end = mm.find(b"\n") + 1 or size
+    column_names = bytes(view[:header_end]).decode().strip().split(",")
+    start = header_end
+    while start < size:
+        # end of the n-th line following start
+        chunk_size, end, rows = chunk_rows(n), start, 0
+        while rows < chunk_size and end < size:
+            newlines = np.flatnonzero(view[end:end + window_bytes] == ord("\n"))
+            if rows + len(newlines) >= chunk_size:
+                end += int(newlines[chunk_size - rows - 1]) + 1
+                rows = chunk_size
+            else:
+                end = min(size, end + window_bytes)
+                rows += len(newlines)
+        table = read_csv_arrow(pa.py_buffer(view[start:end]), TRIP_SCHEMA, column_names=column_names)
+        # parsed pages are released, re-read from the file if still referenced
+        if hasattr(mm, "madvise"):
+            page_start = start - start % mmap.PAGESIZE
+            mm.madvise(mmap.MADV_DONTNEED, page_start, end - page_start)
+        start = end
+        yield prepare_taxi_rides_arrow(table)
+
+
+def taxi_rides_parquet(path, taxi_zones_df, filtering_bounds=None, storage_options=None):
+    """
+    Return taxi-rides pyarrow table of an ingested parquet dataset, partitions & row groups pruned by filtering
+    bounds.
+    :param path: dataset path
     :param taxi_zones_df: taxi zone dataframe
-    :return: joined  taxi-rides and taxi zones dataframes on Location ID
+    :param filtering_bounds: filtering bounds
+    :param storage_options: storage options dict
+    :return: taxi-rides pyarrow table
+    """
+    tables = [read_parquet_taxi_rides(file_path, partitions, taxi_zones_df, filtering_bounds, storage_options)
+              for file_path, partitions in parquet_dataset_files(path, filtering_bounds or [], storage_options)]
+    if not tables:
+        return prepare_taxi_rides_arrow(arrow_schema(TRIP_SCHEMA).empty_table())
+    return pa.concat_tables(tables)
+
+
+def taxi_rides_parquet_iterator(path, n, taxi_zones_df, filtering_bounds=None, storage_options=None):
+    """
+    Return taxi-rides pyarrow table iterator of an ingested parquet dataset, partitions & row groups pruned by
+    filtering bounds.
+    :param path: dataset path
+    :param n: chunk size, or callable returning the size of the next chunk
+    :param taxi_zones_df: taxi zone dataframe
+    :param filtering_bounds: filtering bounds
+    :param storage_options: storage options dict
+    :return: taxi-rides pyarrow table iterator
+    """
+    return rechunk_tables((read_parquet_taxi_rides(file_path, partitions, taxi_zones_df, filtering_bounds,
+                                                   storage_options)
+                           for file_path, partitions in parquet_dataset_files(path, filtering_bounds or [],
+                                                                              storage_options)), n)
+
+
+def taxi_rides_cache(entry, filtering_bounds=None):
+    """
+    Return taxi-rides pyarrow table of a staging cache entry, row groups pruned by filtering bounds.
+    :param entry: cache entry directory
+    :param filtering_bounds: filtering bounds
+    :return: taxi-rides pyarrow table
+    """
+    tables = [StagingCache.read(path, i) for path, i in StagingCache.row_groups(entry, filtering_bounds or [])]
+    if not tables:
+        return prepare_taxi_rides_arrow(arrow_schema(TRIP_SCHEMA).empty_table())
+    return pa.concat_tables(tables)
+
+
+def taxi_rides_cache_iterator(entry, n, filtering_bounds=None):
+    """
+    Return taxi-rides pyarrow table iterator of a staging cache entry, row groups pruned by filtering bounds.
+    :param entry: cache entry directory
+    :param n: chunk size, or callable returning the size of the next chunk
+    :param filtering_bounds: filtering bounds
+    :return: taxi-rides pyarrow table iterator
+    """
+    return rechunk_tables((StagingCache.read(path, i)
+                           for path, i in StagingCache.row_groups(entry, filtering_bounds or [])), n)
+
+
+def rechunk_tables(tables, n):
+    """
+    Return iterator of pyarrow tables of n records (but the last one) out of a pyarrow table iterator.
+    :param tables: pyarrow table iterator
+    :param n: chunk size, or callable returning the size of the next chunk
+    :return: pyarrow table iterator
+    """
+    buffered, rows = [], 0
+    for table in tables:
+        buffered.append(table)
+        rows += table.num_rows
+        size = chunk_rows(n)
+        while rows >= size:
+            table = pa.concat_tables(buffered)
+            yield table.slice(0, size)
+            buffered, rows = [table.slice(size)], table.num_rows - size
+            size = chunk_rows(n)
+    if rows > 0:
+        yield pa.concat_tables(buffered)
+
+
+def cached_chunks(cache, key, chunk_iterator):
+    """
+    Write chunks of parsed taxi-rides to a staging cache entry while iterating, the entry is published once all
+    chunks are written.
+    :param cache: staging cache
+    :param key: cache key
+    :param chunk_iterator: taxi-rides pyarrow table iterator
+    :return: taxi-rides pyarrow table iterator
+    """
+    partial = cache.fill(key)
+    for i, table in enumerate(chunk_iterator):
+        cache.write(partial, table, i)
+        yield table
+    cache.commit(key, partial)
+
+
+def filter_taxi_rides(taxi_rides_df, filtering_bounds):
+    """
+    Apply filtering bounds on taxi-rides dataframe or pyarrow table.
+    :param taxi_rides_df: taxi rides dataframe or pyarrow table
+    :param filtering_bounds: filtering bounds
+    :return: filtered taxi rides dataframe or pyarrow table
+    """
+    mask = filtering_mask(taxi_rides_df, filtering_bounds)
+    if isinstance(taxi_rides_df, pa.Table):
+        return taxi_rides_df.filter(pa.array(mask))
+    return taxi_rides_df[mask]
+
+
+def generate_columns(taxi_rides_df, app_id):
     """
-    # inner join on pickup location id, drop duplicate columns
-    taxi_rides_df = taxi_rides_df.merge(taxi_zones_df, how="inner",
-                                        left_on="PULocationID",
-                                        right_on="LocationID",
-                                        right_index=True)
-    taxi_rides_df = taxi_rides_df.drop("PULocationID", axis="columns")
-    # inner join on drop off location id, drop duplicate columns
-    taxi_rides_df = taxi_rides_df.merge(taxi_zones_df, how="inner",
-                                        left_on="DOLocationID",
-                                        right_on="LocationID",
-                                        suffixes=["_PU", "_DO"],
-                                        right_index=True)
-    taxi_rides_df = taxi_rides_df.drop("DOLocationID", axis="columns")
+    Generate app_id and date_PU columns of taxi-rides dataframe or pyarrow table.
+    :param taxi_rides_df: taxi rides dataframe or pyarrow table
+    :param app_id: application id
+    :return: taxi rides dataframe or pyarrow table with additional columns
+    """
+    if isinstance(taxi_rides_df, pa.Table):
+        date_pu = pa.array(date_partition_keys(taxi_rides_df.column("datetime_PU").to_numpy()))
+        app_ids = pa.DictionaryArray.from_arrays(pa.array(np.zeros(taxi_rides_df.num_rows, dtype="int32")),
+                                                 pa.array([app_id]))
+        return taxi_rides_df.append_column("app_id", app_ids).append_column("date_PU", date_pu)
+    taxi_rides_df["app_id"] = app_id
+    taxi_rides_df["date_PU"] = date_partition_keys(taxi_rides_df["datetime_PU"])
     return taxi_rides_df
 
 
-def rule_to_expression(filtering_rule):
+def join_with_zones(taxi_rides_df, taxi_zones_df):
     """
-    Single filtering rule to expression
-    :param filtering_rule:
-    :return: expression
+    Perform joining taxi-rides and taxi zones dataframes on Location ID.
+    :param taxi_rides_df: taxi rides dataframe or pyarrow table
+    :param taxi_zones_df: taxi zone dataframe
+    :return: joined  taxi-rides and taxi zones dataframes on Location ID
     """
-    column = filtering_rule["column"]
-    filter_type = filtering_rule["type"]
-    filter_params = filtering_rule["value"]
-    if filter_type == "range":
-        sdt = "Timestamp({},{},{})".format(filter_params[0][0], filter_params[0][1], filter_params[0][2])
-        edt = "Timestamp({},{},{})".format(filter_params[1][0], filter_params[1][1], filter_params[1][2])
-        return "{}.dt.date >= {} and {}.dt.date <= {}".format(column, sdt, column, edt)
-    elif filter_type == "date":
-        return "{}.dt.year == {} and {}.dt.month == {} and {}.dt.day == {}".format(column, filter_params[0],
-                                                                                   column, filter_params[1],
-                                                                                   column, filter_params[2])
-    elif filter_type == "year-month":
-        return "{}.dt.year == {} and {}.dt.month == {}".format(column, filter_params[0], column, filter_params[1])
-    elif filter_type == "year":
-        return "{}.dt.year == {}".format(column, filter_params)
+    # location ids are small dense integers, zone attributes are gathered by position
+    lookup = zones_lookup(taxi_zones_df)
+    if isinstance(taxi_rides_df, pa.Table):
+        return lookup_join_arrow(taxi_rides_df, lookup)
+    return lookup_join(taxi_rides_df, lookup)
 
 
 def setup_parser(parser):
@@ -197,8 +681,40 @@ def setup_parser(parser):
     """
     parser.add_argument('--chunksize', type=int, required=False,
                         help="Use chunking for large files. N as size of chunk.")
+    parser.add_argument('--memory-budget', required=False,
+                        help="Use chunking with chunk sizes adapted to a memory budget (e.g. 512M, 4G), measured "
+                             "from the previous chunk. --chunksize as size of the first chunk.")
+    parser.add_argument('--pipeline-depth', type=int, required=False, default=2,
+                        help="Chunked mode only. Chunks queued between the reader thread, transformations and the "
+                             "writer thread, 0 to read, transform and write each chunk in turn.")
     parser.add_argument('--samplesize', type=int, required=False,
                         help="Use sampling. N as first rows read")
+    parser.add_argument('--row-group-size', type=int, required=False, default=1000000,
+                        help="Chunking & workers only. Buffered rows of a partition flushed as a parquet "
+                             "row group.")
+    parser.add_argument('--max-open-files', type=int, required=False, default=64,
+                        help="Chunking only. Maximum number of partition files kept open.")
+    parser.add_argument('--writer-threads', type=int, required=False,
+                        help="Chunking & workers only. Number of parquet encoding threads, defaults to number "
+                             "of cpus (divided by workers).")
+    parser.add_argument('--workers', type=int, required=False,
+                        help="Number of worker processes, each processing newline-aligned byte ranges of the "
+                             "input (not supported with chunking, sampling, --mmap and --cache-dir).")
+    parser.add_argument('--range-bytes', type=int, required=False, default=256 * 1024 * 1024,
+                        help="Workers & incremental only. Maximum size of a byte range in bytes.")
+    parser.add_argument('--mmap', required=False, action="store_true",
+                        help="Chunking only. Memory-map local input files, chunks are parsed by the pyarrow csv "
+                             "reader from slices of the mapping.")
+    parser.add_argument('--cache-dir', required=False,
+                        help="Local staging cache directory of parsed taxi rides, reused by later runs on the same "
+                             "input (path, size & mtime). Cache misses are read with the pyarrow csv reader. Not "
+                             "used by sampling, not supported with workers and incremental ingestion.")
+    parser.add_argument('--cache-budget', required=False, default="20G",
+                        help="Disk budget of the staging cache (e.g. 512M, 20G), least recently used entries are "
+                             "evicted first.")
+    parser.add_argument('--csv-engine', required=False, default="pandas", choices=["pandas", "pyarrow"],
+                        help="CSV reader engine, 'pyarrow' reads with the explicit schema in a multithreaded "
+                             "block-based reader.")
     return parser
 
 
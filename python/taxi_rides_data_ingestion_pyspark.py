@@ -1,8 +1,17 @@
 import argparse
+import json
+import urllib.request
 from util import *
-from pyspark.sql import SparkSession
-from pyspark.sql.functions import *
-from pyspark.sql.types import *
+
+# compressed parquet size of an enriched ride record without zone geometries, in bytes, measured on rides sorted by
+# pickup datetime written as a single snappy file : ~32.5 bytes (full layout) to ~35 bytes (dimension layout), of
+# which ~9 bytes for each of the pickup & drop off timestamps. Page & footer overhead is negligible in target sized
+# files.
+RIDE_RECORD_BYTES = 35
+# imported on first use
+pyspark_sql = lazy_import("pyspark.sql")
+F = lazy_import("pyspark.sql.functions")
+T = lazy_import("pyspark.sql.types")
 
 
 def run(argv, parser):
@@ -15,8 +24,12 @@ def run(argv, parser):
     args = setup_parser(init_parser(parser)).parse_args(argv)
     # app id
     app_id = generate_app_id()
+    # storage options of files written outside of spark (manifest, staged input, run report)
+    storage_options = generate_storage_options(args)
+    # stage timings, memory & rows of the run, stages before the write only build the query plan
+    profiler = RunProfiler(app_id, "pyspark")
     # start spark session
-    spark = SparkSession.builder.master(args.master) \
+    spark = pyspark_sql.SparkSession.builder.master(args.master) \
         .config("spark.jars", args.jars) \
         .config("spark.executor.cores", args.executor_cores) \
         .config("spark.driver.cores", args.driver_cores) \
@@ -25,7 +38,6 @@ def run(argv, parser):
         .config("spark.sql.parquet.outputTimestampType", "TIMESTAMP_MICROS") \
         .config("spark.sql.parquet.writeLegacyFormat", "true") \
         .config("spark.sql.execution.arrow.pyspark.enabled", "true") \
-        .config("spark.sql.autoBroadcastJoinThreshold", "-1") \
         .config("spark.sql.legacy.timeParserPolicy", "LEGACY") \
         .config("fs.azure.account.auth.type", "OAuth") \
         .config("fs.azure.account.oauth.provider.type", "org.apache.hadoop.fs.azurebfs.oauth2.ClientCredsTokenProvider") \
@@ -34,80 +46,139 @@ def run(argv, parser):
         .config("fs.azure.account.oauth2.client.endpoint",
                 "https://login.microsoftonline.com/" + args.azure_tenant_id + "/oauth2/token") \
         .appName("taxi_rides_data_ingestion_pyspark_{}".format(app_id)).getOrCreate()
+    # sql conf of the run set on its own session, sharing the spark context with the other serve mode jobs
+    spark = spark.newSession()
+    # auto-broadcast disabled only when sort-merge zones join is requested
+    spark.conf.set("spark.sql.autoBroadcastJoinThreshold", "-1" if args.zones_join == "sort-merge" else "10485760")
+    # spark jobs of the run grouped by app id, stage metrics are those of the run
+    spark.sparkContext.setJobGroup(app_id, "taxi rides ingestion {}".format(app_id))
     # get taxi zones dataframe
-    taxi_zones_df = taxi_zones(spark, args.taxi_zones_path)
-    info("Taxi-zones dataframe loaded (csv-src={}).".format(args.taxi_zones_path))
-    # get taxi rides dataframe
-    taxi_rides_df = taxi_rides(spark, args.taxi_trips_path)
+    slim_zones = args.slim_zones or args.zones_layout == "dimension"
+    with profiler.stage("zones"):
+        if args.zones_layout == "dimension":
+            # all zone attributes written once as the single file of the other modes, geometries left out of the rides
+            zones_pdf = taxi_zones(spark, args.taxi_zones_path).toPandas().set_index("LocationID")
+            info("Taxi-zones dimension written : {}".format(write_zones_dimension(zones_pdf, args.output_path,
+                                                                                 storage_options)))
+        # dataframe kept with the session across serve mode jobs until the zones file changes
+        taxi_zones_df = warm_zones(args.taxi_zones_path, storage_options,
+                                   lambda: taxi_zones(spark, args.taxi_zones_path, slim_zones), variant=slim_zones)
+    info("Taxi-zones dataframe loaded (csv-src={}, slim={}).".format(args.taxi_zones_path, slim_zones))
+    # get filtering_rules compiled to datetime bounds
+    filtering_bounds = filtering_rules_to_bounds(get_filtering_rules(args))
+    # get taxi rides dataframe, only new files & bytes appended since the last run recorded in the manifest
+    # if incremental
+    if args.incremental:
+        manifest, slices = plan_incremental_ingestion(args.taxi_trips_path, args.output_path, storage_options)
+        staging_path = posixpath.join(args.output_path, "_staging", app_id)
+        trips_paths = stage_slices(slices, staging_path, storage_options)
+        if not trips_paths:
+            commit_manifest(args.output_path, manifest, slices, app_id, storage_options)
+            info("Done. No new input since last ingestion (src={})".format(args.taxi_trips_path))
+            return
+        with profiler.stage("read"):
+            taxi_rides_df = taxi_rides(spark, trips_paths)
+    elif is_parquet_input(args.taxi_trips_path, storage_options):
+        # ingested taxi rides parquet dataset (re-enrichment) pruned on pickup dates
+        with profiler.stage("read"):
+            taxi_rides_df = taxi_rides_parquet(spark, args.taxi_trips_path, taxi_zones_df, filtering_bounds)
+    else:
+        with profiler.stage("read"):
+            taxi_rides_df = taxi_rides(spark, args.taxi_trips_path)
     info("Taxi-rides dataframe loaded (src={}).".format(args.taxi_trips_path))
-    # get filtering_rules & pandas expression
-    filtering_expression = filtering_rules_to_expression(get_filtering_rules(args), rule_to_expression)
     # filter
-    if filtering_expression is not None:
-        info("Applying filtering expression : {}".format(filtering_expression))
-        taxi_rides_df.createOrReplaceTempView("taxi_rides")
-        taxi_rides_df = spark.sql("SELECT * from taxi_rides WHERE {}".format(filtering_expression))
+    if filtering_bounds:
+        info("Applying filtering bounds : {}".format(filtering_bounds_to_string(filtering_bounds)))
+        with profiler.stage("filter"):
+            taxi_rides_df = taxi_rides_df.filter(filtering_condition(filtering_bounds))
+    # filtered rides aggregated natively by spark for the rollups
+    filtered_rides_df = taxi_rides_df
     # join
-    info("Joining dataframes")
-    taxi_rides_df = join_with_zones(taxi_rides_df, taxi_zones_df)
+    info("Joining dataframes (zones-join={})".format(args.zones_join))
+    with profiler.stage("join"):
+        taxi_rides_df = join_with_zones(taxi_rides_df, taxi_zones_df, args.zones_join == "broadcast")
     # generate app_id and date_PU column
     info("Generating additional columns")
-    taxi_rides_df = taxi_rides_df.withColumn("app_id", lit(app_id).cast(StringType()))
-    taxi_rides_df = taxi_rides_df.withColumn("date_PU",
-                                             from_unixtime(unix_timestamp(taxi_rides_df["datetime_PU"]), "yyyyMMdd"))
-    # write
-    taxi_rides_df.write.parquet(args.output_path, mode="append", partitionBy=["date_PU", "borough_PU"])
+    with profiler.stage("columns"):
+        taxi_rides_df = taxi_rides_df.withColumn("app_id", F.lit(app_id).cast(T.StringType()))
+        taxi_rides_df = taxi_rides_df.withColumn("date_PU", (F.year("datetime_PU") * 10000 +
+                                                             F.month("datetime_PU") * 100 +
+                                                             F.dayofmonth("datetime_PU")).cast(T.IntegerType()))
+    # write, whole query executed
+    partition_cols = ["date_PU", "borough_PU"]
+    max_records = args.max_records_per_file
+    if args.target_file_size_mb:
+        target_records = target_records_per_file(args.target_file_size_mb * 1024 * 1024, taxi_zones_df,
+                                                 args.zones_layout)
+        max_records = min(max_records, target_records) if max_records else target_records
+    info("Writing (write-layout={}, max-records-per-file={})".format(args.write_layout, max_records or "unlimited"))
+    with profiler.stage("write"):
+        if args.write_layout == "clustered":
+            taxi_rides_df = cluster_partitions(taxi_rides_df, partition_cols)
+        writer = taxi_rides_df.write
+        if args.zones_layout == "categorical":
+            # dictionary pages large enough to keep repeated zone attributes (geometries) dictionary-encoded
+            writer = writer.option("parquet.dictionary.page.size", 64 * 1024 * 1024)
+        if max_records:
+            writer = writer.option("maxRecordsPerFile", max_records)
+        writer.parquet(args.output_path, mode="append", partitionBy=partition_cols)
+    if args.incremental:
+        # recorded once the output is written, a failed run is ingested again by the next one
+        commit_manifest(args.output_path, manifest, slices, app_id, storage_options)
+        fs, fs_staging_path = storage_filesystem(staging_path, storage_options)
+        if fs.exists(fs_staging_path):
+            fs.rm(fs_staging_path, recursive=True)
+        info("Ingestion manifest updated (files={}).".format(len(slices)))
     info("Done. Data persisted at : {}".format(args.output_path))
+    if args.rollups:
+        # groups collected to the driver, finished & written as by the other modes
+        with profiler.stage("rollups") as stage:
+            rollups = taxi_rides_rollups(filtered_rides_df, taxi_zones_df).toPandas()
+            stage["rows_out"] = len(rollups)
+        with profiler.stage("rollups_write") as stage:
+            stage["rows_out"] = len(rollups)
+            rollups_path = write_rollups(finish_rollups(rollups), args.output_path, app_id, storage_options)
+        info("Rollups written : {} ({} records)".format(rollups_path, len(rollups)))
+    metrics = stage_metrics(spark, app_id)
+    info("Spark stages (zones-join={}) : {} stages, {} with shuffle, shuffle read {} bytes, shuffle write {} bytes."
+         .format(args.zones_join, metrics["stages"], metrics["shuffle_stages"],
+                 metrics["shuffle_read_bytes"], metrics["shuffle_write_bytes"]))
+    # rows written are the output records of the write stages
+    next(stage for stage in profiler.stages if stage["stage"] == "write")["rows_out"] = metrics["output_records"]
+    profiler.metrics["spark_stages"] = metrics
+    info("Run report written : {}".format(profiler.write_report(report_dir(args), storage_options)))
 
 
-def taxi_zones(spark, path):
+def taxi_zones(spark, path, slim=False):
     """
     Return taxi-zones spark dataframe.
     :param spark: spark instance
     :param path: input path
+    :param slim: drop zone geometries
     :return: dataframe
     """
-    zone_schema = StructType([
-        StructField("OBJECTID", StringType()),
-        StructField("Shape_Leng", DoubleType()),
-        StructField("the_geom", StringType()),
-        StructField("Shape_Area", DoubleType()),
-        StructField("zone", StringType()),
-        StructField("LocationID", IntegerType()),
-        StructField("borough", StringType())
-    ])
+    zone_schema = spark_schema(ZONE_SCHEMA)
     zdf = spark.read.csv(path, header=True,
                          schema=zone_schema,
                          mode="FAILFAST")
-    return zdf.drop("OBJECTID")
+    # single zone per location id, the zone of the lowest OBJECTID as in all modes (see unique_taxi_zones)
+    first_zone = pyspark_sql.Window.partitionBy("LocationID").orderBy(F.col("OBJECTID").cast("long").asc_nulls_last())
+    zdf = zdf.withColumn("zone_rank", F.row_number().over(first_zone)).filter("zone_rank = 1").drop("zone_rank")
+    zdf = zdf.drop("OBJECTID")
+    if slim:
+        # geometries are large WKT strings, location ids are kept in the output instead
+        zdf = zdf.drop("the_geom")
+    return zdf
 
 
 def taxi_rides(spark, path):
     """
     Return taxi-rides spark dataframe.
     :param spark: spark instance
-    :param path: input path
+    :param path: input path or list of input paths
     :return: dataframe
     """
-    trip_schema = StructType([
-        StructField("VendorID", IntegerType()),
-        StructField("tpep_pickup_datetime", TimestampType()),
-        StructField("tpep_dropoff_datetime", TimestampType()),
-        StructField("passenger_count", IntegerType()),
-        StructField("trip_distance", DoubleType()),
-        StructField("RatecodeID", IntegerType()),
-        StructField("store_and_fwd_flag", StringType()),
-        StructField("PULocationID", IntegerType()),
-        StructField("DOLocationID", IntegerType()),
-        StructField("payment_type", IntegerType()),
-        StructField("fare_amount", DecimalType(5, 2)),
-        StructField("extra", DecimalType(4, 2)),
-        StructField("mta_tax", DecimalType(2, 2)),
-        StructField("tip_amount", DecimalType(5, 2)),
-        StructField("tolls_amount", DecimalType(5, 2)),
-        StructField("improvement_surcharge", DecimalType(2, 2)),
-        StructField("total_amount", DecimalType(5, 2))
-    ])
+    trip_schema = spark_schema(TRIP_SCHEMA)
     timestamp_fmt = "MM/dd/yyyy hh:mm:ss aa"
     tdf = spark.read.csv(path, header=True,
                          schema=trip_schema,
@@ -118,37 +189,107 @@ def taxi_rides(spark, path):
     return tdf.withColumn("store_and_fwd_flag", tdf["store_and_fwd_flag"].cast("boolean"))
 
 
-def rule_to_expression(filtering_rule):
+def taxi_rides_parquet(spark, path, taxi_zones_df, filtering_bounds=None):
+    """
+    Return taxi-rides spark dataframe of an ingested parquet dataset. date_PU partitions are pruned by pickup
+    filtering bounds and row groups by the pushed down filtering condition. Zone enrichment, app_id and date_PU
+    columns are dropped, location ids are kept if present or mapped back from zone attributes.
+    :param spark: spark instance
+    :param path: dataset path
+    :param taxi_zones_df: taxi zone dataframe
+    :param filtering_bounds: filtering bounds
+    :return: dataframe
+    """
+    tdf = spark.read.option("basePath", path).parquet(path)
+    low, high = pickup_date_key_bounds(filtering_bounds or [])
+    if low is not None:
+        tdf = tdf.filter((F.col("date_PU") >= F.lit(low)) & (F.col("date_PU") <= F.lit(high)))
+    if filtering_bounds:
+        tdf = tdf.filter(filtering_condition(filtering_bounds))
+    for suffix in ["PU", "DO"]:
+        if suffix + "LocationID" not in tdf.columns:
+            tdf = zone_location_ids(tdf, suffix, taxi_zones_df)
+    trip_schema = spark_schema(TRIP_SCHEMA)
+    columns = ["datetime_PU", "datetime_DO"] + [field.name for field in trip_schema.fields
+                                                if field.name not in ("tpep_pickup_datetime", "tpep_dropoff_datetime")]
+    return tdf.select(*[F.col(name).cast(trip_schema[name].dataType) if name in trip_schema.names else F.col(name)
+                        for name in columns])
+
+
+def zone_location_ids(taxi_rides_df, suffix, taxi_zones_df):
+    """
+    Map zone attributes of ingested taxi rides back to location ids, matched on name, borough and shape length &
+    area when available, then on name & borough only (ambiguous names mapped to the lowest location id). Rides
+    of unknown zones are dropped.
+    :param taxi_rides_df: ingested taxi rides dataframe
+    :param suffix: PU or DO
+    :param taxi_zones_df: taxi zone dataframe
+    :return: dataframe with location id column
+    """
+    location_id = suffix + "LocationID"
+    matched = []
+    for attributes in [["zone", "borough", "Shape_Leng", "Shape_Area"], ["zone", "borough"]]:
+        if any("{}_{}".format(attribute, suffix) not in taxi_rides_df.columns for attribute in attributes):
+            continue
+        zones = taxi_zones_df.groupBy(*attributes).agg(F.min("LocationID").alias("{}_{}".format(location_id,
+                                                                                                len(matched))))
+        for attribute in attributes:
+            zones = zones.withColumnRenamed(attribute, "{}_{}".format(attribute, suffix))
+        taxi_rides_df = taxi_rides_df.join(F.broadcast(zones), ["{}_{}".format(attribute, suffix)
+                                                              for attribute in attributes], "left")
+        matched.append("{}_{}".format(location_id, len(matched)))
+    taxi_rides_df = taxi_rides_df.withColumn(location_id, F.coalesce(*[F.col(name) for name in matched]) if matched
+                                             else F.lit(None).cast(T.IntegerType()))
+    return taxi_rides_df.drop(*matched).filter(F.col(location_id).isNotNull())
+
+
+def spark_schema(schema):
+    """
+    Return spark schema of a schema definition.
+    :param schema: schema definition as list of (name, type)
+    :return: spark schema
+    """
+    # booleans (Y/N) are read as strings and cast afterwards
+    types = {"int32": T.IntegerType(), "float64": T.DoubleType(), "string": T.StringType(), "boolean": T.StringType(),
+             "timestamp": T.TimestampType()}
+    fields = []
+    for name, column_type in schema:
+        if column_type.startswith("decimal"):
+            precision, scale = MONETARY_COLUMNS[name]
+            fields.append(T.StructField(name, T.DecimalType(precision, scale)))
+        else:
+            fields.append(T.StructField(name, types[column_type]))
+    return T.StructType(fields)
+
+
+def filtering_condition(filtering_bounds):
     """
-    Single filtering rule to expression
-    :param filtering_rule:
-    :return: expression
+    Filtering bounds to spark column condition
+    :param filtering_bounds: filtering bounds
+    :return: column condition
     """
-    column = filtering_rule["column"]
-    filter_type = filtering_rule["type"]
-    filter_params = filtering_rule["value"]
-    if filter_type == "range":
-        sdt = "to_timestamp(\"{}-{}-{}\",\"yyyy-MM-dd\")".format(filter_params[0][0], filter_params[0][1], filter_params[0][2])
-        edt = "to_timestamp(\"{}-{}-{}\",\"yyyy-MM-dd\")".format(filter_params[1][0], filter_params[1][1], filter_params[1][2])
-        return "{} >= {} and {} <= {}".format(column, sdt, column, edt)
-    elif filter_type == "date":
-        return "date_format({},\"yyyy-MM-dd\") == \"{}-{}-{}\"".format(column, filter_params[0],filter_params[1],filter_params[2])
-    elif filter_type == "year-month":
-        return "year({}) == {} and month({}) == {}".format(column, filter_params[0], column, filter_params[1])
-    elif filter_type == "year":
-        return "year({}) == {}".format(column, filter_params)
+    condition = None
+    for column, start, end in filtering_bounds:
+        column_condition = (F.col(column) >= F.lit(start)) & (F.col(column) < F.lit(end))
+        condition = column_condition if condition is None else condition & column_condition
+    return condition
 
 
-def join_with_zones(taxi_rides_df, taxi_zones_df):
+def join_with_zones(taxi_rides_df, taxi_zones_df, broadcast_zones=True):
     """
     Perform joining taxi-rides and taxi zones dataframes on Location ID.
     :param taxi_rides_df: taxi rides dataframe
     :param taxi_zones_df: taxi zone dataframe
+    :param broadcast_zones: broadcast zones dataframe to executors, avoiding shuffling taxi rides
     :return: joined  taxi-rides and taxi zones dataframes on Location ID
     """
+    if broadcast_zones:
+        taxi_zones_df = F.broadcast(taxi_zones_df)
+    # location ids are kept when zone geometries are not part of the zones dataframe
+    slim = "the_geom" not in taxi_zones_df.columns
     taxi_rides_df = taxi_rides_df.join(taxi_zones_df,
                                        taxi_rides_df["PULocationID"] == taxi_zones_df["LocationID"], "inner")
-    taxi_rides_df = taxi_rides_df.drop("PULocationID", "LocationID")
+    taxi_rides_df = taxi_rides_df.drop("LocationID") if slim else taxi_rides_df.drop("PULocationID", "LocationID")
     taxi_rides_df = taxi_rides_df.withColumnRenamed("Shape_Leng", "Shape_Leng_PU") \
         .withColumnRenamed("the_geom", "the_geom_PU") \
         .withColumnRenamed("Shape_Area", "Shape_Area_PU") \
@@ -156,7 +297,7 @@ def join_with_zones(taxi_rides_df, taxi_zones_df):
         .withColumnRenamed("borough", "borough_PU")
     taxi_rides_df = taxi_rides_df.join(taxi_zones_df,
                                        taxi_rides_df["DOLocationID"] == taxi_zones_df["LocationID"], "inner")
-    taxi_rides_df = taxi_rides_df.drop("DOLocationID", "LocationID")
+    taxi_rides_df = taxi_rides_df.drop("LocationID") if slim else taxi_rides_df.drop("DOLocationID", "LocationID")
     taxi_rides_df = taxi_rides_df.withColumnRenamed("Shape_Leng", "Shape_Leng_DO") \
         .withColumnRenamed("the_geom", "the_geom_DO") \
         .withColumnRenamed("Shape_Area", "Shape_Area_DO") \
@@ -165,6 +306,110 @@ def join_with_zones(taxi_rides_df, taxi_zones_df):
     return taxi_rides_df
 
 
+def taxi_rides_rollups(taxi_rides_df, taxi_zones_df):
+    """
+    Return partial rollups of taxi rides by pickup hour and pickup/drop off location id, with the columns of
+    rollup_partial : trips, sums of the summed columns and <column>_bin_<i> histogram bin counts. Rides of location
+    ids unknown to the zones are left out as by the zones join.
+    :param taxi_rides_df: taxi rides dataframe, before the zones join
+    :param taxi_zones_df: taxi zones dataframe
+    :return: rollups dataframe
+    """
+    location_ids = [row["LocationID"] for row in taxi_zones_df.select("LocationID").collect()]
+    taxi_rides_df = taxi_rides_df.filter(F.col("PULocationID").isin(location_ids) &
+                                         F.col("DOLocationID").isin(location_ids) &
+                                         F.col("datetime_PU").isNotNull())
+    aggregations = [F.count(F.lit(1)).alias("trips")]
+    # sums as doubles, as summed by the other modes (nulls skipped, 0 for groups of null values only)
+    aggregations += [F.coalesce(F.sum(F.col(column).cast(T.DoubleType())), F.lit(0.0)).alias(column)
+                     for column in ROLLUP_SUM_COLUMNS]
+    for column, edges in ROLLUP_HISTOGRAM_EDGES.items():
+        # bin i holds values in [edges[i - 1], edges[i]), first & last bins are open
+        bounds = [None] + list(edges) + [None]
+        for i in range(len(edges) + 1):
+            low, high = bounds[i], bounds[i + 1]
+            condition = F.col(column).isNotNull()
+            if low is not None:
+                condition = condition & (F.col(column) >= F.lit(low))
+            if high is not None:
+                condition = condition & (F.col(column) < F.lit(high))
+            aggregations.append(F.sum(F.when(condition, 1).otherwise(0)).alias("{}_bin_{}".format(column, i)))
+    return taxi_rides_df.groupBy(F.date_trunc("hour", "datetime_PU").alias("hour_PU"), "PULocationID",
+                                 "DOLocationID").agg(*aggregations)
+
+
+def cluster_partitions(taxi_rides_df, partition_cols):
+    """
+    Repartition taxi rides by the output partition columns, each output partition written by a single task (as
+    a single file unless split by max records per file), rows sorted by pickup datetime then pickup zone within
+    each output partition so that row group statistics prune time-range and zone queries.
+    :param taxi_rides_df: taxi rides dataframe
+    :param partition_cols: output partition columns
+    :return: repartitioned dataframe
+    """
+    # pickup location ids are only kept without zone geometries, pickup zones cluster the same rows otherwise
+    zone_col = "PULocationID" if "PULocationID" in taxi_rides_df.columns else "zone_PU"
+    # sorted by the partition columns first, the ordering required by the partitioned write
+    return taxi_rides_df.repartition(*partition_cols) \
+        .sortWithinPartitions(*(partition_cols + ["datetime_PU", zone_col]))
+
+
+def target_records_per_file(target_bytes, taxi_zones_df, zones_layout="full"):
+    """
+    Return number of records per file of a target parquet file size, from the estimated compressed size of a ride
+    record.
+    :param target_bytes: target file size in bytes
+    :param taxi_zones_df: taxi zones dataframe
+    :param zones_layout: zone attributes layout
+    :return: number of records per file
+    """
+    record_bytes = RIDE_RECORD_BYTES
+    if zones_layout == "full" and "the_geom" in taxi_zones_df.columns:
+        # pickup & drop off geometries are stored plain once they overflow the default dictionary page
+        record_bytes += 2 * (taxi_zones_df.select(F.avg(F.length("the_geom"))).first()[0] or 0)
+    info("Estimated record size : {:.0f} bytes".format(record_bytes))
+    return max(1, int(target_bytes / record_bytes))
+
+
+def stage_metrics(spark, job_group=None):
+    """
+    Return stage count, shuffle bytes, executor times and records of the spark application (of the jobs of a job
+    group), read from the spark ui REST api.
+    :param spark: spark instance
+    :param job_group: job group id, all stages of the application if None
+    :return: stage metrics dict
+    """
+    metrics = {"stages": 0, "shuffle_stages": 0, "shuffle_read_bytes": 0, "shuffle_write_bytes": 0,
+               "executor_run_time_ms": 0, "executor_cpu_time_ns": 0, "input_records": 0, "output_records": 0,
+               "memory_spilled_bytes": 0, "disk_spilled_bytes": 0}
+    ui_url = spark.sparkContext.uiWebUrl
+    if ui_url is None:
+        return metrics
+    stages_url = "{}/api/v1/applications/{}/stages?status=complete".format(ui_url,
+                                                                           spark.sparkContext.applicationId)
+    with urllib.request.urlopen(stages_url) as response:
+        stages = json.loads(response.read().decode())
+    if job_group is not None:
+        jobs_url = "{}/api/v1/applications/{}/jobs".format(ui_url, spark.sparkContext.applicationId)
+        with urllib.request.urlopen(jobs_url) as response:
+            jobs = json.loads(response.read().decode())
+        stage_ids = set(stage_id for job in jobs if job.get("jobGroup") == job_group for stage_id in job["stageIds"])
+        stages = [stage for stage in stages if stage["stageId"] in stage_ids]
+    for stage in stages:
+        metrics["stages"] += 1
+        if stage["shuffleReadBytes"] > 0 or stage["shuffleWriteBytes"] > 0:
+            metrics["shuffle_stages"] += 1
+        metrics["shuffle_read_bytes"] += stage["shuffleReadBytes"]
+        metrics["shuffle_write_bytes"] += stage["shuffleWriteBytes"]
+        metrics["executor_run_time_ms"] += stage.get("executorRunTime", 0)
+        metrics["executor_cpu_time_ns"] += stage.get("executorCpuTime", 0)
+        metrics["input_records"] += stage.get("inputRecords", 0)
+        metrics["output_records"] += stage.get("outputRecords", 0)
+        metrics["memory_spilled_bytes"] += stage.get("memoryBytesSpilled", 0)
+        metrics["disk_spilled_bytes"] += stage.get("diskBytesSpilled", 0)
+    return metrics
+
+
 def setup_parser(parser):
     """
     Setup argument parser.
@@ -183,6 +428,20 @@ def setup_parser(parser):
                         help="Memory limit of Spark executor.")
     parser.add_argument('--jars', required=False, default="",
                         help="Additional JARs to be included in driver and executors(comma-seperated).")
+    parser.add_argument('--zones-join', required=False, default="broadcast", choices=["broadcast", "sort-merge"],
+                        help="Zones join strategy, 'broadcast' ships zones to executors, 'sort-merge' shuffles "
+                             "taxi rides (auto-broadcast disabled).")
+    parser.add_argument('--slim-zones', required=False, action="store_true",
+                        help="Drop zone geometries, keeping pickup/drop off location ids in the output "
+                             "(--zones-layout dimension without the zones dimension).")
+    parser.add_argument('--write-layout', required=False, default="tasks", choices=["tasks", "clustered"],
+                        help="Output layout, 'tasks' writes a file per task and partition, 'clustered' "
+                             "repartitions by the partition columns and sorts rows by pickup datetime and zone.")
+    parser.add_argument('--max-records-per-file', type=int, required=False, default=0,
+                        help="Maximum number of records per output file, unlimited by default.")
+    parser.add_argument('--target-file-size-mb', type=int, required=False,
+                        help="Target output file size in MB, converted to a maximum number of records per file "
+                             "from the estimated record size.")
     return parser
 
 
@@ -0,0 +1,233 @@
+import argparse
+import importlib
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from util import info, error, enable_warm_resources, peak_rss, use_storage_standin
+
+# engines served, the engine module is imported once and kept warm across jobs
+SERVE_ENGINES = ["pandas", "dask", "pyspark", "duckdb"]
+# sub directories of the job queue directory
+QUEUE_DIRS = ["running", "done", "failed"]
+
+
+def run(argv, parser):
+    """
+    Implementation of the serve mode, ingestion jobs of one engine received over a local socket or a job-file queue
+    and run concurrently by a long-running process keeping the engine (dask cluster, spark session) and the taxi
+    zones warm.
+    :param argv: arguments
+    :param parser: argument parser isntance
+    """
+    args = setup_parser(parser).parse_args(argv)
+    if not args.queue_dir and not args.socket:
+        parser.error("at least one of --queue-dir or --socket is required")
+    enable_warm_resources()
+    # process-wide settings, set once for all jobs before the engine starts its workers
+    if args.storage_standin:
+        use_storage_standin(args.storage_standin)
+    if args.engine == "pyspark":
+        # python threads of the jobs pinned to their own jvm threads, job groups & local properties kept per job
+        os.environ.setdefault("PYSPARK_PIN_THREAD", "true")
+    engine = importlib.import_module("taxi_rides_data_ingestion_{}".format(args.engine))
+    server = JobServer(engine, args.engine, args.max_jobs)
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    socket_server = None
+    if args.socket:
+        socket_server = server.serve_socket(args.socket)
+    if args.queue_dir:
+        for name in QUEUE_DIRS:
+            os.makedirs(os.path.join(args.queue_dir, name), exist_ok=True)
+    info("Serving {} ingestion jobs (max-jobs={}, queue-dir={}, socket={}).".format(
+        args.engine, args.max_jobs, args.queue_dir, args.socket))
+    try:
+        while not stop.is_set():
+            if args.queue_dir:
+                server.poll_queue(args.queue_dir)
+            stop.wait(args.poll_interval)
+    except KeyboardInterrupt:
+        pass
+    info("Stopping, waiting for running jobs.")
+    if socket_server is not None:
+        socket_server.shutdown()
+        socket_server.server_close()
+        os.remove(args.socket)
+    server.shutdown()
+    info("Stopped ({} jobs done, {} jobs failed, peak rss {} bytes).".format(server.counts["done"],
+                                                                          server.counts["failed"], peak_rss()))
+
+
+class JobServer:
+    """
+    Bounded runner of ingestion jobs of an engine.
+    """
+
+    def __init__(self, engine, engine_name, max_jobs):
+        """
+        Create job runner.
+        :param engine: engine module
+        :param engine_name: engine name
+        :param max_jobs: maximum number of concurrent jobs
+        """
+        self.engine = engine
+        self.engine_name = engine_name
+        self.executor = ThreadPoolExecutor(max_jobs, thread_name_prefix="job")
+        # a slot is taken before a job is accepted, queued jobs are left to other servers when all slots are taken
+        self.slots = threading.BoundedSemaphore(max_jobs)
+        self.counts = {"done": 0, "failed": 0}
+        self.lock = threading.Lock()
+
+    def run_job(self, job_id, job_args):
+        """
+        Run ingestion job, argument errors and failures are reported in the result.
+        :param job_id: job id
+        :param job_args: engine arguments
+        :return: job result dict
+        """
+        info("Job {} started : {}".format(job_id, " ".join(job_args)))
+        start = time.time()
+        result = {"id": job_id, "engine": self.engine_name, "args": job_args}
+        try:
+            self.engine.run(job_args, argparse.ArgumentParser(
+                prog="{} {}".format(self.engine_name, job_id),
+                description="Taxi zone data ingestion (mode={})".format(self.engine_name)))
+            result["status"] = "done"
+        # argument errors exit the parser
+        except (Exception, SystemExit) as e:
+            result["status"] = "failed"
+            result["error"] = repr(e)
+            error("Job {} failed : {!r}".format(job_id, e))
+        finally:
+            self.slots.release()
+        result["seconds"] = round(time.time() - start, 3)
+        # memory is shared by the concurrent jobs, peak rss of the server process so far
+        result["server_peak_rss_bytes"] = peak_rss()
+        with self.lock:
+            self.counts[result["status"]] += 1
+        info("Job {} {} in {:.3f}s".format(job_id, result["status"], result["seconds"]))
+        return result
+
+    def submit(self, job_id, job_args, blocking=True):
+        """
+        Submit job when a slot is available.
+        :param job_id: job id
+        :param job_args: engine arguments
+        :param blocking: wait for a slot
+        :return: future of the job result, None when no slot is available
+        """
+        if not self.slots.acquire(blocking):
+            return None
+        return self.executor.submit(self.run_job, job_id, job_args)
+
+    def poll_queue(self, queue_dir):
+        """
+        Claim & submit the pending job files (*.json holding {"args": [...]}) of a queue directory, oldest first.
+        A job file is claimed by moving it to running/, and moved to done/ or failed/ next to its result once run.
+        :param queue_dir: job queue directory
+        """
+        names = sorted((name for name in os.listdir(queue_dir) if name.endswith(".json")),
+                       key=lambda name: os.path.getmtime(os.path.join(queue_dir, name))
+                       if os.path.exists(os.path.join(queue_dir, name)) else 0)
+        for name in names:
+            if not self.slots.acquire(False):
+                return
+            running_path = os.path.join(queue_dir, "running", name)
+            try:
+                # rename is atomic, the job is claimed by one server only
+                os.rename(os.path.join(queue_dir, name), running_path)
+            except OSError:
+                self.slots.release()
+                continue
+            try:
+                with open(running_path) as f:
+                    job_args = [str(arg) for arg in json.load(f)["args"]]
+            except (ValueError, KeyError, TypeError) as e:
+                self.slots.release()
+                with self.lock:
+                    self.counts["failed"] += 1
+                error("Job {} rejected : {!r}".format(name, e))
+                finish_job_file(queue_dir, name, {"id": name[:-5], "status": "failed", "error": repr(e)})
+                continue
+            future = self.executor.submit(self.run_job, name[:-5], job_args)
+            future.add_done_callback(lambda f, name=name: finish_job_file(queue_dir, name, f.result()))
+
+    def serve_socket(self, path):
+        """
+        Serve jobs over a unix socket, each request line {"args": [...], "id": ...} is answered with the json line
+        of its result once run.
+        :param path: unix socket path
+        :return: socket server, serving in a background thread
+        """
+        job_server = self
+        job_ids = iter(range(1, sys.maxsize))
+
+        class JobRequestHandler(socketserver.StreamRequestHandler):
+
+            def handle(self):
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+                    try:
+                        request = json.loads(line)
+                        job_id = str(request.get("id") or "socket-{}".format(next(job_ids)))
+                        result = job_server.submit(job_id, [str(arg) for arg in request["args"]]).result()
+                    except (ValueError, KeyError, TypeError, AttributeError) as e:
+                        result = {"status": "failed", "error": repr(e)}
+                    self.wfile.write((json.dumps(result) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+
+        if os.path.exists(path):
+            os.remove(path)
+        socket_server = socketserver.ThreadingUnixStreamServer(path, JobRequestHandler)
+        socket_server.daemon_threads = True
+        threading.Thread(target=socket_server.serve_forever, name="socket", daemon=True).start()
+        return socket_server
+
+    def shutdown(self):
+        """
+        Wait for the running jobs.
+        """
+        self.executor.shutdown(wait=True)
+
+
+def finish_job_file(queue_dir, name, result):
+    """
+    Move job file out of running/ to done/ or failed/ and write its result next to it.
+    :param queue_dir: job queue directory
+    :param name: job file name
+    :param result: job result dict
+    """
+    target_dir = os.path.join(queue_dir, result["status"])
+    with open(os.path.join(target_dir, name[:-5] + ".result.json"), "w") as f:
+        json.dump(result, f)
+    os.rename(os.path.join(queue_dir, "running", name), os.path.join(target_dir, name))
+
+
+def setup_parser(parser):
+    """
+    Setup argument parser.
+    :param parser: argument parser
+    :return: configured parser
+    """
+    parser.add_argument('--engine', required=True, choices=SERVE_ENGINES, help="Engine of the served jobs.")
+    parser.add_argument('--queue-dir', required=False,
+                        help="Local job queue directory, job files *.json holding {\"args\": [...]}.")
+    parser.add_argument('--socket', required=False,
+                        help="Local unix socket path, one json request {\"args\": [...]} per line.")
+    parser.add_argument('--max-jobs', type=int, required=False, default=2, help="Maximum number of concurrent jobs.")
+    parser.add_argument('--poll-interval', type=float, required=False, default=1.0,
+                        help="Job queue polling interval in seconds.")
+    parser.add_argument('--storage-standin', required=False,
+                        help="Local directory standing in for Azure storage for all jobs, jobs may only pass the "
+                             "same --storage-standin.")
+    return parser
+
+
+if __name__ == "__main__":
+    run(sys.argv[1:], argparse.ArgumentParser())
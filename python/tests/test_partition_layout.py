@@ -0,0 +1,72 @@
+import argparse
+import os
+import sys
+
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from taxi_rides_benchmark import generate_trips, generate_zones
+
+
+def partition_directories(path):
+    """
+    Return partition directories of an output dataset, relative to its root.
+    :param path: output path
+    :return: set of relative directory paths
+    """
+    return set(os.path.relpath(root, path) for root, _, files in os.walk(path)
+               if files and not os.path.relpath(root, path).startswith("_"))
+
+
+def file_schemas(path):
+    """
+    Return schemas of the parquet files of an output dataset, without metadata.
+    :param path: output path
+    :return: set of schema strings
+    """
+    return set(pq.read_schema(os.path.join(root, name)).remove_metadata().to_string()
+               for root, _, files in os.walk(path) if not os.path.relpath(root, path).startswith("_")
+               for name in files)
+
+
+def ingest(mode, tmp_path, output_path, *options):
+    """
+    Run ingestion of the synthetic taxi trips of january 2020 in a mode.
+    :param mode: ingestion mode module name suffix
+    :param tmp_path: directory of the synthetic input files
+    :param output_path: output path
+    :param options: mode options
+    """
+    module = __import__("taxi_rides_data_ingestion_{}".format(mode))
+    module.run(["--taxi-trips-path", str(tmp_path / "trips.csv"), "--taxi-zones-path", str(tmp_path / "zones.csv"),
+                "--output-path", str(output_path)] + list(options), argparse.ArgumentParser())
+
+
+def test_pandas_and_duckdb_write_the_same_partitions(tmp_path):
+    pytest.importorskip("duckdb")
+    generate_zones(str(tmp_path / "zones.csv"), 0)
+    generate_trips(str(tmp_path / "trips.csv"), 2000, 0, days=3)
+    ingest("pandas", tmp_path, tmp_path / "pandas")
+    ingest("duckdb", tmp_path, tmp_path / "duckdb")
+    directories = partition_directories(str(tmp_path / "pandas"))
+    assert any(directory.endswith("borough_PU=Staten Island") for directory in directories)
+    assert partition_directories(str(tmp_path / "duckdb")) == directories
+    assert ds.dataset(str(tmp_path / "duckdb"), format="parquet", partitioning="hive").count_rows() == \
+        ds.dataset(str(tmp_path / "pandas"), format="parquet", partitioning="hive").count_rows()
+
+
+def test_readers_and_modes_write_the_same_schema(tmp_path):
+    pytest.importorskip("duckdb")
+    generate_zones(str(tmp_path / "zones.csv"), 0)
+    generate_trips(str(tmp_path / "trips.csv"), 2000, 0, days=3)
+    ingest("pandas", tmp_path, tmp_path / "pandas")
+    ingest("pandas", tmp_path, tmp_path / "arrow", "--csv-engine", "pyarrow", "--chunksize", "500")
+    ingest("duckdb", tmp_path, tmp_path / "duckdb")
+    schemas = file_schemas(str(tmp_path / "pandas"))
+    assert len(schemas) == 1
+    assert "datetime_PU: timestamp[us]" in next(iter(schemas)) and "VendorID: int32" in next(iter(schemas))
+    assert file_schemas(str(tmp_path / "arrow")) == schemas
+    assert file_schemas(str(tmp_path / "duckdb")) == schemas
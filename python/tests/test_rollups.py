@@ -0,0 +1,90 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from util import (MONETARY_COLUMNS, ROLLUP_HISTOGRAM_EDGES, ROLLUP_KEYS, ROLLUP_SUM_COLUMNS, finish_rollups,
+                  histogram_quantiles, merge_rollups, rollup_partial)
+
+
+def taxi_rides(n, seed=0):
+    """
+    Return random taxi rides pandas dataframe of the rolled up columns.
+    :param n: number of rides
+    :param seed: random seed
+    :return: pandas dataframe
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"datetime_PU": pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 6 * 3600, n),
+                                                                                      unit="s"),
+                       "PULocationID": rng.integers(1, 5, n),
+                       "DOLocationID": rng.integers(1, 5, n)})
+    for column in ROLLUP_SUM_COLUMNS:
+        df[column] = np.round(rng.uniform(0, 60, n), 2)
+    return df
+
+
+def sorted_rollup(rollup):
+    """
+    Return rollup rows sorted by keys.
+    :param rollup: rollup pandas dataframe
+    :return: pandas dataframe
+    """
+    return rollup.sort_values(ROLLUP_KEYS).reset_index(drop=True)
+
+
+def test_rollup_partial_leaves_out_unknown_zones_and_counts_bins():
+    df = taxi_rides(200)
+    rollup = rollup_partial(df, [1, 2, 3])
+    known = df[df["PULocationID"].isin([1, 2, 3]) & df["DOLocationID"].isin([1, 2, 3])]
+    assert rollup["trips"].sum() == len(known)
+    assert rollup["fare_amount"].sum() == pytest.approx(known["fare_amount"].sum())
+    for column, edges in ROLLUP_HISTOGRAM_EDGES.items():
+        bins = rollup[["{}_bin_{}".format(column, i) for i in range(len(edges) + 1)]]
+        assert (bins.sum(axis="columns") == rollup["trips"]).all()
+
+
+def test_merge_rollups_of_chunks_matches_whole_rollup():
+    df = taxi_rides(500)
+    whole = rollup_partial(df, [1, 2, 3, 4])
+    merged = merge_rollups([rollup_partial(df.iloc[:123], [1, 2, 3, 4]), None,
+                            rollup_partial(df.iloc[123:400], [1, 2, 3, 4]),
+                            rollup_partial(df.iloc[400:], [1, 2, 3, 4])])
+    pd.testing.assert_frame_equal(sorted_rollup(merged), sorted_rollup(whole), check_dtype=False)
+
+
+def test_merge_rollups_without_partials():
+    assert merge_rollups([]) is None
+    assert merge_rollups([None, None]) is None
+
+
+def test_histogram_quantiles_interpolate_within_bin():
+    edges = [0, 10, 20]
+    counts = np.array([[0, 2, 2, 0], [0, 0, 0, 4], [0, 0, 0, 0], [4, 0, 0, 0]])
+    np.testing.assert_allclose(histogram_quantiles(counts, edges, 0.5), [10, 20, np.nan, 0])
+    np.testing.assert_allclose(histogram_quantiles(counts, edges, 0.9), [18, 20, np.nan, 0])
+
+
+def test_histogram_quantiles_of_uniform_values():
+    values = np.arange(0, 100, 0.01)
+    edges = ROLLUP_HISTOGRAM_EDGES["fare_amount"]
+    counts = np.bincount(np.searchsorted(edges, values, side="right"), minlength=len(edges) + 1)
+    np.testing.assert_allclose(histogram_quantiles(counts[None, :], edges, 0.5), [50], atol=0.01)
+    np.testing.assert_allclose(histogram_quantiles(counts[None, :], edges, 0.9), [90], atol=0.01)
+
+
+def test_finish_rollups_columns_and_metadata():
+    table = finish_rollups(rollup_partial(taxi_rides(300), [1, 2, 3, 4]))
+    assert table.column_names[:4] == ["hour_PU", "PULocationID", "DOLocationID", "trips"]
+    assert table.column("trips").to_numpy().sum() == 300
+    for column in MONETARY_COLUMNS:
+        assert str(table.schema.field(column + "_sum").type) == "decimal128(18, 2)"
+    for column, edges in ROLLUP_HISTOGRAM_EDGES.items():
+        assert table.schema.field(column + "_histogram").type.list_size == len(edges) + 1
+        assert json.loads(table.schema.metadata["{}_histogram_edges".format(column).encode()]) == edges
+        assert "{}_p50".format(column) in table.column_names and "{}_p90".format(column) in table.column_names
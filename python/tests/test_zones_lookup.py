@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from util import lookup_join_arrow, unique_taxi_zones, zones_lookup
+
+
+def taxi_zones():
+    """
+    Return taxi zones pandas dataframe listing location id 2 twice, as the NYC zones export does for 56 & 103.
+    :return: pandas dataframe
+    """
+    return pd.DataFrame({"OBJECTID": [1, 4, 2, 3],
+                         "zone": ["Zone 1", "Zone 2 bis", "Zone 2", "Zone 3"],
+                         "LocationID": [1, 2, 2, 3],
+                         "borough": ["Queens", "Bronx", "Bronx", None]})
+
+
+def test_unique_taxi_zones_keeps_zone_of_lowest_object_id():
+    zdf = unique_taxi_zones(taxi_zones())
+    assert zdf["LocationID"].tolist() == [1, 2, 3]
+    assert zdf["zone"].tolist() == ["Zone 1", "Zone 2", "Zone 3"]
+
+
+def test_zones_lookup_rejects_duplicate_location_ids():
+    with pytest.raises(ValueError):
+        zones_lookup(taxi_zones().set_index("LocationID"))
+
+
+def test_lookup_join_arrow_of_null_zone_attribute():
+    lookup = zones_lookup(unique_taxi_zones(taxi_zones()).drop("OBJECTID", axis="columns").set_index("LocationID"))
+    table = lookup_join_arrow(pa.table({"PULocationID": pa.array([3, 2, 4], pa.int32()),
+                                        "DOLocationID": pa.array([1, 3, 1], pa.int32())}), lookup)
+    table.validate(full=True)
+    assert table.column("borough_PU").to_pylist() == [None, "Bronx"]
+    assert table.column("borough_DO").to_pylist() == ["Queens", None]
@@ -1,7 +1,77 @@
+import contextlib
 import datetime
+import hashlib
+import importlib
+import io
+import json
+import os
+import posixpath
+import queue
 import re
+import resource
 import secrets
+import shutil
 import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# taxi trips csv schema shared by all engines, types are one of
+# int32, float64, string, boolean, timestamp or decimal(precision,scale)
+TRIP_SCHEMA = [("VendorID", "int32"),
+               ("tpep_pickup_datetime", "timestamp"),
+               ("tpep_dropoff_datetime", "timestamp"),
+               ("passenger_count", "int32"),
+               ("trip_distance", "float64"),
+               ("RatecodeID", "int32"),
+               ("store_and_fwd_flag", "boolean"),
+               ("PULocationID", "int32"),
+               ("DOLocationID", "int32"),
+               ("payment_type", "int32"),
+               ("fare_amount", "decimal(5,2)"),
+               ("extra", "decimal(4,2)"),
+               ("mta_tax", "decimal(2,2)"),
+               ("tip_amount", "decimal(5,2)"),
+               ("tolls_amount", "decimal(5,2)"),
+               ("improvement_surcharge", "decimal(2,2)"),
+               ("total_amount", "decimal(5,2)")]
+# taxi zones csv schema
+ZONE_SCHEMA = [("OBJECTID", "string"),
+               ("Shape_Leng", "float64"),
+               ("the_geom", "string"),
+               ("Shape_Area", "float64"),
+               ("zone", "string"),
+               ("LocationID", "int32"),
+               ("borough", "string")]
+# monetary columns with their (precision, scale)
+MONETARY_COLUMNS = dict((name, tuple(int(n) for n in re.findall(r"[0-9]+", column_type)))
+                        for name, column_type in TRIP_SCHEMA if column_type.startswith("decimal"))
+# manifest of ingested input files, stored in the output root
+MANIFEST_FILE_NAME = "_ingestion_manifest.json"
+# version of parsed taxi trips stored in the staging cache, to be bumped when parsing or the schema change
+CACHE_SCHEMA_VERSION = 1
+# pickup/dropoff timestamp layout of taxi rides files (MM/DD/YYYY hh:mm:ss AM/PM)
+TIMESTAMP_FORMAT = "%m/%d/%Y %I:%M:%S %p"
+
+# zones dimension directory in the output root (dimension layout of zone attributes)
+ZONES_DIMENSION_DIR = "_zones"
+# output layouts of zone attributes
+ZONES_LAYOUTS = ["full", "categorical", "dimension"]
+# number of concurrent fetches of remote storage reads
+IO_THREADS = 8
+# rollups directory in the output root, one file of rollups by pickup hour & pickup/drop off location per run
+ROLLUPS_DIR = "_rollups"
+ROLLUP_KEYS = ["hour_PU", "PULocationID", "DOLocationID"]
+# summed columns of the rollups
+ROLLUP_SUM_COLUMNS = ["passenger_count", "trip_distance"] + list(MONETARY_COLUMNS)
+# bin edges of the rollup histograms (mergeable quantile sketches), values below the first edge are counted in
+# the first bin and values from the last edge on in the last one
+ROLLUP_HISTOGRAM_EDGES = {"fare_amount": [0, 2.5, 5, 7.5, 10, 12.5, 15, 20, 25, 30, 40, 50, 75, 100],
+                          "trip_distance": [0, 0.5, 1, 1.5, 2, 3, 4, 5, 7.5, 10, 15, 20, 30, 50]}
+# quantiles of the histogram columns written in the rollups
+ROLLUP_QUANTILES = [0.5, 0.9]
 
 
 def info(msg):
@@ -56,24 +126,1953 @@ def get_filtering_rules(args):
     return rules
 
 
-def filtering_rules_to_expression(filtering_rules, rule_to_expression_fun):
+def filtering_rule_to_bounds(filtering_rule):
+    """
+    Compile single filtering rule to half-open [start, end) datetime bounds.
+    :param filtering_rule: filtering rule
+    :return: (column, start datetime, end datetime)
+    """
+    column = filtering_rule["column"]
+    filter_type = filtering_rule["type"]
+    filter_params = filtering_rule["value"]
+    if filter_type == "range":
+        start = datetime.datetime(*filter_params[0])
+        end = datetime.datetime(*filter_params[1]) + datetime.timedelta(days=1)
+    elif filter_type == "date":
+        start = datetime.datetime(*filter_params)
+        end = start + datetime.timedelta(days=1)
+    elif filter_type == "year-month":
+        start = datetime.datetime(filter_params[0], filter_params[1], 1)
+        end = datetime.datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+    elif filter_type == "year":
+        start = datetime.datetime(filter_params, 1, 1)
+        end = datetime.datetime(filter_params + 1, 1, 1)
+    else:
+        raise NotImplementedError("Unsupported filter type : {}".format(filter_type))
+    return column, start, end
+
+
+def filtering_rules_to_bounds(filtering_rules):
+    """
+    Compile filtering rules to datetime bounds shared by all engines (Pandas,Dask,PySpark).
+    :param filtering_rules: filtering rules
+    :return: list of (column, start datetime, end datetime), rows match when start <= column < end
+    """
+    return [filtering_rule_to_bounds(filtering_rule) for filtering_rule in filtering_rules]
+
+
+def filtering_bounds_to_string(filtering_bounds):
+    """
+    Return human readable representation of filtering bounds.
+    :param filtering_bounds: filtering bounds
+    :return: filtering bounds string
+    """
+    return " and ".join("{} in [{}, {})".format(column, start, end) for column, start, end in filtering_bounds)
+
+
+def filtering_mask(df, filtering_bounds):
+    """
+    Return vectorized boolean mask of rows within all filtering bounds.
+    :param df: pandas or dask dataframe, or pyarrow table
+    :param filtering_bounds: filtering bounds
+    :return: boolean mask (numpy array for pyarrow tables)
+    """
+    import numpy as np
+    import pyarrow as pa
+    mask = None
+    for column, start, end in filtering_bounds:
+        values = df.column(column).to_numpy() if isinstance(df, pa.Table) else df[column]
+        column_mask = (values >= np.datetime64(start)) & (values < np.datetime64(end))
+        mask = column_mask if mask is None else mask & column_mask
+    return mask
+
+
+def to_decimal_array(values, precision, scale):
+    """
+    Vectorized conversion of numeric values to a pyarrow decimal128 array. Values are rounded to scale digits and
+    stored as unscaled 128-bit integers, values not fitting in precision digits become nulls (as in spark casts).
+    :param values: numeric array-like
+    :param precision: decimal precision
+    :param scale: decimal scale
+    :return: pyarrow decimal128 array
+    """
+    import numpy as np
+    import pyarrow as pa
+    unscaled = np.rint(np.asarray(values, dtype="float64") * 10 ** scale)
+    valid = np.isfinite(unscaled) & (np.abs(unscaled) < 10 ** precision)
+    unscaled = np.where(valid, unscaled, 0).astype("int64")
+    # 128-bit little endian two's complement, low word holds the value and high word its sign
+    words = np.empty((len(unscaled), 2), dtype="int64")
+    words[:, 0] = unscaled
+    words[:, 1] = unscaled >> 63
+    null_count = len(valid) - int(np.count_nonzero(valid))
+    validity = pa.array(valid).buffers()[1] if null_count > 0 else None
+    return pa.Array.from_buffers(pa.decimal128(precision, scale), len(unscaled),
+                                 [validity, pa.py_buffer(words)], null_count=null_count)
+
+
+def to_arrow_table(df):
+    """
+    Convert pandas dataframe to pyarrow table, monetary columns are converted to decimals.
+    :param df: pandas dataframe
+    :return: pyarrow table
+    """
+    import pyarrow as pa
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for column, (precision, scale) in MONETARY_COLUMNS.items():
+        if column in table.column_names:
+            table = table.set_column(table.column_names.index(column), column,
+                                     to_decimal_array(df[column].to_numpy(), precision, scale))
+    return table
+
+
+def write_parquet(df, path, partition_cols, storage_options=None, max_rows_per_file=None):
+    """
+    Write pandas dataframe or pyarrow table as partitioned parquet dataset.
+    :param df: pandas dataframe or pyarrow table
+    :param path: output path
+    :param partition_cols: partition columns
+    :param storage_options: storage options dict
+    :param max_rows_per_file: maximum number of rows per file, unlimited by default
+    """
+    # one file per partition, dictionaries of dictionary-encoded columns restricted to the values of the partition
+    writer = PartitionedParquetWriter(path, partition_cols, storage_options, threads=1,
+                                      max_rows_per_file=max_rows_per_file)
+    writer.write(df)
+    writer.close()
+
+
+class PartitionedParquetWriter:
+    """
+    Partitioned parquet writer buffering rows per partition across writes. Buffered rows of a partition are
+    flushed as a row group when reaching the row group size (or the largest buffers when the total buffer size
+    is exceeded) into a single open parquet file per partition, rolled over to a new file at max_rows_per_file
+    rows, at most max_open_files open files are kept (least recently used are closed first). Encoding and
+    compression of row groups run on a thread pool, writes block while buffered rows and row groups not yet
+    written exceed the total buffer size. Row groups are written in the output schema of all modes.
+    """
+
+    def __init__(self, path, partition_cols, storage_options=None, row_group_size=1000000,
+                 max_buffer_bytes=1 << 30, max_open_files=64, threads=None, file_prefix=None,
+                 max_rows_per_file=None):
+        """
+        Create partitioned parquet writer.
+        :param path: output path
+        :param partition_cols: partition columns
+        :param storage_options: storage options dict
+        :param row_group_size: number of buffered rows of a partition triggering a row group flush
+        :param max_buffer_bytes: total size of buffered rows triggering flushes of the largest buffers, and of
+            buffered & submitted rows blocking writes
+        :param max_open_files: maximum number of open partition files
+        :param threads: number of encoding/writing threads, defaults to number of cpus
+        :param file_prefix: prefix of partition file names, defaults to a random one
+        :param max_rows_per_file: maximum number of rows per file, unlimited by default
+        """
+        self.fs, self.root = storage_filesystem(path, storage_options)
+        self.partition_cols = partition_cols
+        self.row_group_size = row_group_size
+        self.max_buffer_bytes = max_buffer_bytes
+        self.max_open_files = max_open_files
+        self.file_prefix = file_prefix or uuid.uuid4().hex
+        self.max_rows_per_file = max_rows_per_file
+        self.executor = ThreadPoolExecutor(max_workers=threads or os.cpu_count())
+        # partition key -> buffered tables & rows
+        self.buffers = {}
+        self.buffered_rows = {}
+        self.buffered_bytes = 0
+        # size of submitted row groups not yet written, released by the writing tasks
+        self.inflight_bytes = 0
+        self.inflight_changed = threading.Condition()
+        # partitions with an open file, least recently used first
+        self.open_partitions = OrderedDict()
+        # partition key -> (parquet writer, file) & rows written to the file, accessed by the partition tasks only
+        self.files = {}
+        self.file_rows = {}
+        # partition key -> number of files, last submitted task
+        self.file_counts = {}
+        self.pending = {}
+
+    def write(self, df):
+        """
+        Buffer rows of pandas dataframe or pyarrow table by partition, flushing full buffers.
+        :param df: pandas dataframe or pyarrow table
+        """
+        import pyarrow as pa
+        table = df if isinstance(df, pa.Table) else to_arrow_table(df)
+        for key, partition_table in self.split(table):
+            self.buffers.setdefault(key, []).append(partition_table)
+            self.buffered_rows[key] = self.buffered_rows.get(key, 0) + partition_table.num_rows
+            self.buffered_bytes += partition_table.nbytes
+            if self.buffered_rows[key] >= self.row_group_size:
+                self.flush(key)
+        while self.buffered_bytes > self.max_buffer_bytes:
+            self.flush(max(self.buffered_rows, key=self.buffered_rows.get))
+        # wait for the writing tasks when encoding or upload is slower than the producer
+        with self.inflight_changed:
+            while self.inflight_bytes > 0 and self.buffered_bytes + self.inflight_bytes > self.max_buffer_bytes:
+                self.inflight_changed.wait()
+
+    def split(self, table):
+        """
+        Split pyarrow table by partition columns.
+        :param table: pyarrow table
+        :return: list of (partition key, pyarrow table without partition columns)
+        """
+        import pandas as pd
+        import pyarrow as pa
+        keys_df = pd.DataFrame(dict((column, table.column(column).to_pandas()) for column in self.partition_cols))
+        groups = keys_df.groupby(self.partition_cols, sort=False, observed=True, dropna=False).indices
+        data_table = table.drop(self.partition_cols)
+        return [(key if isinstance(key, tuple) else (key,), data_table.take(pa.array(indices)))
+                for key, indices in groups.items()]
+
+    def flush(self, key):
+        """
+        Submit buffered rows of a partition as a row group, closing least recently used files if needed.
+        :param key: partition key
+        """
+        tables = self.buffers.pop(key)
+        self.buffered_rows.pop(key)
+        nbytes = sum(table.nbytes for table in tables)
+        self.buffered_bytes -= nbytes
+        with self.inflight_changed:
+            self.inflight_bytes += nbytes
+        if key in self.open_partitions:
+            self.open_partitions.move_to_end(key)
+        else:
+            if len(self.open_partitions) >= self.max_open_files:
+                lru_key, _ = self.open_partitions.popitem(last=False)
+                self.submit(lru_key, self.close_file, lru_key)
+            self.open_partitions[key] = True
+        self.submit(key, self.write_row_group, key, tables).add_done_callback(lambda _: self.release(nbytes))
+
+    def release(self, nbytes):
+        """
+        Release the size of a written (or failed) row group.
+        :param nbytes: row group size in bytes
+        """
+        with self.inflight_changed:
+            self.inflight_bytes -= nbytes
+            self.inflight_changed.notify_all()
+
+    def submit(self, key, fun, *args):
+        """
+        Submit partition task, tasks of the same partition run in submission order.
+        :param key: partition key
+        :param fun: task function
+        :param args: task arguments
+        :return: future of the task
+        """
+        previous = self.pending.get(key)
+
+        def task():
+            if previous is not None:
+                previous.result()
+            fun(*args)
+
+        self.pending[key] = self.executor.submit(task)
+        return self.pending[key]
+
+    def write_row_group(self, key, tables):
+        """
+        Write tables as a row group in the open file of a partition, opening a new one if needed. Rows beyond the
+        maximum number of rows per file are written to new files.
+        :param key: partition key
+        :param tables: pyarrow tables
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        schema = self.files[key][0].schema if key in self.files else output_schema(tables[0].schema)
+        table = pa.concat_tables([table if table.schema.equals(schema) else table.cast(schema) for table in tables])
+        offset = 0
+        while offset < table.num_rows:
+            if key not in self.files:
+                values = ["__HIVE_DEFAULT_PARTITION__" if is_null(value) else value for value in key]
+                directory = posixpath.join(self.root, *["{}={}".format(column, value)
+                                                        for column, value in zip(self.partition_cols, values)])
+                self.fs.makedirs(directory, exist_ok=True)
+                count = self.file_counts.get(key, 0)
+                self.file_counts[key] = count + 1
+                f = self.fs.open(posixpath.join(directory, "part-{}-{:05d}.parquet".format(self.file_prefix,
+                                                                                          count)), "wb")
+                self.files[key] = (pq.ParquetWriter(f, schema), f)
+                self.file_rows[key] = 0
+            writer, _ = self.files[key]
+            rows = table.num_rows - offset
+            if self.max_rows_per_file:
+                rows = min(rows, self.max_rows_per_file - self.file_rows[key])
+            row_group = table.slice(offset, rows)
+            writer.write_table(row_group, row_group_size=row_group.num_rows)
+            self.file_rows[key] += rows
+            offset += rows
+            if self.max_rows_per_file and self.file_rows[key] >= self.max_rows_per_file:
+                self.close_file(key)
+
+    def close_file(self, key):
+        """
+        Close the open file of a partition, if not already closed at the maximum number of rows.
+        :param key: partition key
+        """
+        if key not in self.files:
+            return
+        writer, f = self.files.pop(key)
+        self.file_rows.pop(key)
+        writer.close()
+        f.close()
+
+    def close(self):
+        """
+        Flush all buffers, close all files and wait for pending tasks.
+        :return: number of files written
+        """
+        for key in list(self.buffers):
+            self.flush(key)
+        for key in list(self.open_partitions):
+            self.submit(key, self.close_file, key)
+        self.open_partitions.clear()
+        try:
+            for future in self.pending.values():
+                future.result()
+        finally:
+            self.executor.shutdown()
+        return sum(self.file_counts.values())
+
+
+def output_schema(schema):
+    """
+    Return output schema of taxi rides pyarrow schema, a single schema whatever the csv reader or mode : integer
+    columns as int32 (as in the input schemas), timestamps in microseconds, text columns (zone attributes, app id)
+    as plain strings, dictionary-encoded in parquet pages. Pandas metadata is left out.
+    :param schema: pyarrow schema
+    :return: pyarrow schema
+    """
+    import pyarrow as pa
+    fields = []
+    for field in schema:
+        field_type = field.type.value_type if pa.types.is_dictionary(field.type) else field.type
+        if pa.types.is_integer(field_type):
+            field_type = pa.int32()
+        elif pa.types.is_timestamp(field_type):
+            field_type = pa.timestamp("us")
+        elif pa.types.is_large_string(field_type):
+            field_type = pa.string()
+        fields.append(pa.field(field.name, field_type))
+    return pa.schema(fields)
+
+
+def is_null(value):
+    """
+    Return whether a partition value is null.
+    :param value: partition value
+    :return: true for None or NaN
+    """
+    return value is None or value != value
+
+
+def timestamp_fields(values):
+    """
+    Decode "MM/DD/YYYY hh:mm:ss AM/PM" timestamps at fixed character offsets into numeric fields.
+    :param values: array-like of strings
+    :return: (year, month, day, hour, minute, second, valid) numpy arrays, None for non ascii values
+    """
+    import numpy as np
+    try:
+        # one extra byte so that longer values are detected instead of truncated
+        chars = np.asarray(values, dtype="S23").view(np.uint8).reshape(-1, 23)
+    except UnicodeEncodeError:
+        return None
+    valid = chars[:, 22] == 0
+    for offset, separator in ((2, "/"), (5, "/"), (10, " "), (13, ":"), (16, ":"), (19, " "), (21, "M")):
+        valid &= chars[:, offset] == ord(separator)
+    valid &= (chars[:, 20] == ord("A")) | (chars[:, 20] == ord("P"))
+
+    def number(offset, width):
+        nonlocal valid
+        result = np.zeros(len(chars), dtype="int64")
+        for i in range(offset, offset + width):
+            digit = chars[:, i].astype("int64") - ord("0")
+            valid &= (digit >= 0) & (digit <= 9)
+            result = result * 10 + digit
+        return result
+
+    month, day, year = number(0, 2), number(3, 2), number(6, 4)
+    hour, minute, second = number(11, 2), number(14, 2), number(17, 2)
+    valid &= (month >= 1) & (month <= 12) & (day >= 1) & (day <= 31)
+    valid &= (hour >= 1) & (hour <= 12) & (minute <= 59) & (second <= 59)
+    hour = hour % 12 + np.where(chars[:, 20] == ord("P"), 12, 0)
+    return year, month, day, hour, minute, second, valid
+
+
+def parse_timestamps(values):
+    """
+    Vectorized parser of "MM/DD/YYYY hh:mm:ss AM/PM" timestamps, decoding digits at fixed character offsets.
+    Values not matching the layout (nulls, different widths) fall back to pandas.to_datetime.
+    :param values: array-like of strings
+    :return: datetime64[ns] numpy array
+    """
+    import numpy as np
+    import pandas as pd
+    fields = timestamp_fields(values)
+    if fields is None:
+        return pd.to_datetime(pd.Series(values), format=TIMESTAMP_FORMAT).to_numpy()
+    year, month, day, hour, minute, second, valid = fields
+    months = np.where(valid, (year - 1970) * 12 + month - 1, 0).astype("datetime64[M]")
+    days = months.astype("datetime64[D]") + np.where(valid, day - 1, 0).astype("timedelta64[D]")
+    # reject days overflowing their month (e.g. 02/30)
+    valid &= days.astype("datetime64[M]") == months
+    seconds = hour * 3600 + minute * 60 + second
+    result = days.astype("datetime64[ns]") + seconds.astype("timedelta64[s]")
+    if not valid.all():
+        invalid = ~valid
+        result[invalid] = pd.to_datetime(pd.Series(np.asarray(values, dtype=object)[invalid]),
+                                         format=TIMESTAMP_FORMAT).to_numpy()
+    return result
+
+
+def parse_date_keys(values):
+    """
+    Vectorized date-only decoding of "MM/DD/YYYY hh:mm:ss AM/PM" timestamps into YYYYMMDD integer keys.
+    :param values: array-like of strings
+    :return: int64 numpy array of date keys, -1 for values not matching the layout
+    """
+    import numpy as np
+    fields = timestamp_fields(values)
+    if fields is None:
+        return np.full(len(values), -1, dtype="int64")
+    year, month, day, _, _, _, valid = fields
+    return np.where(valid, year * 10000 + month * 100 + day, -1)
+
+
+def date_key(dt):
+    """
+    Return YYYYMMDD integer key of a date.
+    :param dt: date or datetime
+    :return: date key
+    """
+    return dt.year * 10000 + dt.month * 100 + dt.day
+
+
+def date_partition_keys(values):
+    """
+    Return YYYYMMDD date partition keys of datetime64 values, computed arithmetically by flooring to days since
+    epoch. Keys are categorical, each distinct day is rendered to a string only once.
+    :param values: datetime64 array-like
+    :return: pandas categorical of date keys
+    """
+    import numpy as np
+    import pandas as pd
+    days = np.asarray(values, dtype="datetime64[ns]").astype("datetime64[D]")
+    valid = ~np.isnat(days)
+    codes = np.full(len(days), -1, dtype="int32")
+    if not valid.any():
+        return pd.Categorical.from_codes(codes, categories=[])
+    # days since epoch are dense over the input span, mapped to codes of the distinct days
+    day_numbers = days[valid].view("int64")
+    first_day = day_numbers.min()
+    present = np.zeros(day_numbers.max() - first_day + 1, dtype=bool)
+    present[day_numbers - first_day] = True
+    codes[valid] = (np.cumsum(present) - 1)[day_numbers - first_day]
+    distinct_days = (np.flatnonzero(present) + first_day).astype("datetime64[D]")
+    categories = [day.replace("-", "") for day in np.datetime_as_string(distinct_days)]
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+def prefilter_taxi_rides(df, filtering_bounds):
+    """
+    Drop rows of raw taxi-rides pandas dataframe not within the filtering bounds, comparing date keys decoded
+    from the raw pickup/dropoff text. Values not matching the timestamp layout are kept.
+    :param df: raw taxi-rides pandas dataframe
+    :param filtering_bounds: filtering bounds
+    :return: raw taxi-rides pandas dataframe
+    """
+    import numpy as np
+    raw_columns = {"datetime_PU": "tpep_pickup_datetime", "datetime_DO": "tpep_dropoff_datetime"}
+    mask = np.ones(len(df), dtype=bool)
+    for column, start, end in filtering_bounds:
+        date_keys = parse_date_keys(df[raw_columns[column]])
+        # end bound is exclusive
+        last_key = date_key(end - datetime.timedelta(microseconds=1))
+        mask &= (date_keys < 0) | ((date_keys >= date_key(start)) & (date_keys <= last_key))
+    return df if mask.all() else df.loc[mask]
+
+
+def prepare_taxi_rides(df):
+    """
+    Parse pickup/dropoff timestamp columns of raw taxi-rides pandas dataframe into datetime_PU/datetime_DO.
+    :param df: raw taxi-rides pandas dataframe
+    :return: taxi-rides pandas dataframe
+    """
+    raw_columns = ["tpep_pickup_datetime", "tpep_dropoff_datetime"]
+    prepared_df = df.drop(raw_columns, axis="columns")
+    prepared_df.insert(0, "datetime_DO", parse_timestamps(df["tpep_dropoff_datetime"]))
+    prepared_df.insert(0, "datetime_PU", parse_timestamps(df["tpep_pickup_datetime"]))
+    return prepared_df
+
+
+def arrow_schema(schema, decimals=True):
+    """
+    Return pyarrow schema of a schema definition.
+    :param schema: schema definition as list of (name, type)
+    :param decimals: if false decimal columns are typed as float64
+    :return: pyarrow schema
+    """
+    import pyarrow as pa
+    types = {"int32": pa.int32(), "float64": pa.float64(), "string": pa.string(), "boolean": pa.bool_(),
+             "timestamp": pa.timestamp("ns")}
+    fields = []
+    for name, column_type in schema:
+        if column_type.startswith("decimal"):
+            precision, scale = (int(n) for n in re.findall(r"[0-9]+", column_type))
+            fields.append(pa.field(name, pa.decimal128(precision, scale) if decimals else pa.float64()))
+        else:
+            fields.append(pa.field(name, types[column_type]))
+    return pa.schema(fields)
+
+
+def read_csv_arrow(source, schema, decimals=True, column_names=None, skip_rows=0, block_size=None,
+                   streaming=False):
+    """
+    Read csv into pyarrow table with explicit schema, using pyarrow multithreaded block-based reader.
+    Types, timestamps, booleans (Y/N) and decimals are decoded by the reader.
+    :param source: path, file object or pyarrow buffer
+    :param schema: schema definition as list of (name, type)
+    :param decimals: if false decimal columns are read as float64
+    :param column_names: column names if source has no header row
+    :param skip_rows: number of rows to skip before reading
+    :param block_size: reader block size in bytes
+    :param streaming: if true return a record batch reader instead of a table
+    :return: pyarrow table or record batch reader
+    """
+    import pyarrow.csv as pv
+    read_options = pv.ReadOptions(use_threads=True, column_names=column_names, skip_rows=skip_rows)
+    if block_size is not None:
+        read_options.block_size = block_size
+    convert_options = pv.ConvertOptions(column_types=arrow_schema(schema, decimals),
+                                        timestamp_parsers=[TIMESTAMP_FORMAT],
+                                        true_values=["Y"], false_values=["N"],
+                                        strings_can_be_null=True)
+    if streaming:
+        return pv.open_csv(source, read_options=read_options, convert_options=convert_options)
+    return pv.read_csv(source, read_options=read_options, convert_options=convert_options)
+
+
+def prepare_taxi_rides_arrow(table):
+    """
+    Rename pickup/dropoff timestamp columns of raw taxi-rides pyarrow table into datetime_PU/datetime_DO.
+    :param table: raw taxi-rides pyarrow table
+    :return: taxi-rides pyarrow table
+    """
+    import pyarrow as pa
+    raw_columns = ["tpep_pickup_datetime", "tpep_dropoff_datetime"]
+    names = [name for name in table.column_names if name not in raw_columns]
+    return pa.Table.from_arrays([table.column(name) for name in raw_columns + names],
+                                names=["datetime_PU", "datetime_DO"] + names)
+
+
+def unique_taxi_zones(taxi_zones_df):
+    """
+    Return taxi zones dataframe with a single zone per LocationID, the zone of the lowest OBJECTID (rows order for
+    equal OBJECTIDs), as kept by all modes. The NYC zones export lists location ids 56 & 103 twice, a join with all
+    of them would emit the rides of those zones twice.
+    :param taxi_zones_df: taxi zones pandas dataframe, OBJECTID & LocationID columns included
+    :return: taxi zones pandas dataframe
+    """
+    import pandas as pd
+    if not taxi_zones_df["LocationID"].duplicated().any():
+        return taxi_zones_df
+    object_ids = pd.to_numeric(taxi_zones_df["OBJECTID"], errors="coerce").to_numpy()
+    zdf = taxi_zones_df.iloc[object_ids.argsort(kind="stable")]
+    duplicated = zdf["LocationID"].duplicated()
+    info("Duplicate taxi zones dropped, first zone kept (LocationID={}).".format(
+        sorted(set(zdf.loc[duplicated, "LocationID"].tolist()))))
+    return zdf[~duplicated].sort_index()
+
+
+def zones_lookup(taxi_zones_df):
+    """
+    Precompute dense lookup of taxi zones dataframe indexed by LocationID : zone position of each location id
+    (-1 for unknown ids) and zone attribute arrays, zone, borough and categorical columns as categoricals.
+    :param taxi_zones_df: taxi zones pandas dataframe
+    :return: (positions array, dict of attribute column to pandas array)
+    """
+    import numpy as np
+    import pandas as pd
+    if not taxi_zones_df.index.is_unique:
+        raise ValueError("Taxi zones LocationID are not unique, zones must be deduplicated by unique_taxi_zones")
+    location_ids = taxi_zones_df.index.to_numpy().astype("int64")
+    positions = np.full(location_ids.max() + 1, -1, dtype="int64")
+    positions[location_ids] = np.arange(len(location_ids))
+    columns = {}
+    for column in taxi_zones_df.columns:
+        if column in ["zone", "borough"] or isinstance(taxi_zones_df[column].dtype, pd.CategoricalDtype):
+            columns[column] = pd.Categorical(taxi_zones_df[column])
+        else:
+            columns[column] = taxi_zones_df[column].array
+    return positions, columns
+
+
+def zones_layout(taxi_zones_df, layout="full"):
+    """
+    Return taxi zones dataframe of an output layout of zone attributes : full (zone & borough as categoricals),
+    categorical (all text attributes, geometries included, as categoricals) or dimension (geometries written to the
+    zones dimension and left out of the rides, location ids kept instead).
+    :param taxi_zones_df: taxi zones pandas dataframe indexed by LocationID
+    :param layout: zone attributes layout
+    :return: taxi zones pandas dataframe
+    """
+    import pandas as pd
+    if layout == "categorical":
+        return taxi_zones_df.astype(dict((column, "category") for column in taxi_zones_df.columns
+                                         if pd.api.types.is_string_dtype(taxi_zones_df[column].dtype)))
+    if layout == "dimension":
+        return taxi_zones_df.drop("the_geom", axis="columns")
+    return taxi_zones_df
+
+
+def write_zones_dimension(taxi_zones_df, output_path, storage_options=None):
+    """
+    Write taxi zones dimension (all zone attributes by LocationID) as _zones/zones.parquet in the output root.
+    :param taxi_zones_df: taxi zones pandas dataframe indexed by LocationID
+    :param output_path: output path
+    :param storage_options: storage options dict
+    :return: zones dimension path
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    fs, root = storage_filesystem(output_path, storage_options)
+    directory = posixpath.join(root, ZONES_DIMENSION_DIR)
+    fs.makedirs(directory, exist_ok=True)
+    path = posixpath.join(directory, "zones.parquet")
+    table = pa.Table.from_pandas(taxi_zones_df.reset_index(), preserve_index=False)
+    with fs.open(path, "wb") as f:
+        pq.write_table(table, f)
+    return path
+
+
+def zone_positions(location_ids, lookup):
     """
-    Returns single SQL where like expression expression capturing all filtering rules (Pandas,Dask,PySpark)
-    :param filtering_rules: filtering function
-    :param rule_to_expression_fun:  rule to expression function
-    :return: SQL where like expression
+    Gather zone positions of location ids, -1 for unknown or null ids.
+    :param location_ids: array-like of location ids
+    :param lookup: zones lookup
+    :return: positions array
     """
-    total_rules = len(filtering_rules)
+    import numpy as np
+    positions, _ = lookup
+    location_ids = np.asarray(location_ids, dtype="float64")
+    known = np.isfinite(location_ids) & (location_ids >= 0) & (location_ids < len(positions))
+    result = np.full(len(location_ids), -1, dtype="int64")
+    result[known] = positions[location_ids[known].astype("int64")]
+    return result
+
 
-    if total_rules == 0:
+def lookup_join(taxi_rides_df, lookup):
+    """
+    Inner join of taxi-rides pandas dataframe with taxi zones on pickup/drop off Location ID, gathering
+    zone attributes by position from the zones lookup.
+    :param taxi_rides_df: taxi-rides pandas dataframe
+    :param lookup: zones lookup
+    :return: joined taxi-rides pandas dataframe
+    """
+    _, columns = lookup
+    pu_positions = zone_positions(taxi_rides_df["PULocationID"], lookup)
+    do_positions = zone_positions(taxi_rides_df["DOLocationID"], lookup)
+    mask = (pu_positions >= 0) & (do_positions >= 0)
+    taxi_rides_df = taxi_rides_df.loc[mask]
+    if "the_geom" in columns:
+        # location ids are kept when zone geometries are not part of the zones lookup
+        taxi_rides_df = taxi_rides_df.drop(["PULocationID", "DOLocationID"], axis="columns")
+    for suffix, positions in [("_PU", pu_positions[mask]), ("_DO", do_positions[mask])]:
+        for column, values in columns.items():
+            taxi_rides_df[column + suffix] = values.take(positions)
+    return taxi_rides_df
+
+
+def lookup_join_arrow(taxi_rides_table, lookup):
+    """
+    Inner join of taxi-rides pyarrow table with taxi zones on pickup/drop off Location ID, gathering
+    zone attributes by position from the zones lookup.
+    :param taxi_rides_table: taxi-rides pyarrow table
+    :param lookup: zones lookup
+    :return: joined taxi-rides pyarrow table
+    """
+    import numpy as np
+    import pandas as pd
+    import pyarrow as pa
+    _, columns = lookup
+    pu_positions = zone_positions(taxi_rides_table.column("PULocationID").to_numpy(zero_copy_only=False), lookup)
+    do_positions = zone_positions(taxi_rides_table.column("DOLocationID").to_numpy(zero_copy_only=False), lookup)
+    mask = (pu_positions >= 0) & (do_positions >= 0)
+    taxi_rides_table = taxi_rides_table.filter(pa.array(mask))
+    if "the_geom" in columns:
+        # location ids are kept when zone geometries are not part of the zones lookup
+        taxi_rides_table = taxi_rides_table.drop(["PULocationID", "DOLocationID"])
+    for suffix, positions in [("_PU", pu_positions[mask]), ("_DO", do_positions[mask])]:
+        for column, values in columns.items():
+            if isinstance(values, pd.Categorical):
+                # null attributes are coded -1, masked as null indices
+                codes = values.codes[positions]
+                values = pa.DictionaryArray.from_arrays(pa.array(codes, mask=codes < 0),
+                                                        pa.array(values.categories.to_numpy()))
+            else:
+                values = pa.array(np.asarray(values)).take(pa.array(positions))
+            taxi_rides_table = taxi_rides_table.append_column(column + suffix, values)
+    return taxi_rides_table
+
+
+def rollup_partial(taxi_rides_df, location_ids):
+    """
+    Return partial rollups of taxi rides by pickup hour and pickup/drop off location id : number of trips, sums of
+    the summed columns and histogram bin counts, merged by merge_rollups. Rides of location ids unknown to the
+    zones (left out by the zones join) are left out.
+    :param taxi_rides_df: taxi rides pandas dataframe or pyarrow table, location ids not yet dropped by the join
+    :param location_ids: location ids of the taxi zones
+    :return: pandas dataframe of keys, trips, sums and <column>_bin_<i> counts
+    """
+    import numpy as np
+    import pandas as pd
+    import pyarrow as pa
+    columns = ["datetime_PU", "PULocationID", "DOLocationID"] + ROLLUP_SUM_COLUMNS
+    if isinstance(taxi_rides_df, pa.Table):
+        df = pd.DataFrame(dict((column, from_decimal_array(taxi_rides_df.column(column))
+                                if pa.types.is_decimal(taxi_rides_df.schema.field(column).type)
+                                else taxi_rides_df.column(column).to_pandas()) for column in columns))
+    else:
+        df = taxi_rides_df[columns]
+    df = df[df["PULocationID"].isin(location_ids) & df["DOLocationID"].isin(location_ids) &
+            df["datetime_PU"].notna()]
+    keys = pd.DataFrame({"hour_PU": df["datetime_PU"].to_numpy().astype("datetime64[h]").astype("datetime64[ns]"),
+                         "PULocationID": df["PULocationID"].to_numpy().astype("int32"),
+                         "DOLocationID": df["DOLocationID"].to_numpy().astype("int32")})
+    values = pd.DataFrame(dict((column, df[column].to_numpy().astype("float64")) for column in ROLLUP_SUM_COLUMNS))
+    values.insert(0, "trips", 1)
+    groups = pd.concat([keys, values], axis="columns").groupby(ROLLUP_KEYS, sort=False)
+    rollup = groups.sum().reset_index()
+    # bin counts of each group, group numbers follow the order of the summed groups
+    codes = groups.ngroup().to_numpy()
+    for column, edges in ROLLUP_HISTOGRAM_EDGES.items():
+        column_values = values[column].to_numpy()
+        valid = ~np.isnan(column_values)
+        bins = np.searchsorted(edges, column_values[valid], side="right")
+        counts = np.bincount(codes[valid] * (len(edges) + 1) + bins, minlength=len(rollup) * (len(edges) + 1))
+        counts = counts.reshape(len(rollup), len(edges) + 1)
+        for i in range(len(edges) + 1):
+            rollup["{}_bin_{}".format(column, i)] = counts[:, i]
+    return rollup
+
+
+def merge_rollups(rollups):
+    """
+    Merge partial rollups of taxi rides.
+    :param rollups: list of partial rollups pandas dataframes, None entries are skipped
+    :return: merged rollups pandas dataframe, None without partial rollups
+    """
+    import pandas as pd
+    rollups = [rollup for rollup in rollups if rollup is not None]
+    if not rollups:
         return None
-    elif total_rules == 1:
-        return rule_to_expression_fun(filtering_rules[0])
+    if len(rollups) == 1:
+        return rollups[0]
+    return pd.concat(rollups, ignore_index=True).groupby(ROLLUP_KEYS, sort=False).sum().reset_index()
+
+
+def histogram_quantiles(counts, edges, q):
+    """
+    Approximate quantile of histograms, linearly interpolated within the bin holding the quantile (open first and
+    last bins are bounded by the first and last edges).
+    :param counts: numpy array of bin counts, one histogram per row
+    :param edges: bin edges
+    :param q: quantile
+    :return: float64 numpy array of quantiles, NaN for empty histograms
+    """
+    import numpy as np
+    lower = np.array([edges[0]] + list(edges), dtype="float64")
+    upper = np.array(list(edges) + [edges[-1]], dtype="float64")
+    cumulative = np.cumsum(counts, axis=1)
+    total = cumulative[:, -1]
+    rank = q * total
+    bins = np.minimum((cumulative < rank[:, None]).sum(axis=1), counts.shape[1] - 1)
+    rows = np.arange(len(counts))
+    below = cumulative[rows, bins] - counts[rows, bins]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fraction = np.where(counts[rows, bins] > 0, (rank - below) / counts[rows, bins], 0)
+    return np.where(total > 0, lower[bins] + fraction * (upper[bins] - lower[bins]), np.nan)
+
+
+def finish_rollups(rollup):
+    """
+    Return rollups pyarrow table of merged partial rollups : keys, trips, <column>_sum of the summed columns
+    (monetary sums as decimal(18,2)), <column>_histogram bin counts and <column>_p<quantile> approximate quantiles
+    of the histogram columns. Histogram edges are stored in the schema metadata.
+    :param rollup: merged partial rollups pandas dataframe
+    :return: pyarrow table
+    """
+    import pyarrow as pa
+    arrays = {"hour_PU": pa.array(rollup["hour_PU"].to_numpy().astype("datetime64[us]")),
+              "PULocationID": pa.array(rollup["PULocationID"].to_numpy().astype("int32")),
+              "DOLocationID": pa.array(rollup["DOLocationID"].to_numpy().astype("int32")),
+              "trips": pa.array(rollup["trips"].to_numpy().astype("int64"))}
+    for column in ROLLUP_SUM_COLUMNS:
+        if column in MONETARY_COLUMNS:
+            arrays[column + "_sum"] = to_decimal_array(rollup[column], 18, 2)
+        else:
+            arrays[column + "_sum"] = pa.array(rollup[column].to_numpy().astype("float64"))
+    for column, edges in ROLLUP_HISTOGRAM_EDGES.items():
+        counts = rollup[["{}_bin_{}".format(column, i) for i in range(len(edges) + 1)]].to_numpy().astype("int64")
+        arrays[column + "_histogram"] = pa.FixedSizeListArray.from_arrays(pa.array(counts.ravel()),
+                                                                          len(edges) + 1)
+        for q in ROLLUP_QUANTILES:
+            arrays["{}_p{}".format(column, int(q * 100))] = pa.array(histogram_quantiles(counts, edges, q))
+    table = pa.table(arrays)
+    return table.replace_schema_metadata(dict(("{}_histogram_edges".format(column), json.dumps(edges))
+                                              for column, edges in ROLLUP_HISTOGRAM_EDGES.items()))
+
+
+def write_rollups(table, output_path, app_id, storage_options=None):
+    """
+    Write rollups pyarrow table as _rollups/rollups-<app id>.parquet in the output root, rollups of successive
+    (incremental) runs are summed by the readers.
+    :param table: rollups pyarrow table
+    :param output_path: output path
+    :param app_id: application id
+    :param storage_options: storage options dict
+    :return: rollups path
+    """
+    import pyarrow.parquet as pq
+    fs, root = storage_filesystem(output_path, storage_options)
+    directory = posixpath.join(root, ROLLUPS_DIR)
+    fs.makedirs(directory, exist_ok=True)
+    path = posixpath.join(directory, "rollups-{}.parquet".format(app_id))
+    with fs.open(path, "wb") as f:
+        pq.write_table(table, f)
+    return path
+
+
+def newline_aligned_ranges(path, range_bytes, storage_options=None, min_ranges=1, start=None, end=None):
+    """
+    Split csv file (or its [start, end) byte range) into newline-aligned byte ranges following the header row.
+    :param path: input path
+    :param range_bytes: maximum range size in bytes
+    :param storage_options: storage options dict
+    :param min_ranges: minimum number of ranges (for large enough files)
+    :param start: first byte offset, defaults to the end of the header row
+    :param end: last byte offset (exclusive), defaults to the file size
+    :return: (header bytes, list of (start, end) byte offsets)
+    """
+    fs, fs_path = storage_filesystem(path, storage_options)
+    size = fs.size(fs_path) if end is None else end
+    with fs.open(fs_path, "rb") as f:
+        header = f.readline()
+        start = len(header) if start is None else start
+        range_bytes = max(1, min(range_bytes, -(-(size - start) // min_ranges)))
+        offsets = [start]
+        position = start + range_bytes
+        while position < size:
+            # move to the start of the next line
+            f.seek(position)
+            f.readline()
+            position = f.tell()
+            if position >= size:
+                break
+            offsets.append(position)
+            position += range_bytes
+    offsets.append(size)
+    return header, [(start, end) for start, end in zip(offsets[:-1], offsets[1:]) if end > start]
+
+
+def read_range(path, start, end, storage_options=None):
+    """
+    Read byte range of a file.
+    :param path: input path
+    :param start: range start offset
+    :param end: range end offset
+    :param storage_options: storage options dict
+    :return: range bytes
+    """
+    fs, fs_path = storage_filesystem(path, storage_options)
+    with fs.open(fs_path, "rb") as f:
+        f.seek(start)
+        return f.read(end - start)
+
+
+# pooled filesystem instances by protocol & storage options
+filesystem_pool = {}
+filesystem_pool_lock = threading.Lock()
+
+
+def reset_filesystem_pool():
+    """
+    Drop the pooled filesystems inherited by a forked child process, their event loops & connections are not
+    fork-safe (new instances are created by the child on first use).
+    """
+    global filesystem_pool_lock
+    filesystem_pool_lock = threading.Lock()
+    filesystem_pool.clear()
+
+
+os.register_at_fork(after_in_child=reset_filesystem_pool)
+
+
+def storage_filesystem(path, storage_options=None):
+    """
+    Return filesystem and filesystem path of a path. Filesystem instances are pooled by protocol and storage
+    options, one instance (with its connection pool and event loop for async filesystems) is shared by all reads
+    and writes of a process.
+    :param path: path
+    :param storage_options: storage options dict
+    :return: (filesystem, filesystem path)
+    """
+    import fsspec
+    protocol = path.split("://")[0] if "://" in path else "file"
+    cls = fsspec.get_filesystem_class(protocol)
+    # options carried by the url (e.g. account name) completed by storage options
+    options = dict(cls._get_kwargs_from_urls(path), **(storage_options or {}))
+    key = (protocol, json.dumps(options, sort_keys=True, default=str))
+    with filesystem_pool_lock:
+        fs = filesystem_pool.get(key)
+        if fs is None:
+            fs = filesystem_pool[key] = cls(**options)
+    return fs, fs._strip_protocol(path)
+
+
+def use_storage_standin(directory):
+    """
+    Serve Azure storage paths (abfs://container/path) from a local stand-in directory (<directory>/container/path),
+    in this process and in worker processes started afterwards.
+    :param directory: stand-in root directory
+    """
+    import fsspec
+    from storage_standin import STANDIN_PROTOCOLS, STANDIN_ROOT_ENV
+    os.environ[STANDIN_ROOT_ENV] = os.path.abspath(directory)
+    for protocol in STANDIN_PROTOCOLS:
+        fsspec.register_implementation(protocol, "storage_standin.StandinFileSystem", clobber=True)
+    with filesystem_pool_lock:
+        filesystem_pool.clear()
+
+
+def standin_in_use(directory):
+    """
+    Return whether Azure storage paths are served from a local stand-in directory in this process.
+    :param directory: stand-in root directory
+    :return: true if the directory is the stand-in root in use
+    """
+    from storage_standin import STANDIN_ROOT_ENV
+    return os.environ.get(STANDIN_ROOT_ENV) == os.path.abspath(directory)
+
+
+def fetch_ranges(ranges, storage_options=None, threads=IO_THREADS, read_ahead=None):
+    """
+    Return iterator of the bytes of file ranges in order, fetched concurrently by a thread pool with at most
+    read_ahead ranges fetched ahead of the consumer.
+    :param ranges: iterable of (path, start, end), end None for the whole file
+    :param storage_options: storage options dict
+    :param threads: number of fetching threads
+    :param read_ahead: number of ranges fetched ahead, defaults to the number of threads
+    :return: iterator of range bytes
+    """
+    read_ahead = read_ahead or threads
+
+    def fetch(path, start, end):
+        fs, fs_path = storage_filesystem(path, storage_options)
+        with fs.open(fs_path, "rb") as f:
+            f.seek(start)
+            return f.read() if end is None else f.read(end - start)
+
+    ranges = iter(ranges)
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = []
+        for path, start, end in ranges:
+            futures.append(executor.submit(fetch, path, start, end))
+            if len(futures) >= read_ahead:
+                break
+        while futures:
+            data = futures.pop(0).result()
+            for path, start, end in ranges:
+                futures.append(executor.submit(fetch, path, start, end))
+                break
+            yield data
+
+
+class ReadAheadFile(io.RawIOBase):
+    """
+    Read-only sequential file of a remote path, blocks following the read position are fetched concurrently ahead.
+    """
+
+    def __init__(self, path, storage_options=None, block_size=8 * 1024 * 1024, threads=IO_THREADS):
+        """
+        Open read-ahead file.
+        :param path: input path
+        :param storage_options: storage options dict
+        :param block_size: fetched block size
+        :param threads: number of fetching threads (and of blocks fetched ahead)
+        """
+        super().__init__()
+        fs, fs_path = storage_filesystem(path, storage_options)
+        size = fs.size(fs_path)
+        self.blocks = fetch_ranges(((path, start, min(start + block_size, size))
+                                    for start in range(0, size, block_size)), storage_options, threads)
+        self.block = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        """
+        Read bytes into a buffer.
+        :param b: buffer
+        :return: number of bytes read, 0 at the end of file
+        """
+        if not self.block:
+            self.block = memoryview(next(self.blocks, b""))
+        n = min(len(b), len(self.block))
+        b[:n] = self.block[:n]
+        self.block = self.block[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            self.blocks.close()
+        super().close()
+
+
+def open_input(path, storage_options=None, threads=IO_THREADS):
+    """
+    Open input file for sequential reads, remote files are read ahead by concurrent block fetches.
+    :param path: input path
+    :param storage_options: storage options dict
+    :param threads: number of fetching threads of remote files
+    :return: binary file object
+    """
+    if is_local_path(path):
+        fs, fs_path = storage_filesystem(path, storage_options)
+        return fs.open(fs_path, "rb")
+    return io.BufferedReader(ReadAheadFile(path, storage_options, threads=threads), buffer_size=1024 * 1024)
+
+
+def is_local_path(path):
+    """
+    Return whether path is a local file path.
+    :param path: input path
+    :return: true if path is local
+    """
+    return "://" not in path or path.startswith("file://")
+
+
+def input_paths(path, storage_options=None):
+    """
+    Expand input path (file, directory or glob pattern) to the sorted list of input file paths.
+    :param path: input path
+    :param storage_options: storage options dict
+    :return: list of file paths
+    """
+    fs, fs_path = storage_filesystem(path, storage_options)
+    if fs.isdir(fs_path):
+        paths = fs.find(fs_path)
+    elif any(c in fs_path for c in "*?["):
+        paths = fs.glob(fs_path)
     else:
-        expression = rule_to_expression_fun(filtering_rules.pop(0))
-        for rule in filtering_rules:
-            expression = expression + " and " + rule_to_expression_fun(rule)
-        return expression
+        paths = [fs_path]
+    protocol = path.split("://")[0] + "://" if "://" in path else ""
+    return sorted(protocol + p for p in paths)
+
+
+def content_hash(path, end, storage_options=None, block_size=8 * 1024 * 1024):
+    """
+    Return sha256 content hash of the first bytes of a file.
+    :param path: input path
+    :param end: number of bytes hashed
+    :param storage_options: storage options dict
+    :param block_size: read block size
+    :return: hex digest
+    """
+    digest = hashlib.sha256()
+    fs, fs_path = storage_filesystem(path, storage_options)
+    with fs.open(fs_path, "rb") as f:
+        remaining = end
+        while remaining > 0:
+            block = f.read(min(block_size, remaining))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest.hexdigest()
+
+
+def load_manifest(output_path, storage_options=None):
+    """
+    Load manifest of ingested input files stored in the output root.
+    :param output_path: output path
+    :param storage_options: storage options dict
+    :return: manifest dict
+    """
+    fs, root = storage_filesystem(output_path, storage_options)
+    manifest_path = posixpath.join(root, MANIFEST_FILE_NAME)
+    if not fs.exists(manifest_path):
+        return {"files": {}}
+    with fs.open(manifest_path, "rb") as f:
+        return json.loads(f.read().decode())
+
+
+def plan_incremental_ingestion(trips_path, output_path, storage_options=None):
+    """
+    Plan incremental ingestion of taxi trips input files against the manifest stored in the output root.
+    Unchanged files are skipped, appended files (same content up to the last committed offset) are ingested
+    from that offset and new or rewritten files are ingested whole. Bytes after the last newline are
+    considered incomplete and left for the next run, unless the file has not changed since that run (last record
+    with no trailing newline).
+    :param trips_path: taxi trips input path (file, directory or glob pattern)
+    :param output_path: output path
+    :param storage_options: storage options dict
+    :return: (manifest, list of slices as dict of path, header, start, end, size and mtime)
+    """
+    manifest = load_manifest(output_path, storage_options)
+    slices = []
+    for path in input_paths(trips_path, storage_options):
+        fs, fs_path = storage_filesystem(path, storage_options)
+        file_info = fs.info(fs_path)
+        size, mtime = file_info["size"], str(file_info.get("mtime", file_info.get("last_modified")))
+        entry = manifest["files"].get(path)
+        # file not changed since last seen, its end is the end of the last record
+        settled = entry is not None and entry["size"] == size and entry["mtime"] == mtime
+        if settled and entry["offset"] >= size:
+            continue
+        with fs.open(fs_path, "rb") as f:
+            header = f.readline()
+            # end of the last complete line
+            end = position = size
+            while not settled and position > len(header):
+                block_start = max(len(header), position - 65536)
+                f.seek(block_start)
+                newline = f.read(position - block_start).rfind(b"\n")
+                if newline >= 0:
+                    end = block_start + newline + 1
+                    break
+                position = block_start
+            else:
+                end = size if settled else len(header)
+        start = len(header)
+        if entry is not None:
+            if size >= entry["offset"] and content_hash(path, entry["offset"], storage_options) == entry["sha256"]:
+                start = max(start, entry["offset"])
+            else:
+                info("Input file rewritten since last ingestion, ingesting whole file (src={}).".format(path))
+        slices.append({"path": path, "header": header, "start": start, "end": max(start, end),
+                       "size": size, "mtime": mtime})
+    return manifest, slices
+
+
+def stage_slices(slices, staging_path, storage_options=None):
+    """
+    Return input paths of file slices (incremental ingestion), partial files are staged with their header row for
+    the readers of whole files (pyspark & duckdb modes).
+    :param slices: input slices as dict of path, header, start, end and size
+    :param staging_path: staging path of partial files
+    :param storage_options: storage options dict
+    :return: list of input paths
+    """
+    def stage_slice(i, input_slice):
+        if input_slice["start"] == len(input_slice["header"]) and input_slice["end"] == input_slice["size"]:
+            return input_slice["path"]
+        path = posixpath.join(staging_path, "part-{:05d}.csv".format(i))
+        src_fs, src_path = storage_filesystem(input_slice["path"], storage_options)
+        dst_fs, dst_path = storage_filesystem(path, storage_options)
+        dst_fs.makedirs(posixpath.dirname(dst_path), exist_ok=True)
+        with src_fs.open(src_path, "rb") as src, dst_fs.open(dst_path, "wb") as dst:
+            dst.write(input_slice["header"])
+            src.seek(input_slice["start"])
+            remaining = input_slice["end"] - input_slice["start"]
+            while remaining > 0:
+                block = src.read(min(8 * 1024 * 1024, remaining))
+                dst.write(block)
+                remaining -= len(block)
+        return path
+
+    # partial files copied concurrently
+    staged = [(i, input_slice) for i, input_slice in enumerate(slices) if input_slice["end"] > input_slice["start"]]
+    with ThreadPoolExecutor(max_workers=IO_THREADS) as executor:
+        return list(executor.map(lambda item: stage_slice(*item), staged))
+
+
+def commit_manifest(output_path, manifest, slices, app_id, storage_options=None):
+    """
+    Record ingested slices in the manifest stored in the output root.
+    :param output_path: output path
+    :param manifest: manifest dict
+    :param slices: ingested slices
+    :param app_id: application id
+    :param storage_options: storage options dict
+    """
+    for input_slice in slices:
+        path = input_slice["path"]
+        manifest["files"][path] = {"size": input_slice["size"],
+                                   "mtime": input_slice["mtime"],
+                                   "offset": input_slice["end"],
+                                   "sha256": content_hash(path, input_slice["end"], storage_options),
+                                   "app_id": app_id}
+    fs, root = storage_filesystem(output_path, storage_options)
+    fs.makedirs(root, exist_ok=True)
+    manifest_path = posixpath.join(root, MANIFEST_FILE_NAME)
+    with fs.open(manifest_path + ".tmp", "wb") as f:
+        f.write(json.dumps(manifest, indent=2, sort_keys=True).encode())
+    fs.mv(manifest_path + ".tmp", manifest_path)
+
+
+def chunk_rows(n):
+    """
+    Return the number of rows of the next chunk.
+    :param n: chunk size, or callable returning the size of the next chunk
+    :return: number of rows
+    """
+    return n() if callable(n) else n
+
+
+def frame_nbytes(df, deep=False):
+    """
+    Return in-memory size of pandas dataframe or pyarrow table. Object values are only included if deep, the raw
+    text columns of a chunk read are distinct strings of each row, zone attributes gathered by the join are shared
+    between rows.
+    :param df: pandas dataframe or pyarrow table
+    :param deep: include object values (strings) of pandas dataframe
+    :return: size in bytes
+    """
+    import pyarrow as pa
+    return df.nbytes if isinstance(df, pa.Table) else int(df.memory_usage(index=True, deep=deep).sum())
+
+
+def raw_chunk_size(df):
+    """
+    Return number of rows & in-memory size of the chunk read for a dataframe, before any pre-filter.
+    :param df: pandas dataframe or pyarrow table
+    :return: (rows, bytes) tuple
+    """
+    raw_chunk = getattr(df, "attrs", {}).get("raw_chunk")
+    return raw_chunk if raw_chunk is not None else (len(df), frame_nbytes(df))
+
+
+class AdaptiveChunkSize:
+    """
+    Number of rows of the next chunk adapted to a memory budget, from the peak bytes per row read measured on the
+    previous chunk. Chunk sizes grow at most twofold between chunks.
+    """
+
+    def __init__(self, memory_budget, initial_rows, min_rows=1000, max_rows=50000000):
+        """
+        Create adaptive chunk size.
+        :param memory_budget: memory budget of a chunk in bytes
+        :param initial_rows: number of rows of the first chunk
+        :param min_rows: minimum number of rows of a chunk
+        :param max_rows: maximum number of rows of a chunk
+        """
+        self.memory_budget = memory_budget
+        self.rows = initial_rows
+        self.min_rows = min_rows
+        self.max_rows = max_rows
+
+    def __call__(self):
+        """
+        Return the number of rows of the next chunk.
+        :return: number of rows
+        """
+        return self.rows
+
+    def update(self, chunk, rows, peak_bytes):
+        """
+        Adjust the number of rows of the next chunk to the peak memory measured on a chunk.
+        :param chunk: chunk index
+        :param rows: number of rows read for the chunk, before any pre-filter
+        :param peak_bytes: estimated peak memory of the chunk in bytes
+        """
+        bytes_per_row = peak_bytes / max(rows, 1)
+        target_rows = int(self.memory_budget / max(bytes_per_row, 1))
+        self.rows = max(self.min_rows, min(self.max_rows, 2 * max(rows, self.min_rows), target_rows))
+        info("Chunk size ( chunk={}). {} rows, peak {} bytes ({:.0f} bytes/row), next chunk {} rows "
+             "(memory-budget={})".format(chunk, rows, peak_bytes, bytes_per_row, self.rows, self.memory_budget))
+
+
+def put_until(q, item, stop, timeout=0.1):
+    """
+    Put an item on a bounded queue, blocking while the queue is full until the stop event is set.
+    :param q: queue
+    :param item: item
+    :param stop: stop event
+    :param timeout: polling interval in seconds
+    :return: True if the item was put
+    """
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=timeout)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def prefetch(iterator, depth=2, name="prefetch"):
+    """
+    Return iterator of the items of an iterator produced ahead by a thread into a bounded queue, at most depth
+    items are held in the queue. Errors of the thread are raised by the returned iterator.
+    :param iterator: iterator
+    :param depth: queue depth
+    :param name: thread name
+    :return: iterator
+    """
+    q = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+
+    def produce():
+        try:
+            for item in iterator:
+                if not put_until(q, (item, None), stop):
+                    return
+            put_until(q, (done, None), stop)
+        except BaseException as e:
+            put_until(q, (done, e), stop)
+
+    thread = threading.Thread(target=produce, name=name, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = q.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        # consumer done or failed, producer unblocked and joined
+        stop.set()
+        thread.join()
+
+
+class ThreadedConsumer:
+    """
+    Consumer thread applying a function to the items submitted to a bounded queue, submits block while the queue is
+    full. Errors of the thread are raised by the next submit or on exit. Used as a context manager, the remaining
+    items are consumed on exit (or dropped when exiting on error). With a depth of 0, the function is applied in the
+    calling thread.
+    """
+
+    def __init__(self, fn, depth=2, name="consumer"):
+        """
+        Create and start consumer thread.
+        :param fn: function applied to each item
+        :param depth: queue depth
+        :param name: thread name
+        """
+        self.fn = fn
+        self.queue = queue.Queue(maxsize=depth)
+        self.stop = threading.Event()
+        self.error = None
+        self.done = object()
+        self.thread = None
+        if depth > 0:
+            self.thread = threading.Thread(target=self.consume, name=name, daemon=True)
+            self.thread.start()
+
+    def consume(self):
+        while True:
+            item = self.queue.get()
+            if item is self.done or self.stop.is_set():
+                return
+            try:
+                self.fn(item)
+            except BaseException as e:
+                self.error = e
+                self.stop.set()
+                return
+
+    def submit(self, item):
+        """
+        Submit an item, blocking while the queue is full.
+        :param item: item
+        """
+        if self.thread is None:
+            self.fn(item)
+            return
+        self.raise_error()
+        if not put_until(self.queue, item, self.stop):
+            self.raise_error()
+
+    def raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.thread is None:
+            return
+        if exc_type is not None:
+            # consumer thread waiting on an empty queue woken up
+            self.stop.set()
+            try:
+                self.queue.put_nowait(self.done)
+            except queue.Full:
+                pass
+        else:
+            put_until(self.queue, self.done, self.stop)
+        self.thread.join()
+        if exc_type is None:
+            self.raise_error()
+
+
+def parse_size(size):
+    """
+    Parse size in bytes with an optional binary unit suffix (K, M, G or T).
+    :param size: size string, e.g. 512M or 20G
+    :return: size in bytes
+    """
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+    size = str(size).strip().upper().rstrip("B")
+    if size and size[-1] in units:
+        return int(float(size[:-1]) * units[size[-1]])
+    return int(size)
+
+
+def from_decimal_array(array):
+    """
+    Vectorized conversion of a pyarrow decimal128 array (values fitting in 64 bits) to float64 values, nulls
+    become NaN.
+    :param array: pyarrow decimal128 array or chunked array
+    :return: float64 numpy array
+    """
+    import numpy as np
+    import pyarrow as pa
+    if isinstance(array, pa.ChunkedArray):
+        if array.num_chunks == 0:
+            return np.empty(0, dtype="float64")
+        return np.concatenate([from_decimal_array(chunk) for chunk in array.chunks])
+    # low words of the 128-bit little endian unscaled values
+    words = np.frombuffer(array.buffers()[1], dtype="int64")[2 * array.offset:2 * (array.offset + len(array)):2]
+    values = words / 10 ** array.type.scale
+    if array.null_count > 0:
+        values[np.asarray(array.is_null())] = np.nan
+    return values
+
+
+class StagingCache:
+    """
+    Local staging cache of parsed taxi trips, stored as parquet parts keyed by input path, size, mtime and cache
+    schema version. Each fill writes its parts to its own directory, renamed to the entry once complete. Parts are
+    sorted by pickup datetime so that row groups of cached trips are pruned with the filtering bounds using their
+    statistics, least recently used entries are evicted once the total size exceeds the disk budget.
+    """
+
+    def __init__(self, cache_dir, budget_bytes, row_group_size=131072):
+        """
+        Create staging cache.
+        :param cache_dir: local cache directory
+        :param budget_bytes: disk budget in bytes
+        :param row_group_size: row group size of cached parts
+        """
+        self.cache_dir = cache_dir
+        self.budget_bytes = budget_bytes
+        self.row_group_size = row_group_size
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, path, storage_options=None):
+        """
+        Return cache key of an input file.
+        :param path: input path
+        :param storage_options: storage options dict
+        :return: cache key
+        """
+        fs, fs_path = storage_filesystem(path, storage_options)
+        file_info = fs.info(fs_path)
+        identity = [path, file_info["size"], str(file_info.get("mtime", file_info.get("last_modified"))),
+                    CACHE_SCHEMA_VERSION, TRIP_SCHEMA]
+        return hashlib.sha256(json.dumps(identity).encode()).hexdigest()[:32]
+
+    def lookup(self, key):
+        """
+        Return cache entry directory of a key, marked as recently used, or None if not cached.
+        :param key: cache key
+        :return: cache entry directory or None
+        """
+        entry = os.path.join(self.cache_dir, key)
+        if not os.path.isdir(entry):
+            return None
+        os.utime(entry)
+        return entry
+
+    def fill(self, key):
+        """
+        Start filling the cache entry of a key, in a new directory of this fill only (parts of interrupted or
+        concurrent fills are not mixed in).
+        :param key: cache key
+        :return: fill directory
+        """
+        partial = os.path.join(self.cache_dir, "{}.partial-{}".format(key, uuid.uuid4().hex))
+        os.makedirs(partial)
+        return partial
+
+    def write(self, partial, df, index):
+        """
+        Write part of parsed taxi trips of a cache entry being filled, rows sorted by pickup datetime.
+        :param partial: fill directory
+        :param df: parsed taxi trips pandas dataframe or pyarrow table
+        :param index: part index
+        """
+        import numpy as np
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = df if isinstance(df, pa.Table) else to_arrow_table(df)
+        # parts share the parsed taxi rides schema whatever the reader
+        table = table.cast(prepare_taxi_rides_arrow(arrow_schema(TRIP_SCHEMA).empty_table()).schema)
+        # row groups of sorted rows cover narrow pickup ranges, pruned by the pickup filtering bounds
+        table = table.take(pa.array(np.argsort(table.column("datetime_PU").to_numpy(), kind="stable")))
+        pq.write_table(table, os.path.join(partial, "part-{:05d}.parquet".format(index)),
+                       row_group_size=self.row_group_size)
+
+    def commit(self, key, partial):
+        """
+        Publish cache entry of a fill once all its parts are written and evict least recently used entries.
+        :param key: cache key
+        :param partial: fill directory
+        :return: cache entry directory or None if evicted
+        """
+        entry = os.path.join(self.cache_dir, key)
+        if os.path.isdir(entry):
+            shutil.rmtree(entry)
+        os.replace(partial, entry)
+        self.evict()
+        return entry if os.path.isdir(entry) else None
+
+    def evict(self):
+        """
+        Remove least recently used entries until the total size fits the disk budget.
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            entry = os.path.join(self.cache_dir, name)
+            if os.path.isdir(entry) and ".partial-" not in name:
+                size = sum(os.path.getsize(os.path.join(entry, part)) for part in os.listdir(entry))
+                entries.append((os.path.getmtime(entry), size, entry))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.budget_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            info("Staging cache entry evicted (entry={}, bytes={}).".format(entry, size))
+
+    @staticmethod
+    def row_groups(entry, filtering_bounds):
+        """
+        Return row groups of a cache entry which may hold rows within the filtering bounds, according to the
+        min/max statistics of the bounded columns.
+        :param entry: cache entry directory
+        :param filtering_bounds: filtering bounds
+        :return: list of (part path, row group index)
+        """
+        import pyarrow.parquet as pq
+        row_groups = []
+        for part in sorted(os.listdir(entry)):
+            path = os.path.join(entry, part)
+            row_groups += [(path, i) for i in parquet_row_groups(pq.ParquetFile(path).metadata, filtering_bounds)]
+        return row_groups
+
+    @staticmethod
+    def read(path, index):
+        """
+        Read row group of a cached part, memory-mapped.
+        :param path: part path
+        :param index: row group index
+        :return: pyarrow table
+        """
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path, memory_map=True).read_row_group(index)
+
+
+def parquet_row_groups(metadata, filtering_bounds):
+    """
+    Return row groups of a parquet file which may hold rows within the filtering bounds, according to the min/max
+    statistics of the bounded columns.
+    :param metadata: parquet file metadata
+    :param filtering_bounds: filtering bounds
+    :return: list of row group indices
+    """
+    import pandas as pd
+    columns = [metadata.schema.column(i).name for i in range(metadata.num_columns)]
+    row_groups = []
+    for i in range(metadata.num_row_groups):
+        row_group = metadata.row_group(i)
+        if row_group.num_rows == 0:
+            continue
+        matches = True
+        for column, start, end in filtering_bounds:
+            if column not in columns:
+                continue
+            statistics = row_group.column(columns.index(column)).statistics
+            if statistics is None or not statistics.has_min_max:
+                continue
+            # timestamp statistics are datetimes, or integers for nanoseconds
+            to_timestamp = (lambda v: pd.Timestamp(v, unit="ns")) if isinstance(statistics.min, int) else pd.Timestamp
+            if to_timestamp(statistics.max) < start or to_timestamp(statistics.min) >= end:
+                matches = False
+                break
+        if matches:
+            row_groups.append(i)
+    return row_groups
+
+
+def is_parquet_input(path, storage_options=None):
+    """
+    Return whether input path is a parquet file or a (partitioned) parquet dataset.
+    :param path: input path
+    :param storage_options: storage options dict
+    :return: true if parquet input
+    """
+    fs, fs_path = storage_filesystem(path, storage_options)
+    if fs_path.endswith(".parquet"):
+        return True
+    if not fs.isdir(fs_path):
+        return False
+    return any("=" in name or name.endswith(".parquet")
+               for name in (posixpath.basename(p.rstrip("/")) for p in fs.ls(fs_path, detail=False)))
+
+
+def pickup_date_key_bounds(filtering_bounds):
+    """
+    Return inclusive date_PU partition key bounds of the pickup filtering bounds.
+    :param filtering_bounds: filtering bounds
+    :return: (lowest date key or None, highest date key or None)
+    """
+    low, high = None, None
+    for column, start, end in filtering_bounds:
+        if column == "datetime_PU":
+            start_key = date_key(start)
+            end_key = date_key(end - datetime.timedelta(microseconds=1))
+            low = start_key if low is None else max(low, start_key)
+            high = end_key if high is None else min(high, end_key)
+    return low, high
+
+
+def parquet_dataset_files(path, filtering_bounds, storage_options=None):
+    """
+    Return files of a hive-partitioned parquet dataset along with their partition values, date_PU partition
+    directories outside of the pickup filtering bounds are pruned.
+    :param path: dataset path
+    :param filtering_bounds: filtering bounds
+    :param storage_options: storage options dict
+    :return: list of (file path, dict of partition column to value)
+    """
+    import urllib.parse
+    fs, root = storage_filesystem(path, storage_options)
+    if not fs.isdir(root):
+        return [(root, {})]
+    low, high = pickup_date_key_bounds(filtering_bounds)
+    files, pending = [], [(root, {})]
+    while pending:
+        directory, partitions = pending.pop()
+        for entry in sorted(fs.ls(directory, detail=True), key=lambda e: e["name"]):
+            name = posixpath.basename(entry["name"].rstrip("/"))
+            # metadata & hidden files (_reports, _SUCCESS, .crc ...)
+            if name.startswith(("_", ".")):
+                continue
+            if entry["type"] == "directory":
+                if "=" not in name:
+                    continue
+                column, value = name.split("=", 1)
+                value = None if value == "__HIVE_DEFAULT_PARTITION__" else urllib.parse.unquote(value)
+                if column == "date_PU" and value is not None and value.isdigit():
+                    if (low is not None and int(value) < low) or (high is not None and int(value) > high):
+                        continue
+                pending.append((entry["name"], dict(partitions, **{column: value})))
+            elif name.endswith(".parquet"):
+                files.append((entry["name"], partitions))
+    return sorted(files)
+
+
+def read_parquet_taxi_rides(path, partitions, taxi_zones_df, filtering_bounds=None, storage_options=None):
+    """
+    Read taxi rides of an ingested parquet file as parsed taxi-rides pyarrow table, row groups pruned by filtering
+    bounds. Zone enrichment, app_id and date_PU columns are dropped, location ids are kept if present or mapped
+    back from zone & borough names.
+    :param path: parquet file path
+    :param partitions: dict of partition column to value of the file
+    :param taxi_zones_df: taxi zones pandas dataframe indexed by LocationID
+    :param filtering_bounds: filtering bounds
+    :param storage_options: storage options dict
+    :return: taxi-rides pyarrow table
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = prepare_taxi_rides_arrow(arrow_schema(TRIP_SCHEMA).empty_table()).schema
+    fs, fs_path = storage_filesystem(path, storage_options)
+    with fs.open(fs_path, "rb") as f:
+        parquet_file = pq.ParquetFile(f)
+        names = parquet_file.schema_arrow.names
+        # zone attributes matched to location ids if absent
+        zone_columns = ["{}_{}".format(attribute, suffix) for suffix in ["PU", "DO"]
+                        for attribute in ["zone", "borough", "Shape_Leng", "Shape_Area"]]
+        columns = [name for name in schema.names + zone_columns if name in names]
+        row_groups = parquet_row_groups(parquet_file.metadata, filtering_bounds or [])
+        if row_groups:
+            table = parquet_file.read_row_groups(row_groups, columns=columns)
+        else:
+            empty_table = parquet_file.schema_arrow.empty_table()
+            table = pa.Table.from_arrays([empty_table.column(name) for name in columns], names=columns)
+    for column, value in partitions.items():
+        if column not in table.column_names:
+            table = table.append_column(column, pa.array([value] * table.num_rows, pa.string()))
+    location_ids = {}
+    for suffix in ["PU", "DO"]:
+        if suffix + "LocationID" not in table.column_names:
+            location_ids[suffix + "LocationID"] = zone_location_ids(table, suffix, taxi_zones_df)
+    arrays = [table.column(name) if name in table.column_names else location_ids[name] for name in schema.names]
+    table = pa.Table.from_arrays(arrays, names=schema.names)
+    # rides of zones unknown to the taxi zones are dropped as by the inner join
+    valid = table.column("PULocationID").is_valid().to_numpy(zero_copy_only=False) & \
+        table.column("DOLocationID").is_valid().to_numpy(zero_copy_only=False)
+    if not valid.all():
+        table = table.filter(pa.array(valid))
+    return table.cast(schema)
+
+
+def zone_location_ids(table, suffix, taxi_zones_df):
+    """
+    Map zone attributes of ingested taxi rides back to location ids. Zones are matched on name, borough and shape
+    length & area when available, then on name & borough only (ambiguous names mapped to the lowest location id).
+    :param table: ingested taxi-rides pyarrow table
+    :param suffix: PU or DO
+    :param taxi_zones_df: taxi zones pandas dataframe indexed by LocationID
+    :return: pyarrow int32 array of location ids, null for unknown zones
+    """
+    import numpy as np
+    import pandas as pd
+    import pyarrow as pa
+    zones = taxi_zones_df.sort_index()
+    positions = np.full(table.num_rows, -1, dtype="int64")
+    for attributes in [["zone", "borough", "Shape_Leng", "Shape_Area"], ["zone", "borough"]]:
+        if any("{}_{}".format(attribute, suffix) not in table.column_names for attribute in attributes):
+            continue
+        unique_zones = zones[~zones.duplicated(attributes)]
+        index = pd.MultiIndex.from_arrays([unique_zones[attribute].astype(str) for attribute in attributes])
+        keys = pd.MultiIndex.from_arrays([table.column("{}_{}".format(attribute, suffix)).to_pandas().astype(str)
+                                          for attribute in attributes])
+        matches = zones.index.get_indexer(unique_zones.index)[index.get_indexer(keys)]
+        matches[index.get_indexer(keys) < 0] = -1
+        positions = np.where(positions < 0, matches, positions)
+    location_ids = zones.index.to_numpy()[np.maximum(positions, 0)]
+    return pa.array(location_ids, pa.int32(), mask=positions < 0)
+
+
+def reset_peak_rss():
+    """
+    Reset peak resident set size of the current process (linux only, no-op elsewhere).
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss():
+    """
+    Return peak resident set size of the current process in bytes, since the last reset if supported.
+    :return: peak rss in bytes
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return maxrss_bytes(resource.RUSAGE_SELF)
+
+
+def current_rss():
+    """
+    Return resident set size of the current process in bytes (linux only, 0 elsewhere).
+    :return: rss in bytes
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+class RssSampler(threading.Thread):
+    """
+    Thread sampling the resident set size of the current process, peak of stages running concurrently.
+    """
+
+    def __init__(self, interval=0.05):
+        """
+        Create rss sampler.
+        :param interval: sampling interval in seconds
+        """
+        super().__init__(name="rss-sampler", daemon=True)
+        self.interval = interval
+        self.peak = current_rss()
+        self.stopped = threading.Event()
+
+    def run(self):
+        """
+        Sample rss until stopped.
+        """
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def stop(self):
+        """
+        Stop sampling and wait for the sampler thread.
+        :return: sampled peak rss in bytes
+        """
+        self.stopped.set()
+        self.join()
+        self.peak = max(self.peak, current_rss())
+        return self.peak
+
+
+def maxrss_bytes(who):
+    """
+    Return lifetime peak resident set size in bytes.
+    :param who: resource.RUSAGE_SELF or resource.RUSAGE_CHILDREN
+    :return: peak rss in bytes
+    """
+    maxrss = resource.getrusage(who).ru_maxrss
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+class RunProfiler:
+    """
+    Run profiler recording wall time, cpu time, peak rss and rows in/out of each stage (of each chunk in chunked
+    mode) along with engine metrics, written as a json report named after the app id.
+    """
+
+    def __init__(self, app_id, mode):
+        """
+        Create run profiler.
+        :param app_id: application id
+        :param mode: ingestion mode
+        """
+        self.app_id = app_id
+        self.mode = mode
+        self.started = datetime.datetime.now()
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        self.stages = []
+        self.metrics = {}
+        # rss sampled while stages run concurrently, stage peaks not measured then
+        self.rss_sampler = None
+
+    @contextlib.contextmanager
+    def stage(self, name, rows_in=None, chunk=None):
+        """
+        Profile a stage, rows out are set on the yielded record.
+        :param name: stage name
+        :param rows_in: number of input rows
+        :param chunk: chunk index
+        :return: stage record dict
+        """
+        record = {"stage": name, "chunk": chunk, "rows_in": rows_in, "rows_out": None}
+        # peak rss is process-wide, left to the server when runs share the process and sampled for the whole run
+        # when stages run concurrently (each stage would reset the peak of the others)
+        measure_rss = not shared_process() and self.rss_sampler is None
+        if measure_rss:
+            reset_peak_rss()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall_seconds"] = time.perf_counter() - wall
+            record["cpu_seconds"] = time.process_time() - cpu
+            record["peak_rss_bytes"] = peak_rss() if measure_rss else None
+            if not record.pop("discard", False):
+                self.stages.append(record)
+
+    def sample_rss(self, interval=0.05):
+        """
+        Sample process rss in a background thread instead of measuring stage peaks, for stages running
+        concurrently. The sampled peak is reported as pipelined_peak_rss_bytes.
+        :param interval: sampling interval in seconds
+        """
+        if self.rss_sampler is None and not shared_process():
+            self.rss_sampler = RssSampler(interval)
+            self.rss_sampler.start()
+
+    def iterate(self, name, iterator):
+        """
+        Profile each item produced by an iterator as a stage.
+        :param name: stage name
+        :param iterator: iterator of dataframes or tables
+        :return: iterator
+        """
+        iterator = iter(iterator)
+        chunk = 1
+        while True:
+            with self.stage(name, chunk=chunk) as record:
+                item = next(iterator, None)
+                record["rows_out"] = None if item is None else len(item)
+                # exhausted iterator is not a stage
+                record["discard"] = item is None
+            if item is None:
+                return
+            yield item
+            chunk += 1
+
+    def summary(self):
+        """
+        Return totals of recorded stages by stage name.
+        :return: dict of stage name to totals
+        """
+        summary = OrderedDict()
+        for record in self.stages:
+            totals = summary.setdefault(record["stage"], {"count": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0,
+                                                          "peak_rss_bytes": 0, "rows_in": 0, "rows_out": 0})
+            totals["count"] += 1
+            totals["wall_seconds"] += record["wall_seconds"]
+            totals["cpu_seconds"] += record["cpu_seconds"]
+            totals["peak_rss_bytes"] = max(totals["peak_rss_bytes"], record["peak_rss_bytes"] or 0)
+            totals["rows_in"] += record["rows_in"] or 0
+            totals["rows_out"] += record["rows_out"] or 0
+        return summary
+
+    def write_report(self, report_dir, storage_options=None):
+        """
+        Write json report taxi_rides_report_<app_id>.json.
+        :param report_dir: report directory
+        :param storage_options: storage options dict
+        :return: report path
+        """
+        measure_rss = not shared_process()
+        report = {"app_id": self.app_id,
+                  "mode": self.mode,
+                  "started": self.started.isoformat(),
+                  "finished": datetime.datetime.now().isoformat(),
+                  "wall_seconds": time.perf_counter() - self.wall,
+                  "cpu_seconds": time.process_time() - self.cpu,
+                  "peak_rss_bytes": maxrss_bytes(resource.RUSAGE_SELF) if measure_rss else None,
+                  "children_peak_rss_bytes": maxrss_bytes(resource.RUSAGE_CHILDREN) if measure_rss else None,
+                  "pipelined_peak_rss_bytes": self.rss_sampler.stop() if self.rss_sampler is not None else None,
+                  "summary": self.summary(),
+                  "stages": self.stages,
+                  "metrics": self.metrics}
+        fs, root = storage_filesystem(report_dir, storage_options)
+        fs.makedirs(root, exist_ok=True)
+        path = posixpath.join(root, "taxi_rides_report_{}.json".format(self.app_id))
+        with fs.open(path, "wb") as f:
+            f.write(json.dumps(report, indent=2, default=str).encode())
+        return path
+
+
+def report_dir(args):
+    """
+    Return run report directory, defaults to _reports in the output path.
+    :param args: arguments
+    :return: report directory
+    """
+    return args.report_dir or posixpath.join(args.output_path, "_reports")
 
 
 def generate_storage_options(args):
@@ -83,6 +2082,14 @@ def generate_storage_options(args):
     :return:
     """
 
+    if args.storage_standin:
+        if not shared_process():
+            # remote paths served from a local directory, credentials ignored
+            use_storage_standin(args.storage_standin)
+        elif not standin_in_use(args.storage_standin):
+            # the stand-in is process-wide, set once by the server for all of its runs
+            raise ValueError("storage stand-in {} not served by this process (serve --storage-standin)"
+                             .format(args.storage_standin))
     if (not args.azure_tenant_id or
             not args.azure_storage_account_name or
             not args.azure_client_id or
@@ -108,6 +2115,24 @@ def init_parser(parser):
                                                                 "[YYYY, YYYY-MM, YYYY-MM-DD, YYYY-MM-DD:YYYY-MM-DD]")
     parser.add_argument('--filter-dropoff', required=False, help="Filter by dropoff date. Available formats :"
                                                                  "[YYYY, YYYY-MM, YYYY-MM-DD, YYYY-MM-DD:YYYY-MM-DD]")
+    parser.add_argument('--incremental', required=False, action="store_true",
+                        help="Ingest only new input files or bytes appended since the last run, as recorded in "
+                             "the manifest stored in the output path.")
+    parser.add_argument('--report-dir', required=False,
+                        help="Directory of the json run report (stage timings, memory & rows), defaults to "
+                             "'_reports' in the output path.")
+    parser.add_argument('--zones-layout', required=False, default="full", choices=ZONES_LAYOUTS,
+                        help="Layout of zone attributes in the output : 'full' copies, 'categorical' "
+                             "dictionary-encoded (in memory & parquet), 'dimension' geometries written once to "
+                             "{}/zones.parquet in the output path and location ids kept in the rides."
+                        .format(ZONES_DIMENSION_DIR))
+    parser.add_argument('--rollups', required=False, action="store_true",
+                        help="Write rollups by pickup hour and pickup/drop off location (trips, sums, fare & "
+                             "distance histograms and quantiles) computed in the ingestion pass, as "
+                             "{}/rollups-<app id>.parquet in the output path.".format(ROLLUPS_DIR))
+    parser.add_argument('--storage-standin', required=False,
+                        help="Local directory standing in for Azure storage, abfs://container/path read and written "
+                             "as <dir>/container/path (testing without a storage account).")
     parser.add_argument('--azure-tenant-id', required=False, help="Azure Tenant id", default="")
     parser.add_argument('--azure-client-id', required=False, help="Azure Client id", default="")
     parser.add_argument('--azure-client-secret', required=False, help="Azure Client Secret", default="")
@@ -115,6 +2140,93 @@ def init_parser(parser):
     return parser
 
 
+class LazyModule:
+    """
+    Module proxy importing the module on first attribute access.
+    """
+
+    def __init__(self, name):
+        """
+        Create module proxy.
+        :param name: module name
+        """
+        self.__dict__["_name"] = name
+
+    def __getattr__(self, attribute):
+        module = importlib.import_module(self.__dict__["_name"])
+        # later accesses served by the module attributes copied on the proxy
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attribute)
+
+
+def lazy_import(name):
+    """
+    Return module imported on first attribute access, engine modules are loaded without their heavy dependencies
+    (usage and argument errors are reported without waiting for them).
+    :param name: module name
+    :return: module proxy
+    """
+    return LazyModule(name)
+
+
+# resources kept across the jobs of the serve mode (engine clients, zones) by key, None outside the serve mode
+warm_resources = None
+warm_resources_lock = threading.RLock()
+
+
+def enable_warm_resources():
+    """
+    Keep resources created by warm_resource across runs of this process (serve mode).
+    """
+    global warm_resources
+    with warm_resources_lock:
+        if warm_resources is None:
+            warm_resources = {}
+
+
+def shared_process():
+    """
+    Return whether runs share this process with other concurrent runs (serve mode).
+    :return: true if warm resources are kept across runs
+    """
+    return warm_resources is not None
+
+
+def warm_resource(key, create, stamp=None):
+    """
+    Return resource of a key, created once and shared by later calls with the same key and stamp in the serve
+    mode (the resource is created again when the stamp changes), created by each call otherwise.
+    :param key: resource key
+    :param create: function creating the resource
+    :param stamp: resource version
+    :return: resource
+    """
+    if warm_resources is None:
+        return create()
+    with warm_resources_lock:
+        entry = warm_resources.get(key)
+        if entry is None or entry[0] != stamp:
+            entry = warm_resources[key] = (stamp, create())
+        return entry[1]
+
+
+def warm_zones(path, storage_options, load, variant=None):
+    """
+    Return taxi zones loaded from a path, kept in the serve mode until the file changes (size & mtime).
+    :param path: taxi zones path
+    :param storage_options: storage options dict
+    :param load: function loading the taxi zones
+    :param variant: engine specific variant of the loaded zones
+    :return: taxi zones
+    """
+    if warm_resources is None:
+        return load()
+    fs, fs_path = storage_filesystem(path, storage_options)
+    file_info = fs.info(fs_path)
+    stamp = (file_info["size"], str(file_info.get("mtime", file_info.get("last_modified"))))
+    return warm_resource(("zones", path, variant), load, stamp)
+
+
 def generate_app_id():
     """
 